@@ -71,7 +71,7 @@ else
             ;;
         esac
     done
-    sources=$(echo "$sources" | xargs -n1 | cat -n | sort -k2 | uniq -f1 | sort -k1 | cut -f2- |  xargs)
+    # process_data.py drops duplicates and orders items by their dependencies
     echo "Processing ${sources} ..."
     /opt/venv/bin/python /haitaton-gis/process_data.py ${sources}
     RESULT2="$?"
@@ -0,0 +1,100 @@
+"""Benchmark of clipAreasByAreas with option sets used by processors.
+
+Synthetic street areas split into tiles (like ylre_katuosat) are used as
+the mask and buffered random lines as the areas to clip.
+
+Run from the process directory:
+    python -m benchmarks.clip_engine [number of areas] [size of area in m]
+"""
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from modules.common import clipAreasByAreas
+
+CRS = "EPSG:3879"
+TILE_SIZE = 40
+STREET_SPACING = 80
+
+# option sets of the processors calling the clip engine
+OPTIONS = {
+    "liikennevaylat": {},
+    "liikennevaylat_dissolve_between": {"dissolveBetween": True},
+    "hsl": {"dissolveBetween": True, "clippedBuffer": 10, "resultBuffer": None},
+    "tram": {"resultBuffer": None},
+}
+
+
+def street_tiles(rng: np.random.Generator, extent: float) -> gpd.GeoDataFrame:
+    """Create street network polygons split into square tiles."""
+    offsets = np.arange(0, extent + 1, STREET_SPACING)
+    streets = [
+        shapely.LineString([(0, o), (extent, o + rng.uniform(-40, 40))])
+        for o in offsets
+    ] + [
+        shapely.LineString([(o, 0), (o + rng.uniform(-40, 40), extent)])
+        for o in offsets
+    ]
+    network = shapely.union_all(
+        shapely.buffer(shapely.segmentize(np.array(streets), 5), 12)
+    )
+
+    corners = np.arange(0, extent, TILE_SIZE)
+    x, y = [c.ravel() for c in np.meshgrid(corners, corners)]
+    tiles = shapely.intersection(
+        network, shapely.box(x, y, x + TILE_SIZE, y + TILE_SIZE)
+    )
+    tiles = tiles[~shapely.is_empty(tiles)]
+    return gpd.GeoDataFrame(
+        {
+            "ylre_class": rng.choice(["a", "b"], len(tiles)),
+            "kadun_nimi": rng.choice(["x", "y", "z"], len(tiles)),
+        },
+        geometry=tiles,
+        crs=CRS,
+    ).explode(ignore_index=True)
+
+
+def buffered_lines(rng: np.random.Generator, count: int, extent: float) -> gpd.GeoDataFrame:
+    """Create buffered random lines, most of them marked for clipping."""
+    start = rng.uniform(0, extent, (count, 2))
+    end = start + rng.uniform(-300, 300, (count, 2))
+    lines = shapely.linestrings(np.stack([start, end], axis=1))
+    return gpd.GeoDataFrame(
+        {
+            "cls": rng.choice(["p", "q", "r"], count),
+            "ylre_class": np.where(rng.random(count) < 0.7, "k", None),
+        },
+        geometry=shapely.buffer(lines, 8),
+        crs=CRS,
+    )
+
+
+def main(count: int = 3000, extent: float = 2000) -> None:
+    rng = np.random.default_rng(1)
+    mask = street_tiles(rng, extent)
+    areas = buffered_lines(rng, count, extent)
+    print("{} areas, {} mask polygons".format(len(areas), len(mask)))
+
+    for name, options in OPTIONS.items():
+        start = time.perf_counter()
+        result = clipAreasByAreas(
+            areas.copy(),
+            mask.copy(),
+            ["cls", "ylre_class"],
+            "ylre_class",
+            **options
+        )
+        elapsed = time.perf_counter() - start
+        print(
+            "{:35s} {:8.2f} s {:8d} polygons {:14.0f} m2".format(
+                name, elapsed, len(result), result.area.sum()
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(*[float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:])])
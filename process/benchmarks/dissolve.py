@@ -0,0 +1,44 @@
+"""Benchmark of tiled parallel dissolve against GeoDataFrame.dissolve.
+
+Buffered random lines are dissolved by two attributes like the final
+dissolves of the processors.
+
+Run from the process directory:
+    python -m benchmarks.dissolve [number of areas] [workers] [tile size in m]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.clip_engine import buffered_lines
+from modules.common import dissolveTiled
+
+ATTRS = ["cls", "ylre_class"]
+
+
+def main(count: int = 20000, workers: int = 4, tile_size: float = 1000) -> None:
+    areas = buffered_lines(np.random.default_rng(2), count, 8000)
+    areas["ylre_class"] = areas["ylre_class"].fillna("")
+    print("{} areas".format(len(areas)))
+
+    start = time.perf_counter()
+    expected = areas.dissolve(by=ATTRS, as_index=False)
+    print("{:20s} {:8.2f} s".format("dissolve", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    result = dissolveTiled(areas, ATTRS, tileSize=tile_size, workers=workers)
+    elapsed = time.perf_counter() - start
+    difference = max(
+        res.symmetric_difference(exp).area
+        for res, exp in zip(result.geometry, expected.geometry)
+    )
+    print(
+        "{:20s} {:8.2f} s {:8.3f} m2 difference".format(
+            "tiled, {} workers".format(workers), elapsed, difference
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(*[float(arg) if i == 2 else int(arg) for i, arg in enumerate(sys.argv[1:])])
@@ -0,0 +1,67 @@
+"""Benchmark of joinWithinDistance against sjoin with dissolved buffers.
+
+Synthetic street areas split into tiles (like ylre_katuosat) are joined to
+random street lines, most of them following the street axes like the
+liikennevaylat network. The reference is the sjoin with predicate within
+against the areas dissolved by class and buffered, which joinWithinDistance
+replaces. Lines joined differently than by the reference are counted.
+
+Run from the process directory:
+    python -m benchmarks.join_within [number of lines] [size of area in m] [distance in m]
+"""
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from benchmarks.clip_engine import CRS, STREET_SPACING, street_tiles
+from modules.common import joinWithinDistance
+
+
+def street_lines(rng: np.random.Generator, count: int, extent: float) -> gpd.GeoDataFrame:
+    """Create lines along the street axes of street_tiles and some across blocks."""
+    axis = rng.integers(0, int(extent // STREET_SPACING) + 1, count) * STREET_SPACING
+    along = rng.uniform(0, extent, count)
+    length = rng.uniform(10, 200, count)
+    offset = np.where(rng.random(count) < 0.9, rng.uniform(-8, 8, count), rng.uniform(-40, 40, count))
+    start = np.stack([along, axis + offset], axis=1)
+    end = start + np.stack([length, rng.uniform(-5, 5, count)], axis=1)
+    vertical = rng.random(count) < 0.5
+    start[vertical], end[vertical] = start[vertical][:, ::-1], end[vertical][:, ::-1]
+    lines = shapely.linestrings(np.stack([start, end], axis=1))
+    return gpd.GeoDataFrame({"uuid": np.arange(count)}, geometry=lines, crs=CRS)
+
+
+def reference(lines: gpd.GeoDataFrame, areas: gpd.GeoDataFrame, distance: float) -> gpd.GeoDataFrame:
+    dissolved = areas.dissolve(by="ylre_class")
+    dissolved["geometry"] = dissolved.buffer(distance)
+    joined = gpd.sjoin(lines, dissolved, predicate="within")
+    return lines.merge(joined[["uuid", "ylre_class"]], how="left", on="uuid")
+
+
+def differences(result: gpd.GeoDataFrame, expected: gpd.GeoDataFrame) -> int:
+    pairs = set(zip(result["uuid"], result["ylre_class"].fillna("")))
+    expected_pairs = set(zip(expected["uuid"], expected["ylre_class"].fillna("")))
+    return len(pairs ^ expected_pairs)
+
+
+def main(count: int = 5000, extent: float = 1500, distance: float = 15) -> None:
+    rng = np.random.default_rng(3)
+    areas = street_tiles(rng, extent)
+    lines = street_lines(rng, count, extent)
+    print("{} lines, {} areas".format(len(lines), len(areas)))
+
+    start = time.perf_counter()
+    expected = reference(lines, areas, distance)
+    print("{:32s} {:8.2f} s".format("dissolve, buffer and sjoin", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    result = joinWithinDistance(lines, areas, ["ylre_class"], distance)
+    elapsed = time.perf_counter() - start
+    print("{:32s} {:8.2f} s {:8d} differing joins".format("joinWithinDistance", elapsed, differences(result, expected)))
+
+
+if __name__ == "__main__":
+    main(*[float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:])])
@@ -0,0 +1,55 @@
+"""Benchmark of process_data.py startup with lazily imported processors.
+
+Every run is a fresh interpreter importing process_data.py and the
+processor of one item, like a per-target container invocation. Importing
+all processors is measured as the reference, it is what process_data.py
+did before the registry.
+
+Run from the process directory:
+    python -m benchmarks.startup [number of runs] [item ...]
+"""
+import statistics
+import subprocess
+import sys
+
+from modules import registry
+
+SCRIPT = """
+import time
+start = time.perf_counter()
+import process_data
+from modules import registry
+for item in {items!r}:
+    registry.processor_class(item)
+print(time.perf_counter() - start)
+"""
+
+
+def startup_time(items: list[str], runs: int) -> float:
+    """Return median startup time in seconds, None if an import fails."""
+    times = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(items=items)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            return None
+        times.append(float(result.stdout.split()[-1]))
+    return statistics.median(times)
+
+
+def main(runs: int = 5, items: list[str] = None) -> None:
+    for name, imported in [("all processors", registry.items())] + [
+        (item, [item]) for item in items or registry.items()
+    ]:
+        elapsed = startup_time(imported, runs)
+        if elapsed is None:
+            print("{:28s} import failed".format(name))
+        else:
+            print("{:28s} {:8.3f} s".format(name, elapsed))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5, sys.argv[2:])
@@ -9,6 +9,8 @@ from modules.config import Config
 class MakaAutoliikennemaarat:
     """Process traffic (car) volumes."""
 
+    outputs = [("maka_autoliikennemaarat", "target_file"), ("maka_autoliikennemaarat", "target_buffer_file")]
+
     def __init__(self, cfg: Config):
         self._cfg = cfg
         self._module = "maka_autoliikennemaarat"
@@ -0,0 +1,204 @@
+"""Build cache of processed items.
+
+An item is rebuilt only when something it depends on has changed. The
+fingerprint of an item covers the contents of its local file and of the
+processed files it reads (inputs of the processor), its configuration
+section, the common configuration section, the processing code (modules
+and process_data.py entrypoint) and the versions of installed Python
+packages. After a
+successful build the fingerprint and the digests of the output files are
+stored in a manifest in the output directory. The next run skips the item
+when its fingerprint is the same and the outputs are unchanged. An output
+the build did not write (e.g. written only when enabled in configuration)
+must still be missing.
+
+Items storing their original data to the database (store_orinal_data)
+also record the row count of that table in the manifest. The item is
+rebuilt and persisted again when the table is missing or its row count has
+changed, e.g. after the database volume has been recreated or restored.
+
+force_rebuild (environment variable TORMAYS_FORCE_REBUILD=1) ignores the
+manifests and stores new ones.
+"""
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from modules.common import file_digest
+from modules.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bump when fingerprints or manifests change
+CACHE_VERSION = 2
+CACHE_DIRECTORY = ".build_cache"
+
+_code_version = None
+
+
+def code_version() -> str:
+    """Return digest of the processing code and installed packages.
+
+    Covers modules, the process_data.py entrypoint and the name and version
+    of every installed distribution, e.g. shapely and pyarrow upgrades.
+    Computed once per process."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        modules = Path(__file__).parent
+        for source in sorted(modules.glob("*.py")) + [modules.parent / "process_data.py"]:
+            digest.update(source.name.encode())
+            digest.update(source.read_bytes() if source.exists() else b"missing")
+        packages = sorted(
+            "{}=={}".format(dist.metadata["Name"], dist.version)
+            for dist in importlib.metadata.distributions()
+        )
+        digest.update("\n".join(packages).encode())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def database_state(cfg: Config, item: str) -> str:
+    """Return table and row count item has persisted to the database.
+
+    None if item does not persist to the database."""
+    table = cfg.store_orinal_data(item)
+    if not table:
+        return None
+    engine = create_engine(cfg.pg_conn_uri())
+    try:
+        with engine.connect() as connection:
+            if not inspect(connection).has_table(table, schema="public"):
+                return "{}:missing".format(table)
+            rows = connection.execute(
+                text('SELECT count(*) FROM public."{}"'.format(table.replace('"', '""')))
+            ).scalar()
+    finally:
+        engine.dispose()
+    return "{}:{}".format(table, rows)
+
+
+class BuildCache:
+    """Fingerprints and manifests of processed items.
+
+    database_state(cfg, item) returns the database state recorded in the
+    manifest, see database_state()."""
+
+    def __init__(self, cfg: Config, directory: str = None, database_state=database_state):
+        self._cfg = cfg
+        self._database_state = database_state
+        if directory is None and cfg.output_directory() is not None:
+            directory = os.path.join(cfg.output_directory(), CACHE_DIRECTORY)
+        self._directory = Path(directory) if directory is not None else None
+        self._enabled = cfg.build_cache() and self._directory is not None
+        self._force = cfg.force_rebuild()
+
+    def _files(self, item: str, file: str) -> list[str]:
+        """Return file names of file entry of item.
+
+        A file name may be a template expanded by the buffer sizes."""
+        file_name = getattr(self._cfg, file)(item)
+        if "{}" in file_name:
+            return [file_name.format(buffer) for buffer in self._cfg.buffer(item)]
+        return [file_name]
+
+    def input_files(self, item: str, processor) -> list[str]:
+        """Return local file of item and files of processor inputs."""
+        files = []
+        if self._cfg.section(item).get("local_file"):
+            files += self._files(item, "local_file")
+        for input_item, file in getattr(processor, "inputs", ()):
+            files += self._files(input_item, file)
+        return files
+
+    def output_files(self, item: str, processor) -> list[str]:
+        """Return files of processor outputs."""
+        files = []
+        for output_item, file in getattr(processor, "outputs", ()):
+            files += self._files(output_item, file)
+        return files
+
+    def fingerprint(self, item: str, processor) -> str:
+        """Return fingerprint of everything the outputs of item depend on."""
+        digest = hashlib.sha256()
+        configuration = {"item": self._cfg.section(item), "common": self._cfg.section("common")}
+        parts = [
+            "v{}".format(CACHE_VERSION),
+            item,
+            json.dumps(configuration, sort_keys=True, default=str),
+            code_version(),
+        ]
+        for file_name in self.input_files(item, processor):
+            parts += [file_name, file_digest(file_name) if os.path.exists(file_name) else "missing"]
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _manifest_file(self, item: str) -> Path:
+        return self._directory / "{}.json".format(item)
+
+    def is_current(self, item: str, processor, fingerprint: str) -> bool:
+        """Return True if outputs of item were built with the same fingerprint."""
+        if not self._enabled or self._force or not self._manifest_file(item).exists():
+            return False
+        try:
+            manifest = json.loads(self._manifest_file(item).read_text())
+        except (OSError, ValueError):
+            logger.warning("Could not read build manifest of %s", item, exc_info=True)
+            return False
+        if manifest.get("fingerprint") != fingerprint:
+            return False
+        outputs = manifest.get("outputs", {})
+        for file_name in self.output_files(item, processor):
+            digest = file_digest(file_name) if os.path.exists(file_name) else None
+            if outputs.get(file_name) != digest:
+                return False
+        try:
+            state = self._database_state(self._cfg, item)
+        except SQLAlchemyError:
+            logger.warning("Could not read database state of %s", item, exc_info=True)
+            return False
+        if manifest.get("database") != state:
+            logger.info("Database state of %s has changed since last build", item)
+            return False
+        return True
+
+    def store(self, item: str, processor, fingerprint: str) -> None:
+        """Store manifest of a successful build of item."""
+        if not self._enabled:
+            return
+        try:
+            state = self._database_state(self._cfg, item)
+        except SQLAlchemyError:
+            logger.warning("Could not read database state of %s", item, exc_info=True)
+            state = None
+        manifest = {
+            "fingerprint": fingerprint,
+            "database": state,
+            "outputs": {
+                file_name: file_digest(file_name)
+                for file_name in self.output_files(item, processor)
+                if os.path.exists(file_name)
+            },
+        }
+        tmp_name = None
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self._directory, suffix=".tmp", delete=False
+            ) as tmp:
+                tmp_name = tmp.name
+                json.dump(manifest, tmp, indent=2)
+            os.replace(tmp_name, self._manifest_file(item))
+        except OSError:
+            logger.warning("Could not write build manifest of %s", item, exc_info=True)
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.remove(tmp_name)
@@ -9,6 +9,8 @@ from modules.config import Config
 class CentralBusinessAreas:
     """Process Central Business Areas"""
 
+    outputs = [("central_business_area", "target_file")]
+
     def __init__(self, cfg: Config):
         self._cfg = cfg
         self._process_result_polygons = None
@@ -1,25 +1,454 @@
+import hashlib
+import logging
+from collections import Counter
+
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import shapely
+
+from modules import parallel
+
+logger = logging.getLogger(__name__)
+
+# Number of geometries repaired per stage during this run
+_repairCounts = Counter()
+
+def file_digest(file_name: str) -> str:
+    """Return SHA-256 hex digest of file contents."""
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as stream:
+        for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def makeValid(geometry: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    geometry["geometry"] = geometry.make_valid()
-    geometry["geometry"] = geometry.normalize()
-    geometry.drop_duplicates()
+def repairCounts() -> dict:
+    """Return number of repaired geometries per stage."""
+    return dict(_repairCounts)
 
+def _recordRepairs(stage: str, repaired: int, total: int) -> None:
+    _repairCounts[stage] += repaired
+    if repaired:
+        logger.info("%s: repaired %d of %d geometries", stage, repaired, total)
+
+def repairGeometries(geometries: np.ndarray, stage: str) -> np.ndarray:
+    """Repair invalid geometries of an array, valid geometries are kept as they are."""
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    _recordRepairs(stage, int(invalid.sum()), len(geometries))
+    if invalid.any():
+        geometries = geometries.copy()
+        geometries[invalid] = parallel.geometry_map(shapely.make_valid, geometries[invalid])
+    return geometries
+
+def repairInvalid(geometry: gpd.GeoDataFrame, stage: str = "repairInvalid") -> gpd.GeoDataFrame:
+    """Repair invalid geometries, valid geometries are kept as they are."""
+    values = np.asarray(geometry.geometry.values)
+    repaired = repairGeometries(values, stage)
+    if repaired is not values:
+        geometry = geometry.copy()
+        geometry[geometry.geometry.name] = gpd.GeoSeries(repaired, index=geometry.index, crs=geometry.crs)
     return geometry
 
-def clipAreasByAreas(geometryToClip: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, geometryToClipAttrsDissolve, maskAttrsDissolve, mergeIdField, geometryToClipCheckAttr=None, dissolveBetween=False) -> gpd.GeoDataFrame:
-    geometry = geometryToClip[~geometryToClip.is_empty]
-    for attr in maskAttrsDissolve:
-        mask[attr] = mask[attr].fillna("")
+def dropDuplicates(geometry: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Drop rows having equal attributes and equal geometry.
 
-    if maskAttrsDissolve:
-        mask_dissolved = mask.dissolve(by=maskAttrsDissolve, as_index=False)
-    else:
-        mask_dissolved = mask
+    Geometries are compared by WKB of their normalized form, so rings
+    starting from a different vertex are duplicates too."""
+    keys = shapely.to_wkb(parallel.geometry_map(shapely.normalize, np.asarray(geometry.geometry.values)))
+    attributes = geometry.drop(columns=geometry.geometry.name)
+    duplicated = attributes.assign(_wkb=keys).duplicated()
+    return geometry[~duplicated.to_numpy()]
+
+def makeValid(geometry: gpd.GeoDataFrame, stage: str = "makeValid") -> gpd.GeoDataFrame:
+    """Repair invalid geometries and drop duplicate rows."""
+    return dropDuplicates(repairInvalid(geometry, stage))
+
+def polygonParts(geometries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return non-empty polygon parts of geometries and index of their source geometry.
+
+    Multi-part geometries and geometry collections are split and parts of other
+    geometry types (points, lines) are dropped."""
+    parts, index = shapely.get_parts(geometries, return_index=True)
+    # collections may contain multi-part geometries
+    parts, sub_index = shapely.get_parts(parts, return_index=True)
+    index = index[sub_index]
+    keep = (shapely.get_type_id(parts) == shapely.GeometryType.POLYGON) & ~shapely.is_empty(parts)
+    return parts[keep], index[keep]
+
+def maskParts(mask: gpd.GeoDataFrame) -> np.ndarray:
+    """Return valid polygon parts of mask areas.
+
+    Parts are not unioned: clipping by each part separately keeps the
+    intersected geometries small, and the clipped pieces of a feature are
+    merged again when the result is dissolved."""
+    geometries = repairGeometries(np.asarray(mask.geometry.values[~mask.geometry.is_empty]), "clip mask")
+    parts, _ = polygonParts(geometries)
+    return parts
+
+def unionByGroup(geometries: np.ndarray, groups: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Union geometries having the same group value.
+
+    Return unioned geometries and their group values in ascending order."""
+    order = np.argsort(groups, kind="stable")
+    groups = groups[order]
+    geometries = geometries[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    ends = np.r_[starts[1:], len(groups)]
+
+    # most groups have a single geometry which needs no union
+    merged = geometries[starts].copy()
+    for i in np.flatnonzero(ends - starts > 1):
+        merged[i] = shapely.union_all(geometries[starts[i]:ends[i]])
+    return merged, groups[starts]
+
+def collectParts(parts: np.ndarray, owner: np.ndarray, count: int, empty: shapely.Geometry) -> np.ndarray:
+    """Collect polygon parts to geometries 0..count-1 by owner index.
+
+    Owners with a single part get the polygon, owners with more parts a
+    multipolygon and owners without parts the empty geometry."""
+    order = np.argsort(owner, kind="stable")
+    parts = parts[order]
+    owner = owner[order]
+    counts = np.bincount(owner, minlength=count)
+    collected = np.full(count, empty, dtype=object)
+    present, present_index = np.unique(owner, return_inverse=True)
+    collected[present] = shapely.multipolygons(parts, indices=present_index)
+    single = counts == 1
+    collected[single] = parts[np.searchsorted(owner, np.flatnonzero(single))]
+    collected[counts == 0] = empty
+    return collected
+
+def removeSlivers(geometries: np.ndarray, sliverArea: float) -> np.ndarray:
+    """Remove polygon parts and holes smaller than sliverArea.
+
+    Gaps left inside a dissolved feature are filled and tiny pieces left
+    over from clipping are dropped. Geometries without polygon parts
+    become empty polygons."""
+    parts, owner = polygonParts(geometries)
+    rings, ring_owner = shapely.get_rings(parts, return_index=True)
+    shell = np.r_[True, ring_owner[1:] != ring_owner[:-1]]
+    keep = shell | (shapely.area(shapely.polygons(rings)) >= sliverArea)
+    parts = shapely.polygons(rings[keep], indices=ring_owner[keep])
+
+    large = shapely.area(parts) >= sliverArea
+    return collectParts(parts[large], owner[large], len(geometries), shapely.Polygon())
+
+def cleanupTopology(geometry: gpd.GeoDataFrame, distance: float, mode: str = "buffer", gridSize: float = 0.01, sliverArea: float = 0.01) -> gpd.GeoSeries:
+    """Clean up intersection problems of areas.
+
+    Supported modes:
+        buffer - buffer by distance and take the buffer back
+        precision - snap coordinates to a gridSize grid and remove holes and
+                    parts smaller than sliverArea (m2)
+
+    Precision mode does not close gaps like buffers do, so it suits small
+    cleanup distances only."""
+    if mode == "buffer":
+        return parallel.buffer(parallel.buffer(geometry, distance), -distance)
+    if mode == "precision":
+        snapped = parallel.geometry_map(shapely.set_precision, np.asarray(geometry.geometry.values), gridSize)
+        cleaned = removeSlivers(snapped, sliverArea)
+        return gpd.GeoSeries(cleaned, index=geometry.index, crs=geometry.crs)
+    raise ValueError("Unknown topology cleanup mode: {}".format(mode))
+
+def connectedComponents(count: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Return component label of nodes 0..count-1 connected by edges left-right.
+
+    Label of a component is its smallest node."""
+    labels = np.arange(count)
+    while True:
+        smallest = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, smallest)
+        np.minimum.at(updated, right, smallest)
+        # pointer jumping to roots
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+def stitchTiles(geometries: np.ndarray, groups: np.ndarray, tiles: np.ndarray, workers: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """Merge polygons of the same group across tile edges.
+
+    Geometries are unioned per (tile, group). Only polygon parts which
+    intersect parts of the same group in other tiles are unioned again,
+    each connected set of parts separately in worker processes.
+    Return polygon parts and their group values."""
+    parts, owner = polygonParts(geometries)
+    groups = groups[owner]
+    tiles = tiles[owner]
+
+    # exact predicate only for candidates of the same group in other tiles
+    left, right = shapely.STRtree(parts).query(parts)
+    across = (left < right) & (groups[left] == groups[right]) & (tiles[left] != tiles[right])
+    left, right = left[across], right[across]
+    touching = shapely.intersects(parts[left], parts[right])
+    components = connectedComponents(len(parts), left[touching], right[touching])
+
+    order = np.argsort(components, kind="stable")
+    components = components[order]
+    starts = np.flatnonzero(np.r_[True, components[1:] != components[:-1]])
+    ends = np.r_[starts[1:], len(components)]
+    # largest sets of parts first to balance the worker load
+    stitched = np.flatnonzero(ends - starts > 1)
+    stitched = stitched[np.argsort(starts[stitched] - ends[stitched], kind="stable")]
+    results = parallel.process_map(
+        shapely.union_all,
+        [parts[order[starts[i]:ends[i]]] for i in stitched],
+        workers=workers,
+    )
+
+    merged = parts[order[starts]]
+    merged[stitched] = results
+    merged_parts, merged_owner = polygonParts(merged)
+    return merged_parts, groups[components[starts][merged_owner]]
+
+def dissolveTiled(geometry: gpd.GeoDataFrame, by, aggfunc="first", as_index=False, tileSize=None, workers=None) -> gpd.GeoDataFrame:
+    """Dissolve geometries by attributes in spatial tiles.
+
+    Same as GeoDataFrame.dissolve for polygon data. Features are assigned to
+    a grid of tileSize tiles by their bounding box center, each tile is
+    dissolved in a worker process and tile results are stitched together.
+    Small inputs, other geometry types and serial configuration use plain
+    dissolve."""
+    tileSize = tileSize or parallel.dissolve_tile_size()
+    workers = workers or parallel.worker_count()
+    geometries = np.asarray(geometry.geometry.values)
+    polygonal = np.isin(shapely.get_type_id(geometries), [-1, shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON])
+    if workers <= 1 or len(geometry) < parallel.MIN_PARALLEL_FEATURES or not polygonal.all():
+        return geometry.dissolve(by=by, aggfunc=aggfunc, as_index=as_index)
 
-    mask_dissolved = mask_dissolved.explode(ignore_index=True)
-    mask_dissolved = makeValid(mask_dissolved)
+    grouped = geometry.drop(columns=geometry.geometry.name).groupby(by, sort=True)
+    aggregated = grouped.agg(aggfunc)
+    # rows with missing group values are dropped like in dissolve
+    codes = grouped.ngroup().fillna(-1).to_numpy().astype(np.int64)
+    keep = (codes >= 0) & ~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)
+    geometries = geometries[keep]
+    codes = codes[keep]
+    if not len(geometries):
+        return geometry.dissolve(by=by, aggfunc=aggfunc, as_index=as_index)
+
+    bounds = shapely.bounds(geometries)
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2
+    column = np.floor((cx - cx.min()) / tileSize).astype(np.int64)
+    row = np.floor((cy - cy.min()) / tileSize).astype(np.int64)
+    tiles = column * (row.max() + 1) + row
+
+    order = np.argsort(tiles, kind="stable")
+    tiles = tiles[order]
+    starts = np.flatnonzero(np.r_[True, tiles[1:] != tiles[:-1]])
+    ends = np.r_[starts[1:], len(tiles)]
+    results = parallel.process_map(
+        unionByGroup,
+        [geometries[order[s:e]] for s, e in zip(starts, ends)],
+        [codes[order[s:e]] for s, e in zip(starts, ends)],
+        workers=workers,
+    )
+    tile_geometries = np.concatenate([merged for merged, _ in results])
+    tile_codes = np.concatenate([group for _, group in results])
+    tile_ids = np.repeat(tiles[starts], [len(group) for _, group in results])
+    parts, part_codes = stitchTiles(tile_geometries, tile_codes, tile_ids, workers)
+
+    # polygon parts of each group as one geometry like unary union returns
+    dissolved = collectParts(parts, part_codes, len(aggregated), shapely.from_wkt("GEOMETRYCOLLECTION EMPTY"))
+
+    retval = gpd.GeoDataFrame({geometry.geometry.name: dissolved}, index=aggregated.index, geometry=geometry.geometry.name, crs=geometry.crs)
+    retval = retval.join(aggregated)
+    if not as_index:
+        retval = retval.reset_index()
+    return retval
+
+def mergeLines(lines: gpd.GeoDataFrame, by, aggfunc="first") -> gpd.GeoDataFrame:
+    """Merge lines having the same attribute values by to one geometry.
+
+    Lines of a group are unioned and merged to as long lines as possible.
+    Other attributes are aggregated with aggfunc like in dissolve, missing
+    group values form groups of their own."""
+    grouped = lines.drop(columns=lines.geometry.name).groupby(by, dropna=False, sort=False)
+    aggregated = grouped.agg(aggfunc).reset_index()
+    merged, _ = unionByGroup(np.asarray(lines.geometry.values), grouped.ngroup().to_numpy())
+    merged = parallel.geometry_map(shapely.line_merge, merged)
+    return gpd.GeoDataFrame(aggregated, geometry=gpd.GeoSeries(merged, crs=lines.crs))
+
+def classDistances(lines: gpd.GeoDataFrame, classColumn: str, classValues: dict, buffers: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Return row positions of lines and their buffer distances.
+
+    Rows are ordered by buffer class and by their position within a class.
+    A row whose value belongs to several classes is returned once per class.
+    Rows falling into no class are reported and left out."""
+    values = lines[classColumn]
+    class_rows = [np.flatnonzero(values.isin(classValues[buffer_class])) for buffer_class in buffers]
+    rows = np.concatenate([np.zeros(0, dtype=np.int64)] + class_rows)
+    distances = np.repeat(np.array(list(buffers.values()), dtype=float), [len(r) for r in class_rows])
+
+    unmatched = np.ones(len(lines), dtype=bool)
+    unmatched[rows] = False
+    if unmatched.any():
+        counts = lines.loc[unmatched, classColumn].value_counts(dropna=False)
+        logger.warning(
+            "%d lines have no buffer class in %s and are not buffered: %s",
+            unmatched.sum(),
+            classColumn,
+            ", ".join("{} ({})".format(value, count) for value, count in counts.items()),
+        )
+    return rows, distances
+
+def bufferLinesByClass(lines: gpd.GeoDataFrame, classColumn: str, classValues: dict, buffers: dict, strategy="per_feature", groupAttrs=None, aggfunc="first") -> gpd.GeoDataFrame:
+    """Buffer lines by buffer distance of their class.
+
+    classValues maps buffer class to values of classColumn and buffers maps
+    buffer class to buffer distance. Distances are looked up for every row
+    and all lines are buffered in one call, lines without a class are
+    reported and dropped.
+
+    Strategies:
+        per_feature - every line is buffered separately
+        union - lines of a class having the same groupAttrs values are
+                merged and the merged network is buffered once, attributes
+                are aggregated with aggfunc. groupAttrs should contain the
+                attributes the buffered areas are dissolved by later."""
+    if strategy not in ["per_feature", "union"]:
+        raise ValueError("Unknown buffer strategy: {}".format(strategy))
+
+    rows, distances = classDistances(lines, classColumn, classValues, buffers)
+    retval = lines.iloc[rows].reset_index(drop=True)
+    if strategy == "union" and len(retval):
+        retval["_buffer_distance"] = distances
+        retval = mergeLines(retval, list(groupAttrs) + ["_buffer_distance"], aggfunc)
+        distances = retval.pop("_buffer_distance").to_numpy(dtype=float)
+
+    retval["geometry"] = parallel.buffer(retval, distances)
+    return retval
+
+def joinWithinDistance(lines: gpd.GeoDataFrame, areas: gpd.GeoDataFrame, by, distance: float, columns=(), sindex=None) -> gpd.GeoDataFrame:
+    """Join attributes of area groups to lines lying within distance of the group.
+
+    Areas having the same by values form a group. A line is joined to a group
+    when it lies within the areas of the group buffered by distance. That
+    equals sjoin with predicate within against the areas dissolved by by and
+    buffered by distance, without dissolving the whole layer:
+
+    - candidate areas of each line are found with a dwithin query of the
+      spatial index of areas
+    - a group is rejected when a vertex of the line is not within distance
+      of any of its prepared candidate areas
+    - a group is accepted when the line is within one buffered candidate
+    - otherwise the buffered candidates of the group are subtracted from the
+      line one at a time and the group is accepted when nothing is left
+
+    Values of columns are taken from the first area of the group like in
+    dissolve. Result is a left join in the order of lines: a line within
+    distance of several groups is repeated once per group and lines of no
+    group get missing values."""
+    if sindex is None:
+        sindex = areas.sindex
+    by = list(by) if isinstance(by, (list, tuple)) else [by]
+    grouped = areas.drop(columns=areas.geometry.name).groupby(by, sort=True)
+    groupValues = grouped.first().reset_index()[by + list(columns)]
+    groupCodes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    groupCount = max(len(groupValues), 1)
+
+    geometries = np.asarray(lines.geometry.values)
+    line, area = sindex.query(geometries, predicate="dwithin", distance=distance)
+    line, area = line[groupCodes[area] >= 0], area[groupCodes[area] >= 0]
+    candidates, area = np.unique(area, return_inverse=True)
+    areaGeometries = np.asarray(areas.geometry.values)[candidates]
+    shapely.prepare(areaGeometries)
+
+    # (line, group) pairs, candidate areas of a pair in consecutive rows
+    key = line * groupCount + groupCodes[candidates][area]
+    order = np.argsort(key, kind="stable")
+    key, area = key[order], area[order]
+    pairs, pair, pairSizes = np.unique(key, return_inverse=True, return_counts=True)
+    rank = np.arange(len(key)) - np.repeat(np.cumsum(pairSizes) - pairSizes, pairSizes)
+
+    # every vertex of the line must be within distance of the group
+    coords, owner = shapely.get_coordinates(geometries, return_index=True)
+    pointCounts = np.bincount(owner, minlength=len(lines))
+    firstPoints = np.cumsum(pointCounts) - pointCounts
+    rowCounts = pointCounts[key // groupCount]
+    row = np.repeat(np.arange(len(key)), rowCounts)
+    point = firstPoints[key // groupCount][row] + np.arange(len(row)) - np.repeat(np.cumsum(rowCounts) - rowCounts, rowCounts)
+    hit = parallel.geometry_map(shapely.dwithin, shapely.points(coords[point]), areaGeometries[area[row]], distance)
+    pointPairs = np.unique(point[hit] * len(pairs) + pair[row[hit]])
+    hits = np.bincount(pointPairs % len(pairs), minlength=len(pairs)) if len(pairs) else np.zeros(0, dtype=int)
+    possible = hits == pointCounts[pairs // groupCount]
+
+    # the line must be covered by the buffered candidates of the group
+    remainder = geometries[pairs // groupCount].copy()
+    remainder[~possible] = None
+    buffered = np.full(len(candidates), None, dtype=object)
+    used = np.unique(area[possible[pair]])
+    buffered[used] = np.asarray(parallel.buffer(gpd.GeoSeries(areaGeometries[used]), distance).values)
+    shapely.prepare(buffered[used])
+    selected = possible[pair]
+    within = np.zeros(len(key), dtype=bool)
+    within[selected] = parallel.geometry_map(shapely.within, geometries[key[selected] // groupCount], buffered[area[selected]])
+    remainder[pair[within]] = shapely.Point()
+    for current in range(pairSizes.max() if len(pairs) else 0):
+        selected = (rank == current) & possible[pair] & ~shapely.is_empty(remainder[pair])
+        remainder[pair[selected]] = parallel.geometry_map(shapely.difference, remainder[pair[selected]], buffered[area[selected]])
+    matched = pairs[possible & shapely.is_empty(remainder)]
+
+    unmatched = np.ones(len(lines), dtype=bool)
+    unmatched[matched // groupCount] = False
+    rows = np.concatenate([matched // groupCount, np.flatnonzero(unmatched)])
+    groups = np.concatenate([matched % groupCount, np.full(unmatched.sum(), -1)])
+    order = np.argsort(rows, kind="stable")
+
+    retval = lines.iloc[rows[order]].reset_index(drop=True)
+    joined = groupValues.reindex(groups[order])
+    for column in joined.columns:
+        retval[column] = joined[column].to_numpy()
+    return retval
+
+def clipByMaskParts(geometry: gpd.GeoDataFrame, mask_parts: np.ndarray) -> tuple[gpd.GeoDataFrame, np.ndarray]:
+    """Clip geometries by mask parts.
+
+    Candidate pairs are searched from spatial index of mask parts and only
+    intersecting pairs are intersected. Pieces of a feature are merged and
+    their polygon parts are returned with attributes of the source rows.
+    Return clipped rows and boolean array of features not touched by the mask."""
+    geometries = np.asarray(geometry.geometry.values)
+    tree = shapely.STRtree(mask_parts)
+    feature_index, part_index = tree.query(geometries, predicate="intersects")
+
+    pieces = parallel.geometry_map(shapely.intersection, geometries[feature_index], mask_parts[part_index])
+    pieces, piece_index = polygonParts(pieces)
+    merged, merged_index = unionByGroup(pieces, feature_index[piece_index])
+    parts, part_owner = polygonParts(merged)
+    owner = merged_index[part_owner]
+
+    clipped = geometry.iloc[owner].reset_index(drop=True)
+    clipped = clipped.set_geometry(gpd.GeoSeries(parts, crs=geometry.crs).values, crs=geometry.crs)
+
+    untouched = np.ones(len(geometry), dtype=bool)
+    untouched[owner] = False
+    return clipped, untouched
+
+def clipAreasByAreas(geometryToClip: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, geometryToClipAttrsDissolve, geometryToClipCheckAttr=None, dissolveBetween=False, clippedBuffer=None, resultBuffer=0.1, cleanupMode="buffer", gridSize=0.01, sliverArea=0.01) -> gpd.GeoDataFrame:
+    """Clip areas by mask areas and dissolve the result.
+
+    Features having geometryToClipCheckAttr value are clipped by the mask,
+    other features are kept as they are. Parts of clipped features which do
+    not touch the mask at all are kept whole. Untouched parts are found per
+    exploded part, so the parts of a partly clipped multipart feature that do
+    not touch the mask are kept too.
+
+    Options:
+        dissolveBetween - dissolve clipped features by attributes before
+                          adding the other features
+        clippedBuffer - distance of buffer and negative buffer applied to
+                        clipped features, closes small gaps between pieces
+        resultBuffer - distance of buffer and negative buffer applied to all
+                       features before final dissolve, None to skip
+        cleanupMode, gridSize, sliverArea - how resultBuffer cleanup is
+                                            done, see cleanupTopology
+
+    Only invalid geometries are repaired."""
+    geometry = geometryToClip[~geometryToClip.is_empty]
+    mask_parts = maskParts(mask)
 
     if geometryToClipCheckAttr is not None:
         geometryToClipOnlyCheckObjects = geometry[geometry[geometryToClipCheckAttr].notnull()]
@@ -28,47 +457,36 @@ def clipAreasByAreas(geometryToClip: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, g
         geometryToClipOnlyCheckObjects = geometry
 
     geometryToClipOnlyCheckObjects = geometryToClipOnlyCheckObjects.explode(ignore_index=True)
-    geometryToClipOnlyCheckObjects = makeValid(geometryToClipOnlyCheckObjects)
-    # Actual clipping:
-    clipped_result=gpd.clip(geometryToClipOnlyCheckObjects, mask_dissolved)
-    clipped_result = clipped_result.explode(ignore_index=True)
+    geometryToClipOnlyCheckObjects = repairInvalid(geometryToClipOnlyCheckObjects, "clip input")
+    # Actual clipping, objects which were not clipped are kept whole
+    clipped_result, untouched = clipByMaskParts(geometryToClipOnlyCheckObjects, mask_parts)
+    not_clipped = geometryToClipOnlyCheckObjects[untouched]
 
-    # Getting objects which were not clipped
-    clipped_result = makeValid(clipped_result)
-    clipped_result = clipped_result[clipped_result.geometry.type != 'Point']
-    clipped_result = clipped_result[clipped_result.geometry.type != 'LineString']
+    if clippedBuffer is not None:
+        clipped_result["geometry"] = parallel.buffer(clipped_result, clippedBuffer)
+        clipped_result["geometry"] = parallel.buffer(clipped_result, -clippedBuffer)
 
     if dissolveBetween:
-        clipped_result = clipped_result.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
-
-    clipped_result.reset_index(drop=True)
-    geometryToClipOnlyCheckObjects.reset_index(drop=True)
-    merged = geometryToClipOnlyCheckObjects.merge(clipped_result, how="outer", indicator=True, on=mergeIdField, suffixes=("", "_right"))
-    not_clipped = merged[merged["_merge"] == "left_only"].copy()
-    not_clipped.drop("_merge", axis=1, inplace=True)
-    common_columns = set(geometryToClipOnlyCheckObjects.columns).intersection(not_clipped.columns)
-    common_columns.add(geometryToClipOnlyCheckObjects.geometry.name)
-    common_columns_list = list(common_columns)
-    not_clipped = not_clipped[common_columns_list].copy()
+        clipped_result = dissolveTiled(clipped_result, geometryToClipAttrsDissolve)
 
     # Adding clipped results to objects which were not checked at all
     if geometryToClipCheckAttr is not None:
         retval = gpd.GeoDataFrame(pd.concat([geometryToClipNotCheckObjects, clipped_result], ignore_index=True))
     else:
-        retval = geometryToClipOnlyCheckObjects
+        retval = clipped_result
 
     # Adding not clipped objects
     retval = gpd.GeoDataFrame(pd.concat([retval, not_clipped], ignore_index=True))
-    retval = makeValid(retval)
+    retval = repairInvalid(retval, "clip result")
 
-    # Make a small buffer and take it back to get rid of intersection problems
-    retval["geometry"] = retval.buffer(0.1)
-    retval["geometry"] = retval.buffer(-0.1)
+    # Make a small buffer and take it back (or snap to grid) to get rid of intersection problems
+    if resultBuffer is not None:
+        retval["geometry"] = cleanupTopology(retval, resultBuffer, cleanupMode, gridSize, sliverArea)
 
     for attr in geometryToClipAttrsDissolve:
         retval[attr] = retval[attr].fillna("")
     if geometryToClipAttrsDissolve:
-        retval = retval.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
+        retval = dissolveTiled(retval, geometryToClipAttrsDissolve)
     retval = retval.explode(ignore_index=True)
 
-    return retval
\ No newline at end of file
+    return retval
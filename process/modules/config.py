@@ -69,6 +69,10 @@ class Config:
     def deployment_profile(self) -> str:
         return self._deployment_profile
 
+    def addr(self, item: str) -> str:
+        """Return source address from configuration."""
+        return self._cfg.get(item, {}).get("addr")
+
     def local_file(self, item: str) -> str:
         """Return local file name from configuration."""
         file_path = self._file_directory()
@@ -84,6 +88,38 @@ class Config:
         file_path = self._file_directory("output_dir")
         return "/".join([file_path, self._cfg.get(item, {}).get("target_buffer_file")])
 
+    def target_segment_file(self, item: str) -> str:
+        """Return target segment file name from configuration."""
+        file_path = self._file_directory("output_dir")
+        return "/".join([file_path, self._cfg.get(item, {}).get("target_segment_file")])
+
+    def output_directory(self) -> str:
+        """Return directory of gis output files."""
+        return self._file_directory("output_dir")
+
+    def section(self, item: str) -> dict:
+        """Return configuration section of item."""
+        return dict(self._cfg.get(item) or {})
+
+    def run_report_file(self, run: str) -> str:
+        """Return file name of JSON stage report of run, None if not configured."""
+        return self._run_file("run_report", run)
+
+    def metrics_textfile(self, run: str) -> str:
+        """Return file name of Prometheus textfile of run, None if not configured."""
+        return self._run_file("metrics_textfile", run)
+
+    def _run_file(self, key: str, run: str) -> str:
+        """Return run specific file name, relative names are in output directory."""
+        name = self._cfg.get("common", {}).get(key)
+        if not name:
+            return None
+        name = name.format(run)
+        if os.path.isabs(name):
+            return name
+        directory = self._file_directory("output_dir")
+        return os.path.join(directory, name) if directory is not None else None
+
     def crs(self) -> str:
         """Return CRS information from config file."""
         return self._cfg.get("common").get("crs")
@@ -116,6 +152,97 @@ class Config:
         """Return buffer value list from configuration."""
         return self._cfg.get(item, {}).get("ylre_street_class_buffer")
 
+    def buffer_strategy(self, item: str) -> str:
+        """Return strategy of class based line buffering.
+
+        Supported strategies:
+            - per_feature: every line is buffered separately
+            - union: lines of a dissolve group are merged and buffered once"""
+        return self._cfg.get(item, {}).get("buffer_strategy", "per_feature")
+
+    def gtfs_cache(self) -> bool:
+        """Return True if parsed GTFS tables are cached next to the feed."""
+        return self._cfg.get("common", {}).get("gtfs_cache", True)
+
+    def reference_mask_cache(self) -> bool:
+        """Return True if dissolved reference masks are cached in output directory."""
+        return self._cfg.get("common", {}).get("reference_mask_cache", True)
+
+    def build_cache(self) -> bool:
+        """Return True if items with unchanged inputs reuse their previous outputs."""
+        return self._cfg.get("common", {}).get("build_cache", True)
+
+    def force_rebuild(self) -> bool:
+        """Return True if all items are rebuilt regardless of build manifests.
+
+        Environment variable TORMAYS_FORCE_REBUILD overrides configuration."""
+        force = os.environ.get("TORMAYS_FORCE_REBUILD")
+        if force:
+            return force.strip().lower() in ("1", "true", "yes")
+        return self._cfg.get("common", {}).get("force_rebuild", False)
+
+    def parallel_workers(self) -> int:
+        """Return number of parallel workers, 0 means number of CPU cores."""
+        return self._cfg.get("common", {}).get("parallel_workers", 1)
+
+    def processor_workers(self) -> int:
+        """Return number of items processed concurrently, 0 means number of CPU cores."""
+        return self._cfg.get("common", {}).get("processor_workers", 1)
+
+    def geometry_threads(self) -> int:
+        """Return number of threads for geometry operations, 0 means number of CPU cores."""
+        return self._cfg.get("common", {}).get("geometry_threads", 1)
+
+    def dissolve_tile_size(self) -> float:
+        """Return tile size in meters used in tiled dissolve."""
+        return self._cfg.get("common", {}).get("dissolve_tile_size", 1000)
+
+    def topology_cleanup(self) -> str:
+        """Return topology cleanup mode of clipped areas.
+
+        Supported modes:
+            - buffer: small buffer and negative buffer
+            - precision: snapping to precision grid and sliver removal"""
+        return self._cfg.get("common", {}).get("topology_cleanup", "buffer")
+
+    def precision_grid(self) -> float:
+        """Return grid size in meters used in precision topology cleanup."""
+        return self._cfg.get("common", {}).get("precision_grid", 0.01)
+
+    def sliver_area(self) -> float:
+        """Return area in square meters below which holes and parts are removed in precision topology cleanup."""
+        return self._cfg.get("common", {}).get("sliver_area", 0.01)
+
+    def gtfs_loader(self, item: str) -> str:
+        """Return GTFS loader name from configuration.
+
+        Supported loaders:
+            - gtfs_kit
+            - arrow"""
+        return self._cfg.get(item, {}).get("gtfs_loader", "gtfs_kit")
+
+    def rush_hour_full_day(self, item: str) -> bool:
+        """Return True if rush hours are scanned over the whole service day."""
+        return self._cfg.get(item, {}).get("rush_hour_full_day", False)
+
+    def rush_hour_period(self, item: str) -> str:
+        """Return period whose rush hours are analysed.
+
+        Supported periods:
+            - day: transit day only
+            - week: every day of transit week"""
+        return self._cfg.get(item, {}).get("rush_hour_period", "day")
+
+    def rush_hour_percentile(self, item: str) -> float:
+        """Return percentile of daily peak hours used over the period.
+
+        None means maximum."""
+        return self._cfg.get(item, {}).get("rush_hour_percentile")
+
+    def segment_frequency(self, item: str) -> bool:
+        """Return True if departures are also summed per shared street segment."""
+        return self._cfg.get(item, {}).get("segment_frequency", False)
+
     def pg_conn_uri(self, deployment: str = None) -> str:
         """Return PostgreSQL connection URI
 
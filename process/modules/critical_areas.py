@@ -15,6 +15,8 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 class CriticalAreas(GisProcessor):
     """Process critical areas."""
 
+    outputs = [("critical_areas", "target_buffer_file")]
+
     def __init__(self, cfg: Config):
         self._cfg = cfg
         self._process_result_polygons = None
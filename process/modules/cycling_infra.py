@@ -4,11 +4,12 @@ import numpy as np
 from sqlalchemy import create_engine, text
 #from shapely.validation import explain_validity
 from os import path
-from shapely.validation import make_valid
 from shapely.geometry import MultiPolygon, Polygon, GeometryCollection
 
 from modules.config import Config
 from modules.gis_processing import GisProcessor
+from modules.common import bufferLinesByClass, dissolveTiled, joinWithinDistance, repairInvalid
+from modules.layer_store import LayerStore
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -17,8 +18,13 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 class CycleInfra(GisProcessor):
     """Process cycle route infra."""
 
-    def __init__(self, cfg: Config):
+    inputs = [("ylre_katualueet", "target_buffer_file")]
+    outputs = [("cycle_infra", "target_file"), ("cycle_infra", "target_buffer_file")]
+
+    def __init__(self, cfg: Config, layers: LayerStore = None):
         self._cfg = cfg
+        if layers is None:
+            layers = LayerStore(cfg)
         self._process_result_lines = None
         self._process_result_polygons = None
         self._debug_result_lines = None
@@ -33,9 +39,7 @@ class CycleInfra(GisProcessor):
             raise FileNotFoundError("ylre katualueet polygon not found")
 
         # Loading ylre_katualueet dataset
-        ylre_katualueet_filename = cfg.target_buffer_file("ylre_katualueet")
-        self._ylre_katualueet = gpd.read_file(ylre_katualueet_filename)
-        self._ylre_katualueet["geometry"] = self._ylre_katualueet.buffer(self._ylre_street_class_buffer)
+        self._ylre_katualueet = layers.get("ylre_katualueet")
         self._ylre_katualueet_sindex = self._ylre_katualueet.sindex
 
         # Following hierarchy levels included into data
@@ -78,6 +82,7 @@ class CycleInfra(GisProcessor):
 
         if len(self._buffers) != 4:
             raise ValueError("Unknown number of buffer values")
+        self._buffer_strategy = self._cfg.buffer_strategy(self._module)
 
         # Buffering classes
         self._buffer_class_yksisuuntaisuus_values = {
@@ -174,30 +179,26 @@ class CycleInfra(GisProcessor):
         return str(row["hierarkia"]) + str(row["yksisuuntaisuus"])
 
     def _buffering(self, lines: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        # Buffer lines
+        # Buffer lines, merged lines are grouped like in the final dissolve
         target_infra_polys = lines.copy()
         target_infra_polys["hierarkia_yksisuuntaisuus"] = target_infra_polys.apply(self._combine_columns, axis=1)
-        retval = target_infra_polys[0:0]
-        for buffer_class, buffer_value in self._buffers.items():
-            buffered_items = target_infra_polys.loc[target_infra_polys["hierarkia_yksisuuntaisuus"].isin(self._buffer_class_yksisuuntaisuus_values[buffer_class])].copy()
-            buffered_items["geometry"] = buffered_items.buffer(buffer_value)
-            retval = gpd.GeoDataFrame(pd.concat([retval, buffered_items], ignore_index=True))
-
-        return retval
+        return bufferLinesByClass(
+            target_infra_polys,
+            "hierarkia_yksisuuntaisuus",
+            self._buffer_class_yksisuuntaisuus_values,
+            self._buffers,
+            self._buffer_strategy,
+            groupAttrs=["paatyyppi", "alatyyppi", "silta_alikulku", "hierarkia", "yksisuuntaisuus", "kadun_nimi"],
+            aggfunc="sum",
+        )
 
     def _check_and_set_ylre_classes_id(self, lines: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        attrs = ["ylre_class", "kadun_nimi"]
-        ylre_katualueet_dissolved = self._ylre_katualueet.dissolve(by=attrs)
-        joined_result = gpd.sjoin(lines, ylre_katualueet_dissolved, predicate='within')
-
-        retval = lines.merge(joined_result[['uuid','ylre_class','kadun_nimi']], how='left', left_on='uuid', right_on='uuid')
+        retval = joinWithinDistance(
+            lines, self._ylre_katualueet, ["ylre_class", "kadun_nimi"], self._ylre_street_class_buffer, sindex=self._ylre_katualueet_sindex
+        )
 
         return retval
 
-    def _makeValid(self, data, geom_column):
-        data[geom_column] = data.apply(lambda row: make_valid(row[geom_column]) if not row[geom_column].is_valid else row[geom_column], axis=1)
-        return(data)
-
     def process(self):
         self._process_result_lines = self._lines
 
@@ -221,7 +222,8 @@ class CycleInfra(GisProcessor):
         self._process_result_lines = self._process_result_lines[~self._process_result_lines.index.isin(filtered_gdf.index)]
 
         # Mark objects which are within YLRE katualueet areas
-        self._process_result_lines = self._check_and_set_ylre_classes_id(self._process_result_lines)
+        with self.stage("join") as stage:
+            self._process_result_lines = stage.count(self._check_and_set_ylre_classes_id(self._process_result_lines))
 
         # Buffering configuration
         buffers = self._cfg.buffer(self._module)
@@ -229,8 +231,9 @@ class CycleInfra(GisProcessor):
             raise ValueError("Unknown number of buffer values")
 
         # Buffer lines using buffer configuration
-        target_infra_polys = self._process_result_lines.copy()
-        target_infra_polys = self._buffering(target_infra_polys)
+        with self.stage("buffer") as stage:
+            target_infra_polys = self._process_result_lines.copy()
+            target_infra_polys = stage.count(self._buffering(target_infra_polys))
 
         # Drop unnecessary columns
         target_infra_polys = self._drop_unnecessary_columns(
@@ -242,7 +245,8 @@ class CycleInfra(GisProcessor):
         for attr in attrs:
             target_infra_polys[attr] = target_infra_polys[attr].fillna("")
 
-        target_infra_polys = target_infra_polys.dissolve(by=attrs, aggfunc="sum", as_index=False)
+        with self.stage("dissolve") as stage:
+            target_infra_polys = stage.count(dissolveTiled(target_infra_polys, attrs, aggfunc="sum"))
 
         # Set hierarchy alue to "Puistoreitti" where alatyyppi is "Puistotie- tai väylä" and hierarchy is null
         target_infra_polys.loc[(target_infra_polys["alatyyppi"] == 'Puistotie- tai väylä') & ((target_infra_polys["hierarkia"] == "") | target_infra_polys["hierarkia"].isna()), "hierarkia"] = "Puistoreitti"
@@ -251,7 +255,7 @@ class CycleInfra(GisProcessor):
         target_infra_polys = target_infra_polys.explode(ignore_index=True)
 
         # Validate geometry
-        target_infra_polys = self._makeValid(target_infra_polys, "geometry")
+        target_infra_polys = repairInvalid(target_infra_polys, self._module)
 
         target_infra_polys = target_infra_polys[~target_infra_polys.is_empty]
         # save to instance
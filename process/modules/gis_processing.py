@@ -1,9 +1,39 @@
 from abc import ABC, abstractmethod
 
+from modules import instrumentation
+
 class GisProcessor(ABC):
     """Abstract base class for GIS processing classes.
     
-    This class helps keeping interface consistent."""
+    This class helps keeping interface consistent.
+
+    Files read and written by the processor are declared in inputs and
+    outputs as (item, file) pairs, file being "target_file",
+    "target_buffer_file" or "local_file" of the configuration item. They
+    order processing of items in process_data.py and tell which shared
+    layers the processor reads from the layer store."""
+    inputs = ()
+    outputs = ()
+
+    def stage(self, name: str):
+        """Record named sub-step of processing (read, buffer, clip, dissolve...).
+
+        Use as context manager, the yielded record counts rows and vertices
+        of data given to its count()."""
+        return instrumentation.stage(self._module, name)
+
+    def run(self):
+        """Process, persist and save results recording each as a stage.
+
+        Reading happens in the constructor, so its stage is recorded by the
+        caller creating the processor."""
+        with self.stage("process"):
+            self.process()
+        with self.stage("persist_to_database"):
+            self.persist_to_database()
+        with self.stage("save_to_file"):
+            self.save_to_file()
+
     @abstractmethod
     def process(self):
         pass
@@ -14,4 +44,4 @@ class GisProcessor(ABC):
 
     @abstractmethod
     def save_to_file(self):
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,265 @@
+"""Vectorized helpers for GTFS schedule data."""
+import logging
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# Departures are aggregated into 15 minute bins, four bins make one hour
+BIN_SECONDS = 15 * 60
+BINS_PER_DAY = SECONDS_PER_DAY // BIN_SECONDS
+HOUR_BINS = 4
+WEEKDAYS = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+
+def departure_seconds(departure_times: pd.Series) -> np.ndarray:
+    """Convert GTFS time strings to seconds since midnight.
+
+    Hour values larger than 23 are supported, e.g. "25:10:00" is 90600.
+    Missing or malformed values are returned as -1."""
+    parts = departure_times.astype("string").str.extract(r"^\s*(\d+):(\d\d):(\d\d)\s*$")
+    hms = parts.apply(pd.to_numeric, errors="coerce")
+    seconds = hms[0] * 3600 + hms[1] * 60 + hms[2]
+    return seconds.fillna(-1).to_numpy(dtype="int64")
+
+
+def departure_bins(
+    groups: np.ndarray, n_groups: int, seconds: np.ndarray
+) -> np.ndarray:
+    """Count departures per group in 15 minute bins of the service day.
+
+    Times past midnight are wrapped to the same day and missing times
+    (negative seconds) are ignored.
+    Return matrix of shape (n_groups, BINS_PER_DAY)."""
+    groups = np.asarray(groups)
+    seconds = np.asarray(seconds)
+    valid = seconds >= 0
+    day_bins = (seconds[valid] % SECONDS_PER_DAY) // BIN_SECONDS
+    flat = groups[valid] * BINS_PER_DAY + day_bins
+    counts = np.bincount(flat, minlength=n_groups * BINS_PER_DAY)
+    return counts.reshape(n_groups, BINS_PER_DAY)
+
+
+def peak_window_counts(
+    bins: np.ndarray, window_bins: int = HOUR_BINS, window_starts: np.ndarray = None
+) -> np.ndarray:
+    """Return maximum count of any window of consecutive bins.
+
+    Sums are taken over the last axis with rolling windows of window_bins
+    bins. Windows wrap around midnight. If window_starts is given, only
+    windows starting at those bin indices are considered."""
+    wrapped = np.concatenate([bins, bins[..., : window_bins - 1]], axis=-1)
+    cumulative = np.cumsum(wrapped, axis=-1)
+    cumulative = np.concatenate(
+        [np.zeros(bins.shape[:-1] + (1,), dtype=cumulative.dtype), cumulative],
+        axis=-1,
+    )
+    window_sums = cumulative[..., window_bins:] - cumulative[..., :-window_bins]
+    if window_starts is not None:
+        window_sums = window_sums[..., window_starts]
+    return window_sums.max(axis=-1)
+
+
+class ServiceCalendar:
+    """Service activity of every service_id on every date of the feed.
+
+    The boolean service_id x date matrix is built once from calendar,
+    respecting weekday flags, and calendar_dates exceptions are folded in.
+    Date queries are plain array lookups after that."""
+
+    def __init__(self, calendar: pd.DataFrame, calendar_dates: pd.DataFrame = None):
+        if calendar is None:
+            calendar = pd.DataFrame(
+                columns=["service_id", "start_date", "end_date"] + WEEKDAYS
+            )
+        if calendar_dates is None:
+            calendar_dates = pd.DataFrame(
+                columns=["service_id", "date", "exception_type"]
+            )
+
+        start = pd.to_datetime(calendar["start_date"], format="%Y%m%d")
+        end = pd.to_datetime(calendar["end_date"], format="%Y%m%d")
+        exception_dates = pd.to_datetime(calendar_dates["date"], format="%Y%m%d")
+
+        all_dates = pd.concat([start, end, exception_dates], ignore_index=True)
+        if all_dates.empty:
+            dates = pd.DatetimeIndex([])
+        else:
+            dates = pd.date_range(all_dates.min(), all_dates.max(), freq="D")
+
+        self._dates = pd.Index(dates.strftime("%Y%m%d"))
+        self._service_ids = pd.Index(
+            pd.unique(
+                pd.concat(
+                    [calendar["service_id"], calendar_dates["service_id"]],
+                    ignore_index=True,
+                )
+            )
+        )
+        active = np.zeros((len(self._service_ids), len(self._dates)), dtype=bool)
+
+        if len(calendar) and len(dates):
+            day = np.arange(len(dates))
+            first_day = ((start - dates[0]).dt.days).to_numpy()[:, np.newaxis]
+            last_day = ((end - dates[0]).dt.days).to_numpy()[:, np.newaxis]
+            weekday_flags = calendar[WEEKDAYS].astype(int).to_numpy() == 1
+            in_service = (
+                (day >= first_day)
+                & (day <= last_day)
+                & weekday_flags[:, dates.weekday]
+            )
+            rows = self._service_ids.get_indexer(calendar["service_id"])
+            np.logical_or.at(active, rows, in_service)
+
+        if len(calendar_dates):
+            rows = self._service_ids.get_indexer(calendar_dates["service_id"])
+            columns = self._dates.get_indexer(exception_dates.dt.strftime("%Y%m%d"))
+            exception_type = calendar_dates["exception_type"].astype(int).to_numpy()
+            # 1 - service added for the date, 2 - service removed for the date
+            added = exception_type == 1
+            removed = exception_type == 2
+            active[rows[added], columns[added]] = True
+            active[rows[removed], columns[removed]] = False
+
+        self._active = active
+
+    def dates(self) -> list[str]:
+        """Return all dates covered by the calendar as YYYYMMDD strings."""
+        return self._dates.tolist()
+
+    def service_index(self) -> pd.Index:
+        """Return service_ids in matrix row order."""
+        return self._service_ids
+
+    def active(self, dates: list[str]) -> np.ndarray:
+        """Return boolean matrix of shape (number of service_ids, len(dates)).
+
+        Dates outside the calendar have no active services."""
+        columns = self._dates.get_indexer(list(dates))
+        known = columns >= 0
+        result = np.zeros((len(self._service_ids), len(columns)), dtype=bool)
+        result[:, known] = self._active[:, columns[known]]
+        return result
+
+    def service_ids(self, dates: list[str]) -> list[str]:
+        """Return service_ids operating on any of the given dates."""
+        operating = self.active(dates).any(axis=1)
+        return self._service_ids[operating].tolist()
+
+
+def shape_lines(
+    shapes: pd.DataFrame, crs: str, shape_ids: list[str] = None
+) -> gpd.GeoDataFrame:
+    """Form line geometries of GTFS shapes in given CRS.
+
+    Shape points are sorted once, coordinates are reprojected with a single
+    transform and all LineStrings are created with one shapely call.
+    Shapes with less than two points are skipped.
+    Return GeoDataFrame indexed by shape_id."""
+    if shape_ids is not None:
+        shapes = shapes[shapes["shape_id"].isin(shape_ids)]
+
+    codes, ids = pd.factorize(shapes["shape_id"], sort=True)
+    sequence = shapes["shape_pt_sequence"].to_numpy()
+    order = np.lexsort((sequence, codes))
+    order = order[codes[order] >= 0]
+    codes = codes[order]
+
+    point_counts = np.bincount(codes, minlength=len(ids))
+    is_line = point_counts >= 2
+    if not is_line.all():
+        logger.warning("Skipping %d shapes with less than two points", (~is_line).sum())
+    keep = is_line[codes]
+    line_index = np.cumsum(is_line) - 1
+
+    transformer = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+    x, y = transformer.transform(
+        shapes["shape_pt_lon"].to_numpy(dtype="float64")[order][keep],
+        shapes["shape_pt_lat"].to_numpy(dtype="float64")[order][keep],
+    )
+    lines = shapely.linestrings(np.column_stack([x, y]), indices=line_index[codes[keep]])
+
+    return gpd.GeoDataFrame(
+        geometry=lines, index=pd.Index(ids[is_line], name="shape_id"), crs=crs
+    )
+
+
+def shape_ids_in_area(
+    shapes: pd.DataFrame, area: shapely.Geometry, shape_ids: list[str] = None
+) -> np.ndarray:
+    """Return ids of shapes having at least one point inside area.
+
+    Area must be in WGS84 coordinates. Points are first filtered with the
+    bounding box of the area and the remaining points are tested against
+    the prepared area geometry without creating point objects."""
+    if shape_ids is not None:
+        shapes = shapes[shapes["shape_id"].isin(shape_ids)]
+
+    lon = shapes["shape_pt_lon"].to_numpy(dtype="float64")
+    lat = shapes["shape_pt_lat"].to_numpy(dtype="float64")
+    min_x, min_y, max_x, max_y = area.bounds
+    in_bbox = (lon >= min_x) & (lon <= max_x) & (lat >= min_y) & (lat <= max_y)
+
+    shapely.prepare(area)
+    inside = shapely.contains_xy(area, lon[in_bbox], lat[in_bbox])
+    return pd.unique(shapes["shape_id"].to_numpy()[in_bbox][inside])
+
+
+def shared_segments(
+    lines: np.ndarray, grid_size: float, tolerance: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Node lines into segments shared by overlapping lines.
+
+    Lines are unioned on a fixed precision grid, which splits them at every
+    crossing, junction and end point of another line and merges overlapping
+    parts. Each segment is then matched to the lines passing within
+    tolerance of its midpoint.
+    Return segments and pairs (segment index, line index) as two arrays."""
+    lines = np.asarray(lines)
+    noded = shapely.union_all(lines, grid_size=grid_size)
+    segments = shapely.get_parts(noded)
+    segments = segments[
+        shapely.get_type_id(segments) == shapely.GeometryType.LINESTRING
+    ]
+
+    midpoints = shapely.line_interpolate_point(segments, 0.5, normalized=True)
+    tree = shapely.STRtree(lines)
+    segment_index, line_index = tree.query(
+        midpoints, predicate="dwithin", distance=tolerance
+    )
+    return segments, segment_index, line_index
+
+
+def sum_by_segment(
+    line_values: np.ndarray,
+    segment_index: np.ndarray,
+    line_index: np.ndarray,
+    n_segments: int,
+) -> np.ndarray:
+    """Sum rows of line_values over the lines of every segment.
+
+    Return array with n_segments rows, segments without lines are zero."""
+    result = np.zeros((n_segments,) + line_values.shape[1:], dtype=line_values.dtype)
+    if len(segment_index) == 0:
+        return result
+
+    order = np.argsort(segment_index, kind="stable")
+    segment_index = segment_index[order]
+    starts = np.flatnonzero(np.r_[True, segment_index[1:] != segment_index[:-1]])
+    result[segment_index[starts]] = np.add.reduceat(
+        line_values[line_index[order]], starts, axis=0
+    )
+    return result
@@ -0,0 +1,278 @@
+"""Read GTFS feeds with a cache of parsed tables.
+
+Feeds are parsed either with gtfs_kit or with the multithreaded Arrow CSV
+reader ("arrow" loader). The Arrow loader reads only the columns listed in
+FEED_COLUMNS straight from the zip file, uses compact dtypes and keeps only
+the first stop of each trip in stop_times.
+
+Parsed tables are stored as uncompressed Arrow IPC (Feather) files next to
+the downloaded zip file. The cache is keyed by the content hash of the zip
+file, so every later reader of the same feed memory-maps the tables instead
+of parsing the CSV files again.
+"""
+import csv
+import io
+import logging
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+
+import gtfs_kit as gk
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+
+from modules.common import file_digest
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached table contents change
+CACHE_VERSION = 2
+CACHE_DIRECTORY = ".gtfs_cache"
+
+# Tables and columns kept in the cache. None keeps all columns. Listed
+# columns missing from the source are left out.
+FEED_COLUMNS = {
+    "agency": None,
+    "stops": None,
+    "routes": [
+        "route_id",
+        "agency_id",
+        "route_short_name",
+        "route_long_name",
+        "route_type",
+    ],
+    "trips": [
+        "route_id",
+        "service_id",
+        "trip_id",
+        "trip_headsign",
+        "direction_id",
+        "shape_id",
+    ],
+    "stop_times": ["trip_id", "departure_time", "stop_sequence"],
+    "calendar": None,
+    "calendar_dates": None,
+    "shapes": [
+        "shape_id",
+        "shape_pt_lat",
+        "shape_pt_lon",
+        "shape_pt_sequence",
+        "shape_dist_traveled",
+    ],
+}
+
+LOADERS = ["gtfs_kit", "arrow"]
+
+# Column types for the Arrow loader. Identifiers, dates and times are read
+# as strings like gtfs_kit does, other listed columns get compact types.
+ARROW_COLUMN_TYPES = {
+    **{column: pa.string() for column in gk.constants.DTYPE},
+    "route_type": pa.int16(),
+    "direction_id": pa.int8(),
+    "stop_sequence": pa.int32(),
+    "shape_pt_sequence": pa.int32(),
+    "shape_pt_lat": pa.float64(),
+    "shape_pt_lon": pa.float64(),
+    "shape_dist_traveled": pa.float64(),
+    "exception_type": pa.int8(),
+    "monday": pa.int8(),
+    "tuesday": pa.int8(),
+    "wednesday": pa.int8(),
+    "thursday": pa.int8(),
+    "friday": pa.int8(),
+    "saturday": pa.int8(),
+    "sunday": pa.int8(),
+}
+
+ARROW_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def _prune_columns(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Keep only cached columns of a table."""
+    columns = FEED_COLUMNS[table]
+    if columns is not None:
+        df = df.loc[:, [c for c in columns if c in df.columns]]
+    return df.reset_index(drop=True)
+
+
+def _csv_header(archive: zipfile.ZipFile, member: str) -> list[str]:
+    """Return column names of a CSV file in zip archive."""
+    with archive.open(member) as stream:
+        first_line = io.TextIOWrapper(stream, encoding="utf-8-sig").readline()
+    return next(csv.reader([first_line]), [])
+
+
+def _arrow_options(
+    archive: zipfile.ZipFile, member: str, columns: list[str]
+) -> tuple[pa_csv.ReadOptions, pa_csv.ConvertOptions, dict[str, str]]:
+    """Construct Arrow CSV options reading only given columns.
+
+    Return options and mapping from raw to stripped column names."""
+    header = _csv_header(archive, member)
+    names = {raw: raw.strip() for raw in header}
+    if columns is not None:
+        names = {raw: name for raw, name in names.items() if name in columns}
+
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=list(names),
+        column_types={
+            raw: ARROW_COLUMN_TYPES[name]
+            for raw, name in names.items()
+            if name in ARROW_COLUMN_TYPES
+        },
+        strings_can_be_null=True,
+    )
+    return read_options, convert_options, names
+
+
+def _min_sequence_rows(stop_times: pd.DataFrame) -> pd.DataFrame:
+    """Keep rows with minimum stop_sequence of each trip."""
+    first = stop_times.groupby("trip_id", sort=False)["stop_sequence"].idxmin()
+    return stop_times.loc[first]
+
+
+def _read_first_stop_times(
+    archive: zipfile.ZipFile, member: str, columns: list[str]
+) -> pd.DataFrame:
+    """Stream stop_times and keep only the first stop of each trip.
+
+    Every record batch is reduced to its first stops before it is
+    collected, so the complete table is never held in memory."""
+    read_options, convert_options, names = _arrow_options(archive, member, columns)
+    candidates = []
+    with archive.open(member) as stream:
+        reader = pa_csv.open_csv(
+            stream, read_options=read_options, convert_options=convert_options
+        )
+        for batch in reader:
+            batch_df = batch.to_pandas().rename(columns=names)
+            candidates.append(_min_sequence_rows(batch_df))
+
+    if not candidates:
+        return pd.DataFrame(columns=list(names.values()))
+    return _min_sequence_rows(pd.concat(candidates, ignore_index=True))
+
+
+def _read_tables_arrow(file_name: str) -> dict[str, pd.DataFrame]:
+    """Read feed tables from zip file with the Arrow CSV reader."""
+    tables = {}
+    with zipfile.ZipFile(file_name) as archive:
+        members = {Path(name).name: name for name in archive.namelist()}
+        for table, columns in FEED_COLUMNS.items():
+            member = members.get("{}.txt".format(table))
+            if member is None or archive.getinfo(member).file_size == 0:
+                continue
+
+            if table == "stop_times":
+                df = _read_first_stop_times(archive, member, columns)
+            else:
+                read_options, convert_options, names = _arrow_options(
+                    archive, member, columns
+                )
+                with archive.open(member) as stream:
+                    df = pa_csv.read_csv(
+                        stream,
+                        read_options=read_options,
+                        convert_options=convert_options,
+                    ).to_pandas()
+                df = df.rename(columns=names)
+
+            if not df.empty:
+                tables[table] = df.reset_index(drop=True)
+    return tables
+
+
+def _read_tables_gtfs_kit(file_name: str) -> dict[str, pd.DataFrame]:
+    """Read feed tables with gtfs_kit and drop unused columns."""
+    feed = gk.read_feed(file_name, dist_units="km")
+    return {
+        table: _prune_columns(table, getattr(feed, table))
+        for table in FEED_COLUMNS
+        if getattr(feed, table) is not None
+    }
+
+
+def _cache_path(file_name: str, digest: str, loader: str) -> Path:
+    """Return cache directory of a feed file."""
+    source = Path(file_name)
+    key = "{}-{}-v{}-{}".format(source.stem, loader, CACHE_VERSION, digest[:16])
+    return source.parent / CACHE_DIRECTORY / key
+
+
+def _read_cache(cache_dir: Path) -> dict[str, pd.DataFrame]:
+    """Memory-map cached tables."""
+    tables = {}
+    for table in FEED_COLUMNS:
+        table_file = cache_dir / "{}.arrow".format(table)
+        if table_file.exists():
+            tables[table] = feather.read_table(
+                str(table_file), memory_map=True
+            ).to_pandas()
+    return tables
+
+
+def _write_cache(cache_dir: Path, tables: dict[str, pd.DataFrame]) -> None:
+    """Write tables to cache directory.
+
+    Tables are written to a temporary directory which is renamed in place,
+    so concurrent readers never see a partially written cache."""
+    cache_root = cache_dir.parent
+    tmp_dir = None
+    try:
+        cache_root.mkdir(exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=cache_root))
+        for table, df in tables.items():
+            feather.write_feather(
+                df, str(tmp_dir / "{}.arrow".format(table)), compression="uncompressed"
+            )
+        tmp_dir.rename(cache_dir)
+    except OSError:
+        # Another reader may have written the same cache meanwhile
+        if not cache_dir.is_dir():
+            logger.warning("Could not write GTFS cache %s", cache_dir, exc_info=True)
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    # Only the newest version of a feed is kept
+    stem = cache_dir.name.rsplit("-", 2)[0]
+    for stale in cache_root.glob("{}-v*".format(stem)):
+        if stale != cache_dir:
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+def read_feed(
+    file_name: str, use_cache: bool = True, loader: str = "gtfs_kit"
+) -> gk.Feed:
+    """Read GTFS feed from zip file.
+
+    With use_cache the feed is reduced to tables and columns listed in
+    FEED_COLUMNS and the parsed tables are cached by content hash of the
+    file. Without it, the complete feed is parsed with gtfs_kit.
+
+    Supported loader values:
+        gtfs_kit - parse complete tables with gtfs_kit
+        arrow - parse listed columns with Arrow, first stops of stop_times only"""
+    if loader not in LOADERS:
+        raise ValueError("Unknown GTFS loader: {}".format(loader))
+    if not use_cache:
+        if loader == "arrow":
+            return gk.Feed(dist_units="km", **_read_tables_arrow(file_name))
+        return gk.read_feed(file_name, dist_units="km")
+
+    cache_dir = _cache_path(file_name, file_digest(file_name), loader)
+    if cache_dir.is_dir():
+        logger.info("Reading GTFS tables from cache %s", cache_dir)
+        tables = _read_cache(cache_dir)
+    else:
+        if loader == "arrow":
+            tables = _read_tables_arrow(file_name)
+        else:
+            tables = _read_tables_gtfs_kit(file_name)
+        _write_cache(cache_dir, tables)
+
+    return gk.Feed(dist_units="km", **tables)
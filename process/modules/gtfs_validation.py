@@ -0,0 +1,354 @@
+"""Validate the GTFS tables and columns used in processing.
+
+Only the tables and columns read by the HSL processing are checked, so
+validation stays fast enough for every run. Checks are vectorized over
+whole columns.
+
+The report has the same layout as the one of gtfs_kit validation: one row
+per problem with columns type ("error" or "warning"), message, table and
+rows (list of offending row indices)."""
+import numpy as np
+import pandas as pd
+
+from modules.gtfs import WEEKDAYS
+
+REPORT_COLUMNS = ["type", "message", "table", "rows"]
+
+REQUIRED_COLUMNS = {
+    "routes": ["route_id", "route_type"],
+    "trips": ["route_id", "service_id", "trip_id", "shape_id"],
+    "stop_times": ["trip_id", "departure_time", "stop_sequence"],
+    "calendar": ["service_id", "start_date", "end_date"] + WEEKDAYS,
+    "calendar_dates": ["service_id", "date", "exception_type"],
+    "shapes": ["shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"],
+}
+
+# Required columns that must have a value on every row. shape_id is
+# optional in trips and departure_time is needed only at timepoints, missing
+# first departures are checked separately.
+NOT_NULL_COLUMNS = {
+    "routes": ["route_id", "route_type"],
+    "trips": ["route_id", "service_id", "trip_id"],
+    "stop_times": ["trip_id", "stop_sequence"],
+    "calendar": ["service_id", "start_date", "end_date"] + WEEKDAYS,
+    "calendar_dates": ["service_id", "date", "exception_type"],
+    "shapes": ["shape_id", "shape_pt_lat", "shape_pt_lon", "shape_pt_sequence"],
+}
+
+PRIMARY_KEYS = {
+    "routes": ["route_id"],
+    "trips": ["trip_id"],
+    "stop_times": ["trip_id", "stop_sequence"],
+    "calendar": ["service_id"],
+    "calendar_dates": ["service_id", "date"],
+    "shapes": ["shape_id", "shape_pt_sequence"],
+}
+
+# H:MM:SS or HH:MM:SS, hours may exceed 23
+TIME_PATTERN = r"^\d{1,2}:[0-5]\d:[0-5]\d$"
+DATE_PATTERN = r"^\d{8}$"
+
+
+def _problem(type_: str, message: str, table: str, rows) -> list:
+    return [type_, message, table, list(rows)]
+
+
+def _invalid(
+    problems: list,
+    table: str,
+    df: pd.DataFrame,
+    mask: pd.Series,
+    message: str,
+    type_: str = "error",
+) -> None:
+    """Append problem if mask marks any rows."""
+    mask = np.asarray(mask, dtype=bool)
+    if mask.any():
+        problems.append(_problem(type_, message, table, df.index[mask]))
+
+
+def _as_number(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce")
+
+
+def _check_columns(problems: list, tables: dict) -> dict:
+    """Check required tables and columns.
+
+    Return tables having all required columns."""
+    checked = {}
+    for table, columns in REQUIRED_COLUMNS.items():
+        df = tables.get(table)
+        if df is None:
+            continue
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            problems.append(
+                _problem(
+                    "error",
+                    "Missing columns {}".format(", ".join(missing)),
+                    table,
+                    [],
+                )
+            )
+            continue
+
+        _invalid(
+            problems,
+            table,
+            df,
+            df[NOT_NULL_COLUMNS[table]].isna().any(axis=1),
+            "Missing values in required columns",
+        )
+        checked[table] = df
+    return checked
+
+
+def _check_primary_keys(problems: list, tables: dict) -> None:
+    for table, key in PRIMARY_KEYS.items():
+        df = tables.get(table)
+        if df is not None:
+            _invalid(
+                problems,
+                table,
+                df,
+                df.duplicated(key, keep=False),
+                "Repeated {}".format(", ".join(key)),
+            )
+
+
+def _check_references(problems: list, tables: dict) -> None:
+    """Check that referenced ids exist."""
+    trips = tables.get("trips")
+    if trips is None:
+        return
+
+    routes = tables.get("routes")
+    if routes is not None:
+        _invalid(
+            problems,
+            "trips",
+            trips,
+            ~trips["route_id"].isin(routes["route_id"]),
+            "Undefined route_id",
+        )
+
+    service_ids = pd.concat(
+        [
+            tables[table]["service_id"]
+            for table in ["calendar", "calendar_dates"]
+            if table in tables
+        ]
+        + [pd.Series(dtype=object)]
+    )
+    _invalid(
+        problems,
+        "trips",
+        trips,
+        ~trips["service_id"].isin(service_ids),
+        "Undefined service_id",
+    )
+
+    shapes = tables.get("shapes")
+    if shapes is not None:
+        _invalid(
+            problems,
+            "trips",
+            trips,
+            trips["shape_id"].notna() & ~trips["shape_id"].isin(shapes["shape_id"]),
+            "Undefined shape_id",
+        )
+
+    stop_times = tables.get("stop_times")
+    if stop_times is not None:
+        _invalid(
+            problems,
+            "stop_times",
+            stop_times,
+            ~stop_times["trip_id"].isin(trips["trip_id"]),
+            "Undefined trip_id",
+        )
+        _invalid(
+            problems,
+            "trips",
+            trips,
+            ~trips["trip_id"].isin(stop_times["trip_id"]),
+            "Trip has no stop times",
+            "warning",
+        )
+
+
+def _check_routes(problems: list, routes: pd.DataFrame) -> None:
+    route_type = _as_number(routes["route_type"])
+    _invalid(
+        problems,
+        "routes",
+        routes,
+        route_type.isna() | (route_type < 0) | (route_type % 1 != 0),
+        "Invalid route_type",
+    )
+
+
+def _check_stop_times(problems: list, stop_times: pd.DataFrame) -> None:
+    departure = stop_times["departure_time"].astype("string").str.strip()
+    _invalid(
+        problems,
+        "stop_times",
+        stop_times,
+        departure.notna() & ~departure.str.match(TIME_PATTERN).fillna(False),
+        "Invalid departure_time",
+    )
+
+    sequence = _as_number(stop_times["stop_sequence"])
+    _invalid(
+        problems,
+        "stop_times",
+        stop_times,
+        sequence.isna() | (sequence < 0) | (sequence % 1 != 0),
+        "Invalid stop_sequence",
+    )
+
+    # departure time of the first stop is what processing reads
+    first_stops = (
+        pd.DataFrame({"trip_id": stop_times["trip_id"], "sequence": sequence})
+        .dropna()
+        .sort_values(["trip_id", "sequence"])
+        .drop_duplicates("trip_id")
+    )
+    _invalid(
+        problems,
+        "stop_times",
+        first_stops,
+        departure.loc[first_stops.index].isna(),
+        "Missing departure_time at first stop of trip",
+    )
+
+
+def _check_dates(
+    problems: list, table: str, df: pd.DataFrame, columns: list[str]
+) -> pd.DataFrame:
+    """Check YYYYMMDD dates. Return parsed dates."""
+    parsed = {}
+    for column in columns:
+        values = df[column].astype("string").str.strip()
+        dates = pd.to_datetime(
+            values.where(values.str.match(DATE_PATTERN).fillna(False)),
+            format="%Y%m%d",
+            errors="coerce",
+        )
+        _invalid(problems, table, df, dates.isna(), "Invalid {}".format(column))
+        parsed[column] = dates
+    return pd.DataFrame(parsed, index=df.index)
+
+
+def _check_calendar(problems: list, calendar: pd.DataFrame) -> None:
+    dates = _check_dates(problems, "calendar", calendar, ["start_date", "end_date"])
+    _invalid(
+        problems,
+        "calendar",
+        calendar,
+        dates["start_date"] > dates["end_date"],
+        "start_date is after end_date",
+    )
+    flags = calendar[WEEKDAYS].apply(_as_number)
+    _invalid(
+        problems,
+        "calendar",
+        calendar,
+        ~flags.isin([0, 1]).all(axis=1),
+        "Invalid weekday value",
+    )
+
+
+def _check_calendar_dates(problems: list, calendar_dates: pd.DataFrame) -> None:
+    _check_dates(problems, "calendar_dates", calendar_dates, ["date"])
+    _invalid(
+        problems,
+        "calendar_dates",
+        calendar_dates,
+        ~_as_number(calendar_dates["exception_type"]).isin([1, 2]),
+        "Invalid exception_type",
+    )
+
+
+def _check_shapes(problems: list, shapes: pd.DataFrame) -> None:
+    lat = _as_number(shapes["shape_pt_lat"])
+    lon = _as_number(shapes["shape_pt_lon"])
+    _invalid(
+        problems,
+        "shapes",
+        shapes,
+        ~lat.between(-90, 90) | ~lon.between(-180, 180),
+        "Invalid shape point coordinates",
+    )
+
+    sequence = _as_number(shapes["shape_pt_sequence"])
+    _invalid(
+        problems,
+        "shapes",
+        shapes,
+        sequence.isna() | (sequence < 0) | (sequence % 1 != 0),
+        "Invalid shape_pt_sequence",
+    )
+
+    point_counts = shapes.groupby("shape_id")["shape_id"].transform("size")
+    _invalid(
+        problems,
+        "shapes",
+        shapes,
+        point_counts < 2,
+        "Shape has less than two points",
+        "warning",
+    )
+
+    # distance along the shape must not decrease in sequence order
+    if "shape_dist_traveled" in shapes.columns:
+        ordered = shapes.assign(
+            _sequence=sequence, _dist=_as_number(shapes["shape_dist_traveled"])
+        ).sort_values(["shape_id", "_sequence"])
+        decreasing = (ordered["_dist"].diff() < 0) & (
+            ordered["shape_id"] == ordered["shape_id"].shift()
+        )
+        _invalid(
+            problems,
+            "shapes",
+            ordered,
+            decreasing,
+            "Decreasing shape_dist_traveled",
+        )
+
+
+def validate_feed(feed) -> pd.DataFrame:
+    """Validate tables of a GTFS feed used in processing.
+
+    Return report of problems, empty if none were found."""
+    tables = {
+        table: getattr(feed, table)
+        for table in REQUIRED_COLUMNS
+        if getattr(feed, table, None) is not None
+    }
+    problems = []
+
+    for table in ["routes", "trips", "stop_times", "shapes"]:
+        if table not in tables:
+            problems.append(_problem("error", "Missing table", table, []))
+    if "calendar" not in tables and "calendar_dates" not in tables:
+        problems.append(
+            _problem("error", "Missing both calendar and calendar_dates", "calendar", [])
+        )
+
+    tables = _check_columns(problems, tables)
+    _check_primary_keys(problems, tables)
+    _check_references(problems, tables)
+
+    checks = {
+        "routes": _check_routes,
+        "stop_times": _check_stop_times,
+        "calendar": _check_calendar,
+        "calendar_dates": _check_calendar_dates,
+        "shapes": _check_shapes,
+    }
+    for table, check in checks.items():
+        if table in tables:
+            check(problems, tables[table])
+
+    return pd.DataFrame(problems, columns=REPORT_COLUMNS)
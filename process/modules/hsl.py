@@ -1,63 +1,151 @@
 import logging
-from datetime import date, timedelta, datetime, time
-from functools import partial
+from datetime import time
 import geopandas as gpd
 import gtfs_kit as gk
 from os import path
+import numpy as np
 import pandas as pd
-from parse import parse
-from shapely.errors import ShapelyDeprecationWarning
-from shapely.geometry import Point, LineString
 from sqlalchemy import create_engine
-import warnings
 
 
 from modules.config import Config
+from modules import parallel
 from modules.gis_processing import GisProcessor
+from modules.common import clipAreasByAreas, dissolveTiled
+from modules.layer_store import LayerStore
+from modules.gtfs_feed import read_feed
+from modules.gtfs_validation import validate_feed
+from modules.gtfs import (
+    BIN_SECONDS,
+    BINS_PER_DAY,
+    ServiceCalendar,
+    departure_bins,
+    departure_seconds,
+    peak_window_counts,
+    shape_ids_in_area,
+    shape_lines,
+    shared_segments,
+    sum_by_segment,
+)
 
 logger = logging.getLogger(__name__)
 
-def as_date(d: str) -> date:
-    """Convert string representation to date object"""
-    return datetime.strptime(d, "%Y%m%d").date()
+# Shapes without any point within this distance (m) of Helsinki
+# are dropped before line geometries are formed
+REGION_PRUNING_MARGIN = 500
+
+RUSH_HOUR_PERIODS = ["day", "week"]
+
+# Shapes are noded on this grid (m) when forming shared street segments,
+# a segment belongs to every shape within SEGMENT_TOLERANCE (m) of its midpoint
+SEGMENT_GRID_SIZE = 0.1
+SEGMENT_TOLERANCE = 0.5
+
+
+def _time_to_seconds(t: time) -> int:
+    """Convert time object to seconds since midnight"""
+    return t.hour * 3600 + t.minute * 60 + t.second
 
 
 class HslBuses(GisProcessor):
     """Process HSL bus lines."""
 
+    inputs = [("ylre_katuosat", "target_buffer_file"), ("hki", "local_file")]
+    # target_segment_file is written only with segment_frequency
+    outputs = [
+        ("hsl", "target_file"),
+        ("hsl", "target_buffer_file"),
+        ("hsl", "target_segment_file"),
+    ]
+
     def __init__(
-        self, cfg: Config, validate_gtfs: bool = True, week_of_transit: int = 2
+        self,
+        cfg: Config,
+        validate_gtfs: bool = True,
+        week_of_transit: int = 2,
+        layers: LayerStore = None,
     ):
         self._cfg = cfg
+        if layers is None:
+            layers = LayerStore(cfg)
+        self._layers = layers
 
         # check that Helsinki city area file is available
         if not path.exists(self._cfg.local_file("hki")):
             raise FileNotFoundError("Helsinki city area polygon not found")
 
         # Loading ylre_katuosat dataset
-        ylre_katuosat_filename = cfg.target_buffer_file("ylre_katuosat")
-        self._ylre_katuosat = gpd.read_file(ylre_katuosat_filename)
+        self._ylre_katuosat = layers.get("ylre_katuosat")
         self._ylre_katuosat_sindex = self._ylre_katuosat.sindex
+        self._reference_masks = layers.masks()
 
         # TODO: how to obtain this string automatically?
         self._module = "hsl"
         file_name = cfg.local_file(self._module)
-        self._feed = self._read_feed_data(file_name)
+        self._feed = self._read_feed_data(
+            file_name, cfg.gtfs_cache(), cfg.gtfs_loader(self._module)
+        )
         self._store_original_data = cfg.store_orinal_data(self._module)
+        self._rush_hour_full_day = cfg.rush_hour_full_day(self._module)
+        self._rush_hour_period = cfg.rush_hour_period(self._module)
+        self._rush_hour_percentile = cfg.rush_hour_percentile(self._module)
+        if self._rush_hour_period not in RUSH_HOUR_PERIODS:
+            raise ValueError(
+                "Unknown rush hour period: {}".format(self._rush_hour_period)
+            )
+        self._segment_frequency = cfg.segment_frequency(self._module)
 
         if validate_gtfs:
-            self._feed.validate()
+            self._validate_feed()
 
         self._transit_week = self.feed().get_week(week_of_transit, as_date_obj=False)
+        self._service_calendar = ServiceCalendar(
+            self.feed().calendar, self.feed().calendar_dates
+        )
 
         self._process_result_lines = None
         self._process_result_polygons = None
+        self._process_result_segments = None
         self._orig = None
+        self._bus_shapes = None
+        self._departure_shape_ids = None
+        self._departure_bins = None
+        self._helsinki_region_polygon = None
+
+    def _helsinki_region(self) -> gpd.GeoDataFrame:
+        """Return Helsinki geographical region in configured CRS.
+
+        The region is read only once."""
+        if self._helsinki_region_polygon is None:
+            try:
+                self._helsinki_region_polygon = self._layers.get("hki", "local_file")
+            except Exception as e:
+                logger.error("Area polygon file not found!")
+                raise e
+        return self._helsinki_region_polygon
+
+    def _validate_feed(self) -> None:
+        """Validate feed tables used in processing.
+
+        Warnings are logged, errors stop the processing."""
+        report = validate_feed(self.feed())
+        for problem in report.itertuples():
+            log = logger.error if problem.type == "error" else logger.warning
+            log(
+                "GTFS %s: %s (%d rows)",
+                problem.table,
+                problem.message,
+                len(problem.rows),
+            )
+        if (report["type"] == "error").any():
+            raise ValueError("HSL GTFS feed is not valid")
 
-    def _read_feed_data(self, file_name) -> gk.Feed:
+    def _read_feed_data(
+        self, file_name, use_cache: bool = True, loader: str = "gtfs_kit"
+    ) -> gk.Feed:
         """Read feed data from zip file"""
         try:
-            feed = (gk.read_feed(file_name, dist_units="km"))
+            feed = read_feed(file_name, use_cache=use_cache, loader=loader)
         except Exception:
             logger.exception("An error occurred:")
             exit()
@@ -80,32 +168,11 @@ class HslBuses(GisProcessor):
 
         return self.transit_week()[day_sel]
 
-    def _pick_service_ids(self, d_start: str, d_end: str) -> pd.Index:
-        """Pick service_id:s that fall within provided range.
-
-        Return index to calendar table."""
-        result = self.feed().calendar
-        ind = result.apply(
-            lambda r: self._overlaps(d_start, d_end, r.start_date, r.end_date), axis=1
-        )
-        return ind
-
-    def _overlaps(self, d1min: str, d1max: str, d2min: str, d2max: str) -> bool:
-        """Check if date ranges overlap"""
-        return min(as_date(d1max), as_date(d2max)) - max(
-            as_date(d1min), as_date(d2min)
-        ) >= timedelta(0)
-
     def _pick_service_ids_for_one_day(self, datestring: str) -> list[str]:
         """Return list of service ids of a given day.
-        Does not respect calendar_dates -information."""
-        result_ind = self._pick_service_ids(datestring, datestring)
-        candidate = self.feed().calendar.copy()
-        weekday = as_date(datestring).strftime("%A").lower()
-        weekday_ind = candidate[weekday] == 1
-        # candidate day must belong to time range AND have specific weekday mentioned in calendar
-        serv_id_cand = candidate[result_ind & weekday_ind]
-        return serv_id_cand["service_id"].values.tolist()
+
+        Respects weekday flags of calendar and exceptions of calendar_dates."""
+        return self._service_calendar.service_ids([datestring])
 
     def _trips_for_service_ids(self, service_ids: list[str]) -> pd.DataFrame:
         """Pick all trip_id:s belonging to a list of provided service_ids"""
@@ -150,60 +217,80 @@ class HslBuses(GisProcessor):
             )
         return hour_range
 
-    def _compute_rush_hours(self, stops_and_trips: pd.DataFrame) -> pd.DataFrame:
-        """Compute rush hours for given data frame."""
-        rush_hours = self._rush_hours()
-
-        # construct list of tuples(<descriptor>, <partial function>)
-        # to help computing multiple columns to data frame
-        pl = [(rh[0], partial(self._agg_rush_hour, rh[1], rh[2])) for rh in rush_hours]
-
-        kwargs = {nm: lambda x: pf(x.departure_time) for nm, pf in pl}
-        return stops_and_trips.assign(**kwargs)
-
-    def _parse_time(self, t_candidate: str) -> dict:
-        """Parse time. Support hour values larger than 23.
-        If hour part is larger than 23, "next_day" boolean value is True"""
-        format_string = "{:d}:{:d}:{:d}"
-        h, m, s = parse(format_string, t_candidate)
-        next_day = False
-        if h > 23:
-            h %= 24
-            next_day = True
-        time_str = "{:02d}:{:02d}:{:02d}".format(h, m, s)
-        t = datetime.strptime(time_str, "%H:%M:%S").time()
-        return {"time": t, "next_day": next_day}
-
-    def _agg_rush_hour(self, t_start: time, t_end: time, t_candidate):
-        """Check if time is between an interval. Return 1 if it is, 0 otherwise.
-
-        Handle both pd.Series and single value input for t_candidate."""
-
-        def is_between(candidate, low, high) -> bool:
-            """Check if candidate is in range [low, high)"""
-            return low <= candidate < high
-
-        if isinstance(t_candidate, pd.Series):
-            # Time in GTFS can be greater than 23.
-            # Hours falling to next day are not treated here
-            # due to it is extremely unlikely that day of operation
-            # continues until morning rush hour.
-
-            # TODO: handle previous day and current day for times past midnight.
-            t_c = t_candidate.apply(lambda r: self._parse_time(r).get("time"))
-            retval = 1 * t_c.apply(lambda r: is_between(r, t_start, t_end))
-            return retval
-        else:
-            # TODO: handle previous day and current day for times past midnight.
-            t_c = self._parse_time(t_candidate).get("time")
-            if is_between(t_c, t_start, t_end):
-                return 1
-            else:
-                return 0
+    def _rush_hour_window_starts(self) -> np.ndarray:
+        """Return rush hour window start times as 15 minute bin indices."""
+        return np.array(
+            [_time_to_seconds(rh[1]) // BIN_SECONDS for rh in self._rush_hours()]
+        )
+
+    def _rush_hour_dates(self) -> list[str]:
+        """Return dates whose rush hours are analysed.
+
+        Either the transit day or every date of the transit week."""
+        if self._rush_hour_period == "week":
+            return self.transit_week()
+        return [self.transit_day()]
+
+    def _shape_departure_bins(
+        self, stops_and_trips: pd.DataFrame, dates: list[str]
+    ) -> tuple[pd.Index, np.ndarray]:
+        """Count departures of each shape on each date in 15 minute bins.
+
+        Departure times are parsed once. Trips are spread to the dates their
+        service operates on with the service calendar matrix.
+        Return shape_ids and array of shape (shapes, dates, bins)."""
+        codes, shape_ids = pd.factorize(stops_and_trips["shape_id"])
+        seconds = departure_seconds(stops_and_trips["departure_time"])
+
+        service_rows = self._service_calendar.service_index().get_indexer(
+            stops_and_trips["service_id"]
+        )
+        operating = np.zeros((len(stops_and_trips), len(dates)), dtype=bool)
+        known = service_rows >= 0
+        operating[known] = self._service_calendar.active(dates)[service_rows[known]]
+        operating &= (codes >= 0)[:, np.newaxis]
+
+        rows, days = np.nonzero(operating)
+        bins = departure_bins(
+            codes[rows] * len(dates) + days, len(shape_ids) * len(dates), seconds[rows]
+        )
+        return pd.Index(shape_ids), bins.reshape(
+            len(shape_ids), len(dates), BINS_PER_DAY
+        )
+
+    def _peak_hour(self, bins: np.ndarray) -> np.ndarray:
+        """Compute maximum number of departures within one hour for each row.
+
+        The peak hour of every date is found with rolling sums of four 15
+        minute bins. By default only the rush hour windows are scanned,
+        optionally the whole service day. Daily peaks are combined with
+        maximum or with the configured percentile."""
+        window_starts = None
+        if not self._rush_hour_full_day:
+            window_starts = self._rush_hour_window_starts()
+        daily = peak_window_counts(bins, window_starts=window_starts)
+
+        if self._rush_hour_percentile is None:
+            return daily.max(axis=-1)
+        return np.percentile(
+            daily, self._rush_hour_percentile, axis=-1, method="nearest"
+        ).astype(daily.dtype)
+
+    def _shape_rush_hours(self, stops_and_trips: pd.DataFrame) -> pd.DataFrame:
+        """Compute maximum number of departures within one hour for each shape.
+
+        Departure bins of the shapes are kept for segment processing."""
+        self._departure_shape_ids, self._departure_bins = self._shape_departure_bins(
+            stops_and_trips, self._rush_hour_dates()
+        )
+        rush_hour = self._peak_hour(self._departure_bins)
+        return pd.DataFrame(
+            {"shape_id": self._departure_shape_ids, "rush_hour": rush_hour}
+        )
 
     def _process_hsl_bus_lines(self) -> pd.DataFrame:
         """Process GTFS material."""
-        service_ids_day = self._pick_service_ids_for_one_day(self.transit_day())
+        service_ids_day = self._service_calendar.service_ids(self._rush_hour_dates())
         trips_day = self._trips_for_service_ids(service_ids_day)
         stop_times_trip = self.feed().stop_times[
             self.feed().stop_times["trip_id"].isin(trips_day["trip_id"])
@@ -211,56 +298,31 @@ class HslBuses(GisProcessor):
         stop_times_trip_uniq = stop_times_trip.drop_duplicates("trip_id")
         stops_trips = stop_times_trip_uniq.merge(trips_day, on="trip_id", how="left")
 
-        # rush hour time columns added
-        stops_trips = self._compute_rush_hours(stops_trips)
-
-        shape_trips_max = (
-            stops_trips.loc[
-                :, ["shape_id"] + [x for x in stops_trips.columns if x.startswith("n_")]
-            ]
-            .groupby("shape_id")
-            .sum()
-            .max(axis=1)
-        )
-        stop_times_day = shape_trips_max.to_frame("rush_hour").reset_index()
+        # maximum number of departures within an hour for each shape,
+        # over the transit day or the whole transit week
+        stop_times_day = self._shape_rush_hours(stops_trips)
 
         # pick weeks worth of service_ids
-        w_start = self.transit_week()[0]
-        w_end = self.transit_week()[-1]
-
-        ind_service_ids_week = self._pick_service_ids(w_start, w_end)
-        service_ids_week = (
-            self.feed().calendar[ind_service_ids_week]["service_id"].values.tolist()
-        )
+        service_ids_week = self._service_calendar.service_ids(self.transit_week())
 
         ind_trips_week = self.feed().trips["service_id"].isin(service_ids_week)
         trips_week = self.feed().trips[ind_trips_week]
 
-        shps = self.feed().shapes.copy()
-
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=ShapelyDeprecationWarning)
-            # form point objects from coordinate values
-            shps["geometry"] = shps.apply(
-                lambda r: Point(r.shape_pt_lon, r.shape_pt_lat), axis=1
-            )
-
-        # pick all line geometries (shapes) that are operated within a given week
-        # sort by shape_id and shape point sequence, to ensure correct linestring formation
-        shapes_week_ind = shps["shape_id"].isin(trips_week["shape_id"].tolist())
-        shapes_week = shps[shapes_week_ind].sort_values(
-            ["shape_id", "shape_pt_sequence"]
+        # drop shapes that never come near Helsinki before forming geometries
+        pruning_area = (
+            self._helsinki_region()
+            .buffer(REGION_PRUNING_MARGIN)
+            .to_crs("EPSG:4326")
+            .union_all()
+        )
+        shape_ids_week = shape_ids_in_area(
+            self.feed().shapes, pruning_area, trips_week["shape_id"].unique()
         )
 
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=ShapelyDeprecationWarning)
-            # Create Linestring from points
-            shapes_week_lines = gpd.GeoDataFrame(
-                shapes_week.groupby(["shape_id"])["geometry"].apply(
-                    lambda x: LineString(x.tolist())
-                ),
-                geometry="geometry",
-            )
+        # form line geometries (shapes) that are operated within a given week
+        shapes_week_lines = shape_lines(
+            self.feed().shapes, self._cfg.crs(), shape_ids_week
+        )
 
         shapes_week_lines = shapes_week_lines.merge(
             stop_times_day, on="shape_id", how="left"
@@ -293,31 +355,32 @@ class HslBuses(GisProcessor):
             filtered_shapes_trips_routes
         )
 
-        # Pick columns and reproject to desired CRS
+        # Pick columns, geometries are already in desired CRS
         shapes_with_attributes["fid"] = shapes_with_attributes.reset_index().index
         shapes_with_attributes = shapes_with_attributes.loc[
-            :, ["fid", "route_id", "direction_id", "rush_hour", "trunk", "geometry"]
+            :,
+            [
+                "fid",
+                "shape_id",
+                "route_id",
+                "direction_id",
+                "rush_hour",
+                "trunk",
+                "geometry",
+            ],
         ]
-        shapes_with_attributes = shapes_with_attributes.set_crs("EPSG:4326").to_crs(
-            self._cfg.crs()
-        )
 
         # Only intersecting routes to Helsinki area are important
-        # read Helsinki geographical region and reproject
-        try:
-            helsinki_region_polygon = gpd.read_file(
-                filename=self._cfg.local_file("hki")
-            ).to_crs(self._cfg.crs())
-        except Exception as e:
-            logger.error("Area polygon file not found!")
-            raise e
-
         target_routes = (
-            shapes_with_attributes.sjoin(helsinki_region_polygon)
+            shapes_with_attributes.sjoin(self._helsinki_region())
             .loc[:, shapes_with_attributes.columns.tolist()]
             .set_index("fid")
         )
 
+        # shapes are needed for segment processing only
+        self._bus_shapes = target_routes.loc[:, ["shape_id", "route_id", "geometry"]]
+        target_routes = target_routes.drop(columns=["shape_id"])
+
         # Cast attribute data
         target_routes = target_routes.astype(
             {"rush_hour": "int32", "direction_id": "int32"}
@@ -333,65 +396,62 @@ class HslBuses(GisProcessor):
         retval.loc[retval["route_type"] == 702, "trunk"] = "yes"
         return retval
 
-    def _clipAreasByAreas(self, geometryToClip: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, geometryToClipAttrsDissolve, maskAttrsDissolve, mergeIdField, geometryToClipCheckAttr=None) -> gpd.GeoDataFrame:
-        geometry = geometryToClip[~geometryToClip.is_empty]
-        for attr in maskAttrsDissolve:
-            mask[attr] = mask[attr].fillna("")
-
-        if maskAttrsDissolve:
-            mask_dissolved = mask.dissolve(by=maskAttrsDissolve, as_index=False)
-        else:
-            mask_dissolved = mask
-
-        mask_dissolved = mask_dissolved.explode(ignore_index=True)
-
-        if geometryToClipCheckAttr is not None:
-            geometryToClipOnlyCheckObjects = geometry[geometry[geometryToClipCheckAttr].notnull()]
-            geometryToClipNotCheckObjects = geometry.loc[~geometry[geometryToClipCheckAttr].notnull()]
-        else:
-            geometryToClipOnlyCheckObjects = geometry
-
-        geometryToClipOnlyCheckObjects = geometryToClipOnlyCheckObjects.explode(ignore_index=True)
-        # Actual clipping:
-        clipped_result=gpd.clip(geometryToClipOnlyCheckObjects, mask_dissolved)
-        clipped_result = clipped_result.explode(ignore_index=True)
-        clipped_result.geometry = clipped_result.apply(lambda row: make_valid(row.geometry) if not row.geometry.is_valid else row.geometry, axis=1)
-        geometryToClipOnlyCheckObjects.geometry = geometryToClipOnlyCheckObjects.apply(lambda row: make_valid(row.geometry) if not row.geometry.is_valid else row.geometry, axis=1)
-
-        # Getting objects which were not clipped
-        geometryToClipOnlyCheckObjects = geometryToClipOnlyCheckObjects.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
-        clipped_result["geometry"] = clipped_result["geometry"].buffer(10)
-        clipped_result["geometry"] = clipped_result["geometry"].buffer(-10)
-        clipped_result = clipped_result.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
-        merged = geometryToClipOnlyCheckObjects.merge(clipped_result, how="outer", indicator=True, on=mergeIdField, suffixes=("", "_right"))
-        not_clipped = merged[merged["_merge"] == "left_only"].copy()
-        not_clipped.drop("_merge", axis=1, inplace=True)
-        common_columns = set(geometryToClipOnlyCheckObjects.columns).intersection(not_clipped.columns)
-        common_columns.add(geometryToClipOnlyCheckObjects.geometry.name)
-        common_columns_list = list(common_columns)
-        not_clipped = not_clipped[common_columns_list].copy()
-
-        # Adding clipped results to objects which were not checked at all
-        if geometryToClipCheckAttr is not None:
-            retval = gpd.GeoDataFrame(pd.concat([geometryToClipNotCheckObjects, clipped_result], ignore_index=True))
-        else:
-            retval = clipped_result
-
-        # Adding not clipped objects
-        retval = gpd.GeoDataFrame(pd.concat([retval, not_clipped], ignore_index=True))
-        for attr in geometryToClipAttrsDissolve:
-            retval[attr] = retval[attr].fillna("")
-        if geometryToClipAttrsDissolve:
-            retval = retval.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
-        retval = retval.explode(ignore_index=True)
+    def _process_hsl_bus_segments(self) -> gpd.GeoDataFrame:
+        """Sum bus departures of all shapes sharing a street segment.
 
-        return retval
+        Bus shapes are noded into shared segments and the departure bins of
+        every shape covering a segment are summed before the peak hour is
+        searched, so a segment shows the combined bus load of its routes."""
+        shapes = self._bus_shapes.drop_duplicates("shape_id")
+        segments, segment_index, line_index = shared_segments(
+            shapes.geometry.values, SEGMENT_GRID_SIZE, SEGMENT_TOLERANCE
+        )
+
+        # shapes not operated on the analysed dates have no departures
+        rows = self._departure_shape_ids.get_indexer(shapes["shape_id"])
+        shape_bins = np.zeros(
+            (len(shapes),) + self._departure_bins.shape[1:],
+            dtype=self._departure_bins.dtype,
+        )
+        shape_bins[rows >= 0] = self._departure_bins[rows[rows >= 0]]
+
+        segment_bins = sum_by_segment(
+            shape_bins, segment_index, line_index, len(segments)
+        )
+        route_count = (
+            pd.DataFrame(
+                {
+                    "segment": segment_index,
+                    "route_id": shapes["route_id"].to_numpy()[line_index],
+                }
+            )
+            .groupby("segment")["route_id"]
+            .nunique()
+            .reindex(range(len(segments)), fill_value=0)
+        )
+
+        result = gpd.GeoDataFrame(
+            {
+                "rush_hour": self._peak_hour(segment_bins).astype("int32"),
+                "route_count": route_count.to_numpy().astype("int32"),
+            },
+            geometry=segments,
+            crs=self._cfg.crs(),
+        )
+
+        # Only segments within Helsinki area are important
+        result = gpd.clip(result, self._helsinki_region()).explode(ignore_index=True)
+        result.index.name = "fid"
+        return result
 
     def process(self) -> None:
         # main part of processing is initiated here
         self._process_result_lines = self._process_hsl_bus_lines()
         self._orig = self._process_result_lines
 
+        if self._segment_frequency:
+            self._process_result_segments = self._process_hsl_bus_segments()
+
         # Mark objects which are within YLRE katuosa areas
         self._process_result_lines["id"] = self._process_result_lines.index + 1 # Adding temporary id field for clipping
         self._process_result_lines = gpd.overlay(self._process_result_lines, self._ylre_katuosat, how='union', keep_geom_type=True).explode().reset_index(drop=True)
@@ -403,28 +463,19 @@ class HslBuses(GisProcessor):
 
         # buffer lines
         target_route_polys = self._process_result_lines.copy()
-        target_route_polys["geometry"] = target_route_polys.buffer(buffers[0])
+        target_route_polys["geometry"] = parallel.buffer(target_route_polys, buffers[0])
 
         # Clip by using YLRE katuosa areas
         geometryToClipAttrsDissolve = ["route_id", "direction_id", "rush_hour", "trunk"]
-        maskAttrsDissolve = ["ylre_street_area", "kadun_nimi"]
-        target_route_polys = self._clipAreasByAreas(target_route_polys, self._ylre_katuosat, geometryToClipAttrsDissolve, maskAttrsDissolve, "id", "ylre_street_area")
+        ylre_katuosat_parts = self._reference_masks.parts(self._cfg.target_buffer_file("ylre_katuosat"), data=self._ylre_katuosat)
+        target_route_polys = clipAreasByAreas(target_route_polys, ylre_katuosat_parts, geometryToClipAttrsDissolve, "ylre_street_area", dissolveBetween=True, clippedBuffer=10, resultBuffer=None)
         target_route_polys.drop(columns=["id", "ylre_street_area", "kadun_nimi"], inplace=True)
         for attr in geometryToClipAttrsDissolve:
             target_route_polys[attr] = target_route_polys[attr].fillna("")
-        target_route_polys = target_route_polys.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
+        target_route_polys = dissolveTiled(target_route_polys, geometryToClipAttrsDissolve)
 
         # Only intersecting objects to Helsinki area are important
-        # read Helsinki geographical region and reproject
-        try:
-            helsinki_region_polygon = gpd.read_file(
-                filename=self._cfg.local_file("hki")
-            ).to_crs(self._cfg.crs())
-        except Exception as e:
-            logger.error("Area polygon file not found!")
-            raise e
-
-        target_route_polys = gpd.clip(target_route_polys, helsinki_region_polygon)
+        target_route_polys = gpd.clip(target_route_polys, self._helsinki_region())
 
         target_route_polys = target_route_polys.explode(ignore_index=True)
         target_route_polys["area"] = target_route_polys["geometry"].area
@@ -468,3 +519,10 @@ class HslBuses(GisProcessor):
         schema["properties"]["direction_id"] = "int32"
 
         tormays_polygons.to_file(target_buffer_file_name, schema=schema, engine="fiona", driver="GPKG")
+
+        # Combined bus load per street segment
+        if self._process_result_segments is not None:
+            target_segment_file_name = self._cfg.target_segment_file(self._module)
+            self._process_result_segments.reset_index().to_file(
+                target_segment_file_name, driver="GPKG"
+            )
@@ -0,0 +1,74 @@
+"""Reference layers shared by processors of one run.
+
+Several processors read the same reference layers (ylre_katualueet,
+ylre_katuosat, Helsinki area). The store reads each layer once when it is
+first asked for, reprojects it to the configured CRS and builds its spatial
+index. process_data.py tells the store which layers the pending processors
+need and a layer is evicted when the last of them is done.
+
+Dissolved and exploded masks of the layers are shared in the same way
+through masks(), so each mask is computed once per run.
+"""
+import logging
+from collections import Counter
+
+import geopandas as gpd
+
+from modules.config import Config
+from modules.reference_masks import ReferenceMaskCache
+
+logger = logging.getLogger(__name__)
+
+
+class LayerStore:
+    """Lazily loaded reference layers keyed by (item, file).
+
+    file is the configuration file entry of the item: "target_file",
+    "target_buffer_file" or "local_file". Returned layers are shared
+    between processors and must not be modified."""
+
+    def __init__(self, cfg: Config):
+        self._cfg = cfg
+        self._layers = {}
+        self._users = Counter()
+        self._masks = None
+
+    def expect(self, layers) -> None:
+        """Register a pending user of layers."""
+        self._users.update(layers)
+
+    def release(self, layers) -> None:
+        """Unregister a user of layers, evict layers without users."""
+        for layer in layers:
+            self._users[layer] -= 1
+            if self._users[layer] <= 0:
+                del self._users[layer]
+                if self._layers.pop(layer, None) is not None:
+                    logger.debug("Evicted layer %s %s", *layer)
+                if self._masks is not None:
+                    item, file = layer
+                    self._masks.evict(getattr(self._cfg, file)(item))
+
+    def get(self, item: str, file: str = "target_buffer_file") -> gpd.GeoDataFrame:
+        """Return layer with spatial index built."""
+        key = (item, file)
+        if key not in self._layers:
+            file_name = getattr(self._cfg, file)(item)
+            logger.info("Loading layer %s", file_name)
+            layer = gpd.read_file(file_name)
+            if layer.crs is not None and layer.crs != self._cfg.crs():
+                layer = layer.to_crs(self._cfg.crs())
+            # built once here, shared by all users of the layer
+            layer.sindex
+            self._layers[key] = layer
+        return self._layers[key]
+
+    def masks(self) -> ReferenceMaskCache:
+        """Return reference mask cache shared by users of the store."""
+        if self._masks is None:
+            self._masks = ReferenceMaskCache(self._cfg)
+        return self._masks
+
+    def loaded(self) -> list[tuple[str, str]]:
+        """Return keys of layers in memory."""
+        return list(self._layers)
@@ -9,27 +9,36 @@ from os import path
 from modules.config import Config
 from modules.gis_processing import GisProcessor
 from modules.common import *
+from modules.layer_store import LayerStore
 
 
 class Liikennevaylat(GisProcessor):
     """Process street classes infra."""
 
-    def __init__(self, cfg: Config):
+    inputs = [("ylre_katuosat", "target_buffer_file"), ("ylre_katualueet", "target_buffer_file"), ("central_business_area", "target_file")]
+    outputs = [("liikennevaylat", "target_file"), ("liikennevaylat", "target_buffer_file")]
+
+    def __init__(self, cfg: Config, layers: LayerStore = None):
         self._cfg = cfg
+        if layers is None:
+            layers = LayerStore(cfg)
         self._process_result_lines = None
         self._process_result_polygons = None
         self._debug_result_lines = None
         self._orig = None
         self._module = "liikennevaylat"
         self._store_original_data = cfg.store_orinal_data(self._module)
+        self._reference_masks = layers.masks()
+        self._topology_cleanup = cfg.topology_cleanup()
+        self._precision_grid = cfg.precision_grid()
+        self._sliver_area = cfg.sliver_area()
 
         # check that ylre_katuosat file is available
         if not path.exists(self._cfg.target_buffer_file("ylre_katuosat")):
             raise FileNotFoundError("ylre katuosat polygon not found")
 
         # Loading ylre_katuosat dataset
-        ylre_katuosat_filename = cfg.target_buffer_file("ylre_katuosat")
-        self._ylre_katuosat = gpd.read_file(ylre_katuosat_filename)
+        self._ylre_katuosat = layers.get("ylre_katuosat")
         self._ylre_katuosat_sindex = self._ylre_katuosat.sindex
 
         # check that ylre_katualueet file is available
@@ -37,8 +46,7 @@ class Liikennevaylat(GisProcessor):
             raise FileNotFoundError("ylre katualueet polygon not found")
 
         # Loading ylre_katualueet dataset
-        ylre_katualueet_filename = cfg.target_buffer_file("ylre_katualueet")
-        self._ylre_katualueet = gpd.read_file(ylre_katualueet_filename)
+        self._ylre_katualueet = layers.get("ylre_katualueet")
         self._ylre_katualueet_sindex = self._ylre_katualueet.sindex
 
         # check central business area file is available
@@ -46,8 +54,7 @@ class Liikennevaylat(GisProcessor):
             raise FileNotFoundError("central business area polygon not found")
 
         # Loading central business area dataset
-        central_business_area_filename = cfg.target_file("central_business_area")
-        self._central_business_area = gpd.read_file(central_business_area_filename)
+        self._central_business_area = layers.get("central_business_area", "target_file")
         self._central_business_area_sindex = self._central_business_area.sindex
 
         # Buffering configuration
@@ -55,6 +62,7 @@ class Liikennevaylat(GisProcessor):
 
         if len(self._buffers) != 5:
             raise ValueError("Unknown number of buffer values")
+        self._buffer_strategy = self._cfg.buffer_strategy(self._module)
 
         # Buffering classes
         self._buffer_class_street_class_values = {
@@ -150,12 +158,9 @@ class Liikennevaylat(GisProcessor):
         self._orig = self._lines
 
     def _get_central_business_area_and_merge(self) -> gpd.GeoDataFrame:
-        retval = self._central_business_area
-        retval = retval.dissolve("central_business_area")
-        retval["geometry"] = retval["geometry"].buffer(10)
-        retval["geometry"] = retval["geometry"].buffer(-10)
-
-        return retval
+        return self._reference_masks.dissolved(
+            self._cfg.target_file("central_business_area"), ["central_business_area"], (10, -10), data=self._central_business_area
+        )
 
     def _set_value_based_on_IsInside_IntersectsArea_main_sub_type(self, row):
         if row["street_class"] == "Asuntokatu, huoltoväylä tai muu vähäliikenteinen katu" and (row["IsInsideArea"] or row["IntersectsArea"]):
@@ -223,33 +228,25 @@ class Liikennevaylat(GisProcessor):
         return retval
 
     def _check_and_set_ylre_classes_id(self, lines: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        ylre_katuosat_dissolved = self._ylre_katuosat.dissolve("ylre_street_area")
-        ylre_katuosat_dissolved["geometry"] = ylre_katuosat_dissolved.buffer(15)
-        joined_result = gpd.sjoin(lines, ylre_katuosat_dissolved, predicate="within")
-
-        retval = lines.merge(joined_result[["uuid", "ylre_street_area"]], how="left", left_on="uuid", right_on="uuid")
+        retval = joinWithinDistance(lines, self._ylre_katuosat, ["ylre_street_area"], 15, sindex=self._ylre_katuosat_sindex)
 
         return retval
 
     def _check_and_set_ylre_katualueet_id(self, areas: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        ylre_katualueet_dissolved = self._ylre_katualueet.dissolve("ylre_class")
-        ylre_katualueet_dissolved["geometry"] = ylre_katualueet_dissolved.buffer(10)
-        joined_result = gpd.sjoin(areas, ylre_katualueet_dissolved, predicate="within")
-
-        retval = areas.merge(joined_result[["uuid","ylre_class"]], how="left", left_on="uuid", right_on="uuid")
+        retval = joinWithinDistance(areas, self._ylre_katualueet, ["ylre_class"], 10, sindex=self._ylre_katualueet_sindex)
 
         return retval
 
     def _buffering(self, lines: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        # Buffer lines
-        target_infra_polys = lines.copy()
-        retval = target_infra_polys[0:0]
-        for buffer_class, buffer_value in self._buffers.items():
-            buffered_items = target_infra_polys.loc[target_infra_polys["street_class"].isin(self._buffer_class_street_class_values[buffer_class])].copy()
-            buffered_items["geometry"] = buffered_items.buffer(buffer_value)
-            retval = gpd.GeoDataFrame(pd.concat([retval, buffered_items], ignore_index=True))
-
-        return retval
+        # Buffer lines, merged lines must keep attributes used in clipping
+        return bufferLinesByClass(
+            lines,
+            "street_class",
+            self._buffer_class_street_class_values,
+            self._buffers,
+            self._buffer_strategy,
+            groupAttrs=["street_class", "silta_alikulku", "yksisuuntaisuus", "ylre_class", "ylre_street_area"],
+        )
 
     def _clip_by_ylre_classes_areas(self, geometryToClip: gpd.GeoDataFrame, mask) -> gpd.GeoDataFrame:
         # This internal function is not used and it's functionality is moved to common function (clipAreasByAreas).
@@ -308,31 +305,38 @@ class Liikennevaylat(GisProcessor):
         )
 
         # Mark objects which are within YLRE katuosa areas
-        self._process_result_lines = self._check_and_set_ylre_classes_id(self._process_result_lines)
-        self._process_result_lines = self._check_and_set_ylre_katualueet_id(self._process_result_lines)
+        with self.stage("join") as stage:
+            self._process_result_lines = self._check_and_set_ylre_classes_id(self._process_result_lines)
+            self._process_result_lines = self._check_and_set_ylre_katualueet_id(self._process_result_lines)
+            stage.count(self._process_result_lines)
 
         # Buffer lines using buffer configuration
-        target_infra_polys = self._process_result_lines.copy()
-        target_infra_polys = self._buffering(target_infra_polys)
+        with self.stage("buffer") as stage:
+            target_infra_polys = self._process_result_lines.copy()
+            target_infra_polys = stage.count(self._buffering(target_infra_polys))
 
         # Clip by using YLRE katuosa areas
         geometryToClipAttrsDissolve = ["street_class", "silta_alikulku", "yksisuuntaisuus", "ylre_class"]
-        maskAttrsDissolve = ["ylre_street_area", "kadun_nimi"]
-        target_infra_polys = clipAreasByAreas(target_infra_polys, self._ylre_katuosat, geometryToClipAttrsDissolve, maskAttrsDissolve, "gml_id", "ylre_street_area")
+        with self.stage("clip_katuosat") as stage:
+            ylre_katuosat_parts = self._reference_masks.parts(self._cfg.target_buffer_file("ylre_katuosat"), data=self._ylre_katuosat)
+            target_infra_polys = clipAreasByAreas(target_infra_polys, ylre_katuosat_parts, geometryToClipAttrsDissolve, "ylre_street_area", cleanupMode=self._topology_cleanup, gridSize=self._precision_grid, sliverArea=self._sliver_area)
+            stage.count(target_infra_polys)
 
         # Fill empty values with NaN because of geometry to clip check attribute value (geometryToClipCheckAttr) which is in this case "ylre_class"
         target_infra_polys = target_infra_polys.replace("", np.nan)
         target_infra_polys = target_infra_polys.explode(ignore_index=True)
-        self._ylre_katualueet = self._ylre_katualueet.explode(ignore_index=True)
-        maskAttrsDissolve = ["ylre_class"]
-        target_infra_polys = clipAreasByAreas(target_infra_polys, self._ylre_katualueet, geometryToClipAttrsDissolve, maskAttrsDissolve, "id", "ylre_class", True)
+        with self.stage("clip_katualueet") as stage:
+            ylre_katualueet_parts = self._reference_masks.parts(self._cfg.target_buffer_file("ylre_katualueet"), data=self._ylre_katualueet)
+            target_infra_polys = clipAreasByAreas(target_infra_polys, ylre_katualueet_parts, geometryToClipAttrsDissolve, "ylre_class", True, cleanupMode=self._topology_cleanup, gridSize=self._precision_grid, sliverArea=self._sliver_area)
+            stage.count(target_infra_polys)
         target_infra_polys = target_infra_polys[target_infra_polys.geometry.type != 'Point']
 
         # Dissolve areas using attributes street_class and silta_alikulku as grouping factor
         dissolve_attrs = ["street_class", "silta_alikulku"]
         for attr in dissolve_attrs:
             target_infra_polys[attr] = target_infra_polys[attr].fillna("")
-        target_infra_polys = target_infra_polys.dissolve(by=dissolve_attrs, as_index=False)
+        with self.stage("dissolve") as stage:
+            target_infra_polys = stage.count(dissolveTiled(target_infra_polys, dissolve_attrs))
 
         # Explode multipolygon to polygons
         target_infra_polys = target_infra_polys.explode(ignore_index=True)
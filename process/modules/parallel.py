@@ -0,0 +1,147 @@
+"""Parallel execution of geometry stages.
+
+Whole stages (tiled dissolve) run in worker processes. Vectorized shapely
+operations release the GIL, so large geometry arrays are split in chunks
+which run in a thread pool.
+
+Settings are read once from configuration with configure(). Until then
+every stage runs serially in the calling process.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from modules.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Inputs smaller than this are not worth sending to worker processes
+MIN_PARALLEL_FEATURES = 5000
+# Smallest chunk of geometries given to a thread
+MIN_CHUNK_SIZE = 500
+
+_settings = {
+    "workers": 1,
+    "threads": 1,
+    "dissolve_tile_size": 1000,
+}
+
+
+def configure(cfg: Config, processes: int = 1) -> None:
+    """Read parallel execution settings from configuration.
+
+    Configured workers and threads are a budget of the whole run. When
+    processes items are processed concurrently, each of them gets an equal
+    share of the budget, at least one."""
+    cores = os.cpu_count() or 1
+    workers = cfg.parallel_workers()
+    _settings["workers"] = max(1, (workers if workers > 0 else cores) // processes)
+    threads = cfg.geometry_threads()
+    _settings["threads"] = max(1, (threads if threads > 0 else cores) // processes)
+    _settings["dissolve_tile_size"] = cfg.dissolve_tile_size()
+    logger.info(
+        "Using %d parallel workers and %d geometry threads",
+        _settings["workers"],
+        _settings["threads"],
+    )
+
+
+def worker_count() -> int:
+    """Return configured number of workers."""
+    return _settings["workers"]
+
+
+def thread_count() -> int:
+    """Return configured number of geometry threads."""
+    return _settings["threads"]
+
+
+def dissolve_tile_size() -> float:
+    """Return configured tile size of tiled dissolve."""
+    return _settings["dissolve_tile_size"]
+
+
+def process_map(func, *iterables, workers: int = None) -> list:
+    """Apply func to items of iterables in worker processes.
+
+    func must be a module level function and its arguments and results
+    picklable. Results are returned in input order. With a single worker
+    func is called in the calling process."""
+    if workers is None:
+        workers = worker_count()
+    tasks = list(zip(*iterables))
+    if workers <= 1 or len(tasks) <= 1:
+        return [func(*task) for task in tasks]
+
+    workers = min(workers, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(
+                func,
+                *zip(*tasks),
+                chunksize=max(1, len(tasks) // (workers * 4)),
+            )
+        )
+
+
+def geometry_map(func, geometries: np.ndarray, *args, threads: int = None, **kwargs) -> np.ndarray:
+    """Apply vectorized shapely func to chunks of geometries in threads.
+
+    Array arguments with the same length as geometries are split along with
+    them, other arguments are given to every chunk as they are. Result is
+    the same as func(geometries, *args, **kwargs)."""
+    if threads is None:
+        threads = thread_count()
+    count = len(geometries)
+    chunks = min(threads * 4, count // MIN_CHUNK_SIZE)
+    if threads <= 1 or chunks <= 1:
+        return func(geometries, *args, **kwargs)
+
+    bounds = np.linspace(0, count, chunks + 1).astype(int)
+
+    def apply(start: int, end: int) -> np.ndarray:
+        chunk_args = [
+            arg[start:end] if isinstance(arg, np.ndarray) and arg.ndim and len(arg) == count else arg
+            for arg in args
+        ]
+        return func(geometries[start:end], *chunk_args, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return np.concatenate(list(executor.map(apply, bounds[:-1], bounds[1:])))
+
+
+def _geoseries(geometry, values: np.ndarray) -> gpd.GeoSeries:
+    geometry = geometry.geometry if isinstance(geometry, gpd.GeoDataFrame) else geometry
+    return gpd.GeoSeries(values, index=geometry.index, crs=geometry.crs)
+
+
+def _values(geometry) -> np.ndarray:
+    geometry = geometry.geometry if isinstance(geometry, gpd.GeoDataFrame) else geometry
+    return np.asarray(geometry.values)
+
+
+def buffer(geometry, distance, quad_segs: int = 16, **kwargs) -> gpd.GeoSeries:
+    """Threaded GeoSeries.buffer of a GeoSeries or GeoDataFrame.
+
+    Distance may be a scalar or a value per geometry."""
+    if isinstance(distance, (pd.Series, list)):
+        distance = np.asarray(distance, dtype=float)
+    return _geoseries(
+        geometry,
+        geometry_map(shapely.buffer, _values(geometry), distance, quad_segs=quad_segs, **kwargs),
+    )
+
+
+def make_valid(geometry) -> gpd.GeoSeries:
+    """Threaded GeoSeries.make_valid of a GeoSeries or GeoDataFrame."""
+    return _geoseries(geometry, geometry_map(shapely.make_valid, _values(geometry)))
+
+
+def normalize(geometry) -> gpd.GeoSeries:
+    """Threaded GeoSeries.normalize of a GeoSeries or GeoDataFrame."""
+    return _geoseries(geometry, geometry_map(shapely.normalize, _values(geometry)))
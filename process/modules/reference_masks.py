@@ -0,0 +1,164 @@
+"""Cache of dissolved reference masks.
+
+Several processors dissolve the same reference layers (ylre_katuosat,
+ylre_katualueet, central business area) by the same attributes and buffer
+the result. The dissolved masks are stored as GeoParquet files in the output
+directory, keyed by the content hash of the source file, the dissolve
+attributes and the buffer distances. Each mask is therefore dissolved only
+once per data version.
+"""
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import geopandas as gpd
+
+from modules import parallel
+from modules.common import file_digest, repairInvalid
+from modules.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Bump when the contents of cached masks change
+CACHE_VERSION = 1
+CACHE_DIRECTORY = ".reference_masks"
+
+
+class ReferenceMaskCache:
+    """Dissolved, buffered and validated reference masks.
+
+    Masks are kept in memory until their source is evicted and persisted to
+    the cache directory for later runs. One instance is shared by the
+    processors of a run through LayerStore.masks()."""
+
+    def __init__(self, cfg: Config, directory: str = None):
+        if directory is None and cfg.output_directory() is not None:
+            directory = os.path.join(cfg.output_directory(), CACHE_DIRECTORY)
+        self._directory = Path(directory) if directory is not None else None
+        self._persist = cfg.reference_mask_cache() and self._directory is not None
+        self._digests = {}
+        self._masks = {}
+        self._sources = {}
+
+    def _digest(self, file_name: str) -> str:
+        """Return content hash of source file, computed once per file."""
+        if file_name not in self._digests:
+            self._digests[file_name] = file_digest(file_name)
+        return self._digests[file_name]
+
+    def _cache_key(
+        self, file_name: str, attrs: list[str], buffers: tuple, explode: bool
+    ) -> str:
+        return "{}-{}-{}-{}-v{}-{}.parquet".format(
+            Path(file_name).stem,
+            "_".join(attrs) if attrs else "all",
+            "_".join("{:g}".format(b) for b in buffers) if buffers else "0",
+            "parts" if explode else "dissolved",
+            CACHE_VERSION,
+            self._digest(file_name)[:16],
+        )
+
+    def _write(self, cache_file: Path, mask: gpd.GeoDataFrame) -> None:
+        """Write mask to cache file.
+
+        The file is written under a temporary name and renamed in place, so
+        concurrent readers never see a partially written mask."""
+        tmp_name = None
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=self._directory, suffix=".tmp", delete=False
+            ) as tmp:
+                tmp_name = tmp.name
+            mask.to_parquet(tmp_name)
+            os.replace(tmp_name, cache_file)
+        except OSError:
+            logger.warning("Could not write reference mask %s", cache_file, exc_info=True)
+            if tmp_name is not None and os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            return
+
+        # Only the newest version of a source file is kept
+        stem = cache_file.name.rsplit("-", 2)[0]
+        for stale in self._directory.glob("{}-v*.parquet".format(stem)):
+            if stale != cache_file:
+                stale.unlink(missing_ok=True)
+
+    def _compute(
+        self,
+        file_name: str,
+        attrs: list[str],
+        buffers: tuple,
+        explode: bool,
+        data: gpd.GeoDataFrame = None,
+    ) -> gpd.GeoDataFrame:
+        mask = gpd.read_file(file_name) if data is None else data.copy()
+        if attrs:
+            mask = mask.dissolve(by=attrs, as_index=not explode)
+        for distance in buffers:
+            mask["geometry"] = parallel.buffer(mask, distance)
+        if explode:
+            mask = mask.explode(ignore_index=True)
+        mask = repairInvalid(mask, "reference mask")
+        return mask[~mask.is_empty]
+
+    def _mask(
+        self,
+        file_name: str,
+        attrs: list[str],
+        buffers: tuple,
+        explode: bool,
+        data: gpd.GeoDataFrame = None,
+    ) -> gpd.GeoDataFrame:
+        attrs = list(attrs or [])
+        buffers = tuple(buffers)
+        key = self._cache_key(file_name, attrs, buffers, explode)
+        if key not in self._masks:
+            cache_file = self._directory / key if self._persist else None
+            if cache_file is not None and cache_file.exists():
+                logger.info("Reading reference mask from cache %s", cache_file)
+                mask = gpd.read_parquet(cache_file)
+            else:
+                mask = self._compute(file_name, attrs, buffers, explode, data)
+                if cache_file is not None:
+                    self._write(cache_file, mask)
+            self._masks[key] = mask
+            self._sources[key] = file_name
+        # callers are free to modify their copy
+        return self._masks[key].copy()
+
+    def evict(self, file_name: str) -> None:
+        """Drop masks of source file from memory."""
+        for key in [key for key, source in self._sources.items() if source == file_name]:
+            del self._masks[key]
+            del self._sources[key]
+            logger.debug("Evicted reference mask %s", key)
+
+    def dissolved(
+        self,
+        file_name: str,
+        attrs: list[str],
+        buffers: tuple = (),
+        data: gpd.GeoDataFrame = None,
+    ) -> gpd.GeoDataFrame:
+        """Return file contents dissolved by attrs and buffered.
+
+        Dissolve attributes form the index like in GeoDataFrame.dissolve.
+        Buffer distances are applied in given order, e.g. (10, -10) closes
+        gaps narrower than 20 m. If contents of the file are already read,
+        they can be given as data to avoid reading the file again."""
+        return self._mask(file_name, attrs, buffers, False, data)
+
+    def parts(
+        self,
+        file_name: str,
+        attrs: list[str] = None,
+        buffers: tuple = (),
+        data: gpd.GeoDataFrame = None,
+    ) -> gpd.GeoDataFrame:
+        """Return valid single part polygons of file contents.
+
+        Polygons are dissolved by attrs if given and buffered before they are
+        exploded. Suitable as a mask of clipAreasByAreas."""
+        return self._mask(file_name, attrs, buffers, True, data)
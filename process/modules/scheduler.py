@@ -0,0 +1,94 @@
+"""Dependency aware scheduling of processing items.
+
+Processors declare the processed files they read and write in their inputs
+and outputs class attributes. An item depends on the requested items
+producing its inputs; inputs produced by items not requested are expected
+to exist already. Items whose dependencies are done run concurrently in
+worker processes, so a full rebuild takes the time of the longest chain of
+dependent items instead of the sum of all items.
+"""
+import logging
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+def dependencies(items: list[str], processors: dict) -> dict[str, set[str]]:
+    """Return requested items each item depends on.
+
+    processors maps item to its processor class."""
+    producers = {}
+    for item in items:
+        for artifact in getattr(processors[item], "outputs", ()):
+            producers[artifact] = item
+    return {
+        item: {
+            producers[artifact]
+            for artifact in getattr(processors[item], "inputs", ())
+            if producers.get(artifact, item) != item
+        }
+        for item in items
+    }
+
+
+def run(func, items: list[str], depends_on: dict[str, set[str]], *args, workers: int = 1, initializer=None, initargs=(), on_result=None) -> list[str]:
+    """Call func(item, *args) for items in dependency order.
+
+    func must be a module level function. With more than one worker
+    independent items run concurrently in worker processes, initializer is
+    called with initargs in every worker. on_result is called in the calling
+    process with item and result of func for every successful item. An item
+    whose dependency failed is skipped. Return failed and skipped items."""
+    pending = list(dict.fromkeys(items))
+    done = set()
+    failed = []
+
+    def skip_dependants():
+        skipped = [item for item in pending if depends_on.get(item, set()) & set(failed)]
+        for item in skipped:
+            logger.error("Skipping %s, dependency failed", item)
+            pending.remove(item)
+            failed.append(item)
+        return skipped
+
+    def ready(running) -> list[str]:
+        return [item for item in pending if item not in running and depends_on.get(item, set()) <= done]
+
+    def finished(item: str, error: BaseException = None, result=None):
+        pending.remove(item)
+        if error is None:
+            done.add(item)
+            if on_result is not None:
+                on_result(item, result)
+        else:
+            logger.error("Processing %s failed", item, exc_info=error)
+            failed.append(item)
+            while skip_dependants():
+                pass
+
+    if workers <= 1:
+        while pending:
+            runnable = ready(())
+            if not runnable:
+                raise ValueError("Dependency cycle between items: {}".format(", ".join(pending)))
+            item = runnable[0]
+            try:
+                result = func(item, *args)
+            except Exception as error:
+                finished(item, error)
+            else:
+                finished(item, result=result)
+        return failed
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        running = {}
+        while pending:
+            for item in ready(running.values()):
+                running[executor.submit(func, item, *args)] = item
+            if not running:
+                raise ValueError("Dependency cycle between items: {}".format(", ".join(pending)))
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                error = future.exception()
+                finished(running.pop(future), error, None if error is not None else future.result())
+    return failed
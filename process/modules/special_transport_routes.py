@@ -1,12 +1,11 @@
 import geopandas as gpd
-import pandas as pd
 from sqlalchemy import create_engine, text
 from os import path
-from shapely.validation import make_valid
 
 from modules.config import Config
 from modules.gis_processing import GisProcessor
 from modules.common import *
+from modules.layer_store import LayerStore
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -15,8 +14,13 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 class SpecialTransportRoutes(GisProcessor):
     """Process special transport routes."""
 
-    def __init__(self, cfg: Config):
+    inputs = [("ylre_katualueet", "target_buffer_file")]
+    outputs = [("special_transport_routes", "target_file"), ("special_transport_routes", "target_buffer_file")]
+
+    def __init__(self, cfg: Config, layers: LayerStore = None):
         self._cfg = cfg
+        if layers is None:
+            layers = LayerStore(cfg)
         self._process_result_lines = None
         self._process_result_polygons = None
         self._debug_result_lines = None
@@ -25,14 +29,17 @@ class SpecialTransportRoutes(GisProcessor):
         file_name = cfg.local_file(self._module)
         self._store_original_data = cfg.store_orinal_data(self._module)
         self._ylre_street_class_buffer = cfg.ylre_street_class_buffer(self._module)
+        self._reference_masks = layers.masks()
+        self._topology_cleanup = cfg.topology_cleanup()
+        self._precision_grid = cfg.precision_grid()
+        self._sliver_area = cfg.sliver_area()
 
         # check that ylre_katualueet file is available
         if not path.exists(self._cfg.target_buffer_file("ylre_katualueet")):
             raise FileNotFoundError("ylre katualueet polygon not found")
 
         # Loading ylre_katualueet dataset
-        ylre_katualueet_filename = cfg.target_buffer_file("ylre_katualueet")
-        self._ylre_katualueet = gpd.read_file(ylre_katualueet_filename)
+        self._ylre_katualueet = layers.get("ylre_katualueet")
         self._ylre_katualueet_sindex = self._ylre_katualueet.sindex
 
         # Buffering configuration
@@ -40,6 +47,7 @@ class SpecialTransportRoutes(GisProcessor):
 
         if len(self._buffers) != 3:
             raise ValueError("Unknown number of buffer values")
+        self._buffer_strategy = self._cfg.buffer_strategy(self._module)
 
         # Buffering classes
         self._buffer_class_vaylatyp2_values = {
@@ -83,30 +91,23 @@ class SpecialTransportRoutes(GisProcessor):
         return retval
 
     def _buffering(self, lines: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        # Buffer lines
-        target_infra_polys = lines.copy()
-        retval = target_infra_polys[0:0]
-        for buffer_class, buffer_value in self._buffers.items():
-            buffered_items = target_infra_polys.loc[target_infra_polys["vaylatyyp2"].isin(self._buffer_class_vaylatyp2_values[buffer_class])].copy()
-            buffered_items["geometry"] = buffered_items.buffer(buffer_value)
-            retval = gpd.GeoDataFrame(pd.concat([retval, buffered_items], ignore_index=True))
-
-        return retval
+        # Buffer lines, merged lines must keep attributes used in clipping
+        return bufferLinesByClass(
+            lines,
+            "vaylatyyp2",
+            self._buffer_class_vaylatyp2_values,
+            self._buffers,
+            self._buffer_strategy,
+            groupAttrs=["mitlev", "mitpit", "mitkor", "muuntaja", "tuleva", "varareitti", "vaylatyyp2", "nimi", "ylre_class"],
+        )
 
     def _check_and_set_ylre_classes_id(self, lines: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-        attrs = ["ylre_class"]
-        ylre_katualueet_dissolved = self._ylre_katualueet.dissolve(by=attrs)
-        ylre_katualueet_dissolved["geometry"] = ylre_katualueet_dissolved.buffer(15)
-        joined_result = gpd.sjoin(lines, ylre_katualueet_dissolved, predicate='within')
-
-        retval = lines.merge(joined_result[['gml_id','ylre_class','kadun_nimi']], how='left', left_on='gml_id', right_on='gml_id')
+        retval = joinWithinDistance(
+            lines, self._ylre_katualueet, ["ylre_class"], 15, columns=["kadun_nimi"], sindex=self._ylre_katualueet_sindex
+        )
 
         return retval
 
-    def _make_valid(self, data, geom_column):
-        data[geom_column] = data.apply(lambda row: make_valid(row[geom_column]) if not row[geom_column].is_valid else row[geom_column], axis=1)
-        return(data)
-
     def process(self):
         self._process_result_lines = self._lines
 
@@ -114,16 +115,20 @@ class SpecialTransportRoutes(GisProcessor):
         self._process_result_lines.drop_duplicates(subset=["gml_id"], inplace=True)
 
         # Mark objects which are within YLRE katualueet areas
-        self._process_result_lines = self._check_and_set_ylre_classes_id(self._process_result_lines)
+        with self.stage("join") as stage:
+            self._process_result_lines = stage.count(self._check_and_set_ylre_classes_id(self._process_result_lines))
 
         # Buffer lines using buffer configuration
-        target_infra_polys = self._process_result_lines.copy()
-        target_infra_polys = self._buffering(target_infra_polys)
+        with self.stage("buffer") as stage:
+            target_infra_polys = self._process_result_lines.copy()
+            target_infra_polys = stage.count(self._buffering(target_infra_polys))
 
         # Clip by using YLRE katuosa areas
         geometryToClipAttrsDissolve = ["mitlev", "mitpit", "mitkor", "muuntaja", "tuleva", "varareitti", "vaylatyyp2", "nimi"]
-        maskAttrsDissolve = ["ylre_class"]
-        target_infra_polys = clipAreasByAreas(target_infra_polys, self._ylre_katualueet, geometryToClipAttrsDissolve, maskAttrsDissolve, "gml_id", "ylre_class", False)
+        with self.stage("clip") as stage:
+            ylre_katualueet_parts = self._reference_masks.parts(self._cfg.target_buffer_file("ylre_katualueet"), data=self._ylre_katualueet)
+            target_infra_polys = clipAreasByAreas(target_infra_polys, ylre_katualueet_parts, geometryToClipAttrsDissolve, "ylre_class", False, cleanupMode=self._topology_cleanup, gridSize=self._precision_grid, sliverArea=self._sliver_area)
+            stage.count(target_infra_polys)
         target_infra_polys = target_infra_polys[target_infra_polys.geometry.type != 'Point']
 
         # Drop unnecessary columns
@@ -136,14 +141,14 @@ class SpecialTransportRoutes(GisProcessor):
         for attr in attrs:
             target_infra_polys[attr] = target_infra_polys[attr].fillna("")
 
-        target_infra_polys = target_infra_polys.dissolve(by=attrs, aggfunc="sum", as_index=False)
+        with self.stage("dissolve") as stage:
+            target_infra_polys = stage.count(dissolveTiled(target_infra_polys, attrs, aggfunc="sum"))
 
         # Explode multipolygon to polygons
         target_infra_polys = target_infra_polys.explode(ignore_index=True)
 
         # Validate geometry
-        target_infra_polys = self._make_valid(target_infra_polys, "geometry")
-        target_infra_polys = makeValid(target_infra_polys)
+        target_infra_polys = makeValid(target_infra_polys, self._module)
 
         target_infra_polys = target_infra_polys[~target_infra_polys.is_empty]
         # save to instance
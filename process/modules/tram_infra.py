@@ -4,7 +4,10 @@ import pandas as pd
 from sqlalchemy import create_engine
 
 from modules.config import Config
+from modules import parallel
 from modules.gis_processing import GisProcessor
+from modules.common import clipAreasByAreas
+from modules.layer_store import LayerStore
 
 logger = logging.getLogger(__name__)
 
@@ -33,19 +36,26 @@ TRAM_TYPES = ["tram", "light_rail"]
 class TramInfra(GisProcessor):
     """Process tram infra."""
 
-    def __init__(self, cfg: Config):
+    # train depots are read from source address of tram_infra
+    inputs = [("ylre_katualueet", "target_buffer_file"), ("hki", "local_file"), ("tram_infra", "addr")]
+    outputs = [("tram_infra", "target_file"), ("tram_infra", "target_buffer_file")]
+
+    def __init__(self, cfg: Config, layers: LayerStore = None):
         self._cfg = cfg
+        if layers is None:
+            layers = LayerStore(cfg)
+        self._layers = layers
         self._process_result_lines = None
         self._process_result_polygons = None
         self._debug_result_lines = None
         self._orig = None
         # Loading ylre_katualueet dataset
-        ylre_katualueet_filename = cfg.target_buffer_file("ylre_katualueet")
-        self._ylre_katualueet = gpd.read_file(ylre_katualueet_filename)
+        self._ylre_katualueet = layers.get("ylre_katualueet")
         self._ylre_katualueet_sindex = self._ylre_katualueet.sindex
+        self._reference_masks = layers.masks()
 
         # Loading train_depots dataset
-        self._train_depots = gpd.read_file("/local_data/train_depots.gpkg")
+        self._train_depots = gpd.read_file(cfg.addr("tram_infra"))
         self._train_depots_sindex = self._train_depots.sindex
 
         self._module = "tram_infra"
@@ -53,56 +63,6 @@ class TramInfra(GisProcessor):
         file_name = cfg.local_file(self._module)
         self._lines = gpd.read_file(filename=file_name)
 
-    def _clipAreasByAreas(self, geometryToClip: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, geometryToClipAttrsDissolve, maskAttrsDissolve, mergeIdField, geometryToClipCheckAttr=None) -> gpd.GeoDataFrame:
-        geometry = geometryToClip[~geometryToClip.is_empty]
-        for attr in maskAttrsDissolve:
-            mask[attr] = mask[attr].fillna("")
-
-        if maskAttrsDissolve:
-            mask_dissolved = mask.dissolve(by=maskAttrsDissolve, as_index=False)
-        else:
-            mask_dissolved = mask
-
-        mask_dissolved = mask_dissolved.explode(ignore_index=True)
-
-        if geometryToClipCheckAttr is not None:
-            geometryToClipOnlyCheckObjects = geometry[geometry[geometryToClipCheckAttr].notnull()]
-            geometryToClipNotCheckObjects = geometry.loc[~geometry[geometryToClipCheckAttr].notnull()]
-        else:
-            geometryToClipOnlyCheckObjects = geometry
-
-        geometryToClipOnlyCheckObjects = geometryToClipOnlyCheckObjects.explode(ignore_index=True)
-        # Actual clipping:
-        clipped_result=gpd.clip(geometryToClipOnlyCheckObjects, mask_dissolved)
-        clipped_result = clipped_result.explode(ignore_index=True)
-        clipped_result.geometry = clipped_result.apply(lambda row: make_valid(row.geometry) if not row.geometry.is_valid else row.geometry, axis=1)
-        geometryToClipOnlyCheckObjects.geometry = geometryToClipOnlyCheckObjects.apply(lambda row: make_valid(row.geometry) if not row.geometry.is_valid else row.geometry, axis=1)
-
-        # Getting objects which were not clipped
-        merged = geometryToClipOnlyCheckObjects.merge(clipped_result, how="outer", indicator=True, on=mergeIdField, suffixes=("", "_right"))
-        not_clipped = merged[merged["_merge"] == "left_only"].copy()
-        not_clipped.drop("_merge", axis=1, inplace=True)
-        common_columns = set(geometryToClipOnlyCheckObjects.columns).intersection(not_clipped.columns)
-        common_columns.add(geometryToClipOnlyCheckObjects.geometry.name)
-        common_columns_list = list(common_columns)
-        not_clipped = not_clipped[common_columns_list].copy()
-
-        # Adding clipped results to objects which were not checked at all
-        if geometryToClipCheckAttr is not None:
-            retval = gpd.GeoDataFrame(pd.concat([geometryToClipNotCheckObjects, clipped_result], ignore_index=True))
-        else:
-            retval = clipped_result
-
-        # Adding not clipped objects
-        retval = gpd.GeoDataFrame(pd.concat([retval, not_clipped], ignore_index=True))
-        for attr in geometryToClipAttrsDissolve:
-            retval[attr] = retval[attr].fillna("")
-        if geometryToClipAttrsDissolve:
-            retval = retval.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
-        retval = retval.explode(ignore_index=True)
-
-        return retval
-
     def process(self):
         lines = self._lines
         # New implementation of getting only tram lines:
@@ -149,16 +109,16 @@ class TramInfra(GisProcessor):
         # Pick not light rail objects
         buffered_not_light_rail = self._process_result_lines.loc[~self._process_result_lines["railway"].isin(["light_rail", ])].copy()
         # Buffer not light rail objects using first buffer value
-        buffered_not_light_rail["geometry"] = buffered_not_light_rail.buffer(buffers[0])
+        buffered_not_light_rail["geometry"] = parallel.buffer(buffered_not_light_rail, buffers[0])
         # Buffer light rail objects using second buffer value
-        buffered_light_rail["geometry"] = buffered_light_rail.buffer(buffers[1])
+        buffered_light_rail["geometry"] = parallel.buffer(buffered_light_rail, buffers[1])
         # Concat datasets
         target_infra_polys = pd.concat([buffered_not_light_rail, buffered_light_rail])
 
         # Clip by using YLRE katualueet areas
         geometryToClipAttrsDissolve = ["infra"]
-        maskAttrsDissolve = ["ylre_class"]
-        target_infra_polys = self._clipAreasByAreas(target_infra_polys, self._ylre_katualueet, geometryToClipAttrsDissolve, maskAttrsDissolve, "id", "ylre_class")
+        ylre_katualueet_parts = self._reference_masks.parts(self._cfg.target_buffer_file("ylre_katualueet"), data=self._ylre_katualueet)
+        target_infra_polys = clipAreasByAreas(target_infra_polys, ylre_katualueet_parts, geometryToClipAttrsDissolve, "ylre_class", resultBuffer=None)
         target_infra_polys.drop(columns=["id", "ylre_class", "kadun_nimi"], inplace=True) # Dropping temporary id field
         for attr in geometryToClipAttrsDissolve:
             target_infra_polys[attr] = target_infra_polys[attr].fillna("")
@@ -167,9 +127,7 @@ class TramInfra(GisProcessor):
         # Only intersecting objects to Helsinki area are important
         # read Helsinki geographical region and reproject
         try:
-            helsinki_region_polygon = gpd.read_file(
-                filename=self._cfg.local_file("hki")
-            ).to_crs(self._cfg.crs())
+            helsinki_region_polygon = self._layers.get("hki", "local_file")
         except Exception as e:
             logger.error("Area polygon file not found!")
             raise e
@@ -2,13 +2,14 @@ import logging
 import geopandas as gpd
 import pandas as pd
 from sqlalchemy import create_engine
-import gtfs_kit as gk
-from shapely.errors import ShapelyDeprecationWarning
-from shapely.geometry import LineString, Point
-import warnings
 
 from modules.config import Config
+from modules import parallel
 from modules.gis_processing import GisProcessor
+from modules.common import clipAreasByAreas
+from modules.layer_store import LayerStore
+from modules.gtfs import shape_lines
+from modules.gtfs_feed import read_feed
 
 # Select only following route_type values(HSL):
 # 0 = Urban tram
@@ -21,8 +22,14 @@ logger = logging.getLogger(__name__)
 class TramLines(GisProcessor):
     """Process tram lines, i.e. schedule information."""
 
-    def __init__(self, cfg: Config):
+    inputs = [("ylre_katualueet", "target_buffer_file"), ("hki", "local_file")]
+    outputs = [("tram_lines", "target_file"), ("tram_lines", "target_buffer_file")]
+
+    def __init__(self, cfg: Config, layers: LayerStore = None):
         self._cfg = cfg
+        if layers is None:
+            layers = LayerStore(cfg)
+        self._layers = layers
         self._process_result_lines = None
         self._process_result_polygons = None
         self._debug_result_lines = None
@@ -31,12 +38,16 @@ class TramLines(GisProcessor):
         self._store_original_data = cfg.store_orinal_data(self._module)
 
         # Loading ylre_katualueet dataset
-        ylre_katualueet_filename = cfg.target_buffer_file("ylre_katualueet")
-        self._ylre_katualueet = gpd.read_file(ylre_katualueet_filename)
+        self._ylre_katualueet = layers.get("ylre_katualueet")
         self._ylre_katualueet_sindex = self._ylre_katualueet.sindex
+        self._reference_masks = layers.masks()
 
         file_name = cfg.local_file(self._module)
-        self._feed = gk.read_feed(file_name, dist_units="km")
+        self._feed = read_feed(
+            file_name,
+            use_cache=cfg.gtfs_cache(),
+            loader=cfg.gtfs_loader(self._module),
+        )
 
     def _tram_trips(self) -> pd.DataFrame:
         """Pick tram trips from schedule data."""
@@ -56,72 +67,7 @@ class TramLines(GisProcessor):
 
     def _line_shapes(self) -> gpd.GeoDataFrame:
         """Form line geometries from schedule data."""
-        shp_sorted = self._feed.shapes.sort_values(["shape_id", "shape_pt_sequence"])
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=ShapelyDeprecationWarning)
-
-            shp_sorted["geometry"] = shp_sorted.apply(
-                lambda p: Point(p.shape_pt_lon, p.shape_pt_lat), axis=1
-            )
-            shp_lines = gpd.GeoDataFrame(
-                shp_sorted.groupby(["shape_id"])["geometry"].apply(
-                    lambda x: LineString(x.tolist())
-                ),
-                geometry="geometry",
-            )
-        shp_lines = shp_lines.set_crs(epsg=4326)
-        shp_lines = shp_lines.to_crs(self._cfg.crs())
-        return shp_lines
-
-    def _clipAreasByAreas(self, geometryToClip: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, geometryToClipAttrsDissolve, maskAttrsDissolve, mergeIdField, geometryToClipCheckAttr=None) -> gpd.GeoDataFrame:
-        geometry = geometryToClip[~geometryToClip.is_empty]
-        for attr in maskAttrsDissolve:
-            mask[attr] = mask[attr].fillna("")
-
-        if maskAttrsDissolve:
-            mask_dissolved = mask.dissolve(by=maskAttrsDissolve, as_index=False)
-        else:
-            mask_dissolved = mask
-
-        mask_dissolved = mask_dissolved.explode(ignore_index=True)
-
-        if geometryToClipCheckAttr is not None:
-            geometryToClipOnlyCheckObjects = geometry[geometry[geometryToClipCheckAttr].notnull()]
-            geometryToClipNotCheckObjects = geometry.loc[~geometry[geometryToClipCheckAttr].notnull()]
-        else:
-            geometryToClipOnlyCheckObjects = geometry
-
-        geometryToClipOnlyCheckObjects = geometryToClipOnlyCheckObjects.explode(ignore_index=True)
-        # Actual clipping:
-        clipped_result=gpd.clip(geometryToClipOnlyCheckObjects, mask_dissolved)
-        clipped_result = clipped_result.explode(ignore_index=True)
-        clipped_result.geometry = clipped_result.apply(lambda row: make_valid(row.geometry) if not row.geometry.is_valid else row.geometry, axis=1)
-        geometryToClipOnlyCheckObjects.geometry = geometryToClipOnlyCheckObjects.apply(lambda row: make_valid(row.geometry) if not row.geometry.is_valid else row.geometry, axis=1)
-
-        # Getting objects which were not clipped
-        merged = geometryToClipOnlyCheckObjects.merge(clipped_result, how="outer", indicator=True, on=mergeIdField, suffixes=("", "_right"))
-        not_clipped = merged[merged["_merge"] == "left_only"].copy()
-        not_clipped.drop("_merge", axis=1, inplace=True)
-        common_columns = set(geometryToClipOnlyCheckObjects.columns).intersection(not_clipped.columns)
-        common_columns.add(geometryToClipOnlyCheckObjects.geometry.name)
-        common_columns_list = list(common_columns)
-        not_clipped = not_clipped[common_columns_list].copy()
-
-        # Adding clipped results to objects which were not checked at all
-        if geometryToClipCheckAttr is not None:
-            retval = gpd.GeoDataFrame(pd.concat([geometryToClipNotCheckObjects, clipped_result], ignore_index=True))
-        else:
-            retval = clipped_result
-
-        # Adding not clipped objects
-        retval = gpd.GeoDataFrame(pd.concat([retval, not_clipped], ignore_index=True))
-        for attr in geometryToClipAttrsDissolve:
-            retval[attr] = retval[attr].fillna("")
-        if geometryToClipAttrsDissolve:
-            retval = retval.dissolve(by=geometryToClipAttrsDissolve, as_index=False)
-        retval = retval.explode(ignore_index=True)
-
-        return retval
+        return shape_lines(self._feed.shapes, self._cfg.crs())
 
     def process(self):
         tram_trips = self._tram_trips()
@@ -146,12 +92,12 @@ class TramLines(GisProcessor):
 
         # buffer lines
         target_lines_polys = self._process_result_lines.copy()
-        target_lines_polys["geometry"] = target_lines_polys.buffer(buffers[0])
+        target_lines_polys["geometry"] = parallel.buffer(target_lines_polys, buffers[0])
 
         # Clip by using YLRE katualueet areas
         geometryToClipAttrsDissolve = ["lines"]
-        maskAttrsDissolve = ["ylre_class"]
-        target_lines_polys = self._clipAreasByAreas(target_lines_polys, self._ylre_katualueet, geometryToClipAttrsDissolve, maskAttrsDissolve, "id", "ylre_class")
+        ylre_katualueet_parts = self._reference_masks.parts(self._cfg.target_buffer_file("ylre_katualueet"), data=self._ylre_katualueet)
+        target_lines_polys = clipAreasByAreas(target_lines_polys, ylre_katualueet_parts, geometryToClipAttrsDissolve, "ylre_class", resultBuffer=None)
         target_lines_polys.drop(columns=["id", "ylre_class", "kadun_nimi"], inplace=True) # Dropping temporary id field
         for attr in geometryToClipAttrsDissolve:
             target_lines_polys[attr] = target_lines_polys[attr].fillna("")
@@ -160,9 +106,7 @@ class TramLines(GisProcessor):
         # Only intersecting routes to Helsinki area are important
         # read Helsinki geographical region and reproject
         try:
-            helsinki_region_polygon = gpd.read_file(
-                filename=self._cfg.local_file("hki")
-            ).to_crs(self._cfg.crs())
+            helsinki_region_polygon = self._layers.get("hki", "local_file")
         except Exception as e:
             logger.error("Area polygon file not found!")
             raise e
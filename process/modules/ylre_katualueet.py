@@ -8,6 +8,8 @@ from modules.config import Config
 class YlreKatualueet:
     """Process YLRE street areas"""
 
+    outputs = [("ylre_katualueet", "target_file"), ("ylre_katualueet", "target_buffer_file")]
+
     def __init__(self, cfg: Config):
         self._cfg = cfg
         self._module = "ylre_katualueet"
@@ -10,6 +10,8 @@ from modules.config import Config
 class YlreKatuosat:
     """Process YLRE parts"""
 
+    outputs = [("ylre_katuosat", "target_file"), ("ylre_katuosat", "target_buffer_file")]
+
     def __init__(self, cfg: Config):
         self._cfg = cfg
         self._module = "ylre_katuosat"
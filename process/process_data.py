@@ -3,66 +3,119 @@
 import logging
 import os
 import sys
+from collections import Counter
 
 from modules.config import Config
 from modules.gis_processing import GisProcessor
-
-from modules.autoliikennemaarat import MakaAutoliikennemaarat
-from modules.hsl import HslBuses
-from modules.ylre_katualueet import YlreKatualueet
-from modules.ylre_katuosat import YlreKatuosat
-from modules.tram_infra import TramInfra
-from modules.tram_lines import TramLines
-from modules.cycling_infra import CycleInfra
-from modules.liikennevaylat import Liikennevaylat
-from modules.central_business_area import CentralBusinessAreas
-from modules.special_transport_routes import SpecialTransportRoutes
-from modules.critical_areas import CriticalAreas
+from modules import parallel
+from modules import instrumentation
+from modules import registry
+from modules import scheduler
+from modules.build_cache import BuildCache
+from modules.common import repairCounts
+from modules.layer_store import LayerStore
 
 DEFAULT_DEPLOYMENT_PROFILE = "local_development"
+FORMAT = "%(asctime)s - %(levelname)-5s - %(name)-15s - %(message)s"
+
+logger = logging.getLogger(__name__)
+
+# layer store of a worker process
+_worker_layers = None
+
+
+def process_item(item: str, cfg: Config, layers: LayerStore = None) -> dict:
+    """Process item recording its stages.
 
+    Return instrumentation records of the item."""
+    if layers is None:
+        layers = _worker_layers if _worker_layers is not None else LayerStore(cfg)
+    processor = registry.processor_class(item)
+    build_cache = BuildCache(cfg)
+    repairs = Counter(repairCounts())
+    try:
+        fingerprint = build_cache.fingerprint(item, processor)
+        if build_cache.is_current(item, processor, fingerprint):
+            logger.info("Skipping item %s, inputs are unchanged since last build", item)
+            return instrumentation.take(item)
+        logger.info("Processing item: %s", item)
+        with instrumentation.stage(item, "read"):
+            gis_processor = instantiate_processor(item, cfg, layers)
+        gis_processor.run()
+        build_cache.store(item, processor, fingerprint)
+    finally:
+        layers.release(getattr(processor, "inputs", ()))
+        instrumentation.count(item, "repaired_geometries", Counter(repairCounts()) - repairs)
+    return instrumentation.take(item)
 
-def process_item(item: str, cfg: Config):
-    logger.info("Processing item: %s", item)
-    gis_processor = instantiate_processor(item, cfg)
-    gis_processor.process()
-    gis_processor.persist_to_database()
-    gis_processor.save_to_file()
-    pass
 
+def instantiate_processor(item: str, cfg: Config, layers: LayerStore = None) -> GisProcessor:
+    """Instantiate correct class for processing data.
 
-def instantiate_processor(item: str, cfg: Config) -> GisProcessor:
-    """Instantiate correct class for processing data."""
+    Processors reading other layers get them from the layer store."""
+    processor = registry.processor_class(item)
     if item == "hsl":
-        return HslBuses(cfg, validate_gtfs=False)
-    elif item == "maka_autoliikennemaarat":
-        return MakaAutoliikennemaarat(cfg)
-    elif item == "ylre_katuosat":
-        return YlreKatuosat(cfg)
-    elif item == "ylre_katualueet":
-        return YlreKatualueet(cfg)
-    elif item == "tram_infra":
-        return TramInfra(cfg)
-    elif item == "tram_lines":
-        return TramLines(cfg)
-    elif item == "cycle_infra":
-        return CycleInfra(cfg)
-    elif item == "liikennevaylat":
-        return Liikennevaylat(cfg)
-    elif item == "central_business_area":
-        return CentralBusinessAreas(cfg)
-    elif item == "special_transport_routes":
-        return SpecialTransportRoutes(cfg)
-    elif item == "critical_areas":
-        return CriticalAreas(cfg)
-    else:
+        return processor(cfg, validate_gtfs=True, layers=layers)
+    if getattr(processor, "inputs", ()):
+        return processor(cfg, layers=layers)
+    return processor(cfg)
+
+
+def init_worker(cfg: Config, processes: int):
+    """Set up logging, parallel settings and layer store in a worker process.
+
+    The parallel workers and geometry threads of the run are shared between
+    processes concurrent items. Layers are not shared between processes, a
+    worker evicts the layers of an item when the item is done."""
+    global _worker_layers
+    logging.basicConfig(format=FORMAT, level=logging.INFO)
+    parallel.configure(cfg, processes)
+    _worker_layers = LayerStore(cfg)
+
+
+def merge_records(item: str, records: dict):
+    """Add instrumentation records of a processed item to the run report."""
+    instrumentation.merge(records)
+
+
+def process_items(items: list[str], cfg: Config) -> list[str]:
+    """Process items in dependency order, independent items concurrently.
+
+    Return items which failed or were skipped."""
+    unknown = [item for item in items if not registry.is_registered(item)]
+    for item in unknown:
         logger.error("Configuration not recognized: %s", item)
+    items = [item for item in dict.fromkeys(items) if registry.is_registered(item)]
+    # only the requested processors are imported
+    processors = {item: registry.processor_class(item) for item in items}
+
+    workers = cfg.processor_workers()
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(items))
+    depends_on = scheduler.dependencies(items, processors)
+    if workers > 1:
+        failed = scheduler.run(
+            process_item,
+            items,
+            depends_on,
+            cfg,
+            workers=workers,
+            initializer=init_worker,
+            initargs=(cfg, workers),
+            on_result=merge_records,
+        )
+    else:
+        # items share layers loaded once, each kept until its last reader is done
+        layers = LayerStore(cfg)
+        for item in items:
+            layers.expect(getattr(processors[item], "inputs", ()))
+        failed = scheduler.run(process_item, items, depends_on, cfg, layers, on_result=merge_records)
+    return unknown + failed
 
 
 if __name__ == "__main__":
-    FORMAT = "%(asctime)s - %(levelname)-5s - %(name)-15s - %(message)s"
     logging.basicConfig(format=FORMAT, level=logging.INFO)
-    logger = logging.getLogger(__name__)
 
     deployment_profile = os.environ.get("TORMAYS_DEPLOYMENT_PROFILE")
     use_deployment_profile = DEFAULT_DEPLOYMENT_PROFILE
@@ -75,6 +128,10 @@ if __name__ == "__main__":
         )
 
     cfg = Config().with_deployment_profile(use_deployment_profile)
+    parallel.configure(cfg)
 
-    for item in sys.argv[1:]:
-        process_item(item, cfg)
+    failed = process_items(sys.argv[1:], cfg)
+    instrumentation.write_report("process", cfg.run_report_file("process"), cfg.metrics_textfile("process"))
+    if failed:
+        logger.error("Processing failed: %s", ", ".join(failed))
+        sys.exit(1)
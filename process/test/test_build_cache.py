@@ -0,0 +1,140 @@
+"""Tests for build cache of processed items."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+from modules import build_cache
+from modules.build_cache import BuildCache
+from modules.config import Config
+
+
+class Lines:
+    inputs = [("areas", "target_buffer_file")]
+    outputs = [("lines", "target_file"), ("lines", "target_buffer_file")]
+
+
+class Segments(Lines):
+    outputs = Lines.outputs + [("lines", "target_segment_file")]
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.sections = {"lines": {"local_file": "lines.gpkg", "buffer": [15, 30]}, "common": {"crs": "EPSG:3879"}}
+        cfg = mock.Mock(spec=Config)
+        cfg.build_cache.return_value = True
+        cfg.force_rebuild.return_value = False
+        cfg.output_directory.return_value = self._tmp.name
+        cfg.section.side_effect = lambda item: dict(self.sections.get(item, {}))
+        cfg.buffer.side_effect = lambda item: self.sections[item]["buffer"]
+        cfg.local_file.side_effect = lambda item: self.path(item + ".gpkg")
+        cfg.target_file.side_effect = lambda item: self.path(item + "_lines.gpkg")
+        cfg.target_segment_file.side_effect = lambda item: self.path(item + "_segments.gpkg")
+        cfg.target_buffer_file.side_effect = lambda item: self.path(item + "{}_polys.gpkg" if item == "lines" else item + "_polys.gpkg")
+        self.cfg = cfg
+        self.database = None
+        for name in ["lines.gpkg", "areas_polys.gpkg"]:
+            self.write(name, name)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self._tmp.name, name)
+
+    def write(self, name: str, content: str):
+        with open(self.path(name), "w") as stream:
+            stream.write(content)
+
+    def cache(self) -> BuildCache:
+        return BuildCache(self.cfg, database_state=lambda cfg, item: self.database)
+
+    def build(self, cache: BuildCache) -> str:
+        fingerprint = cache.fingerprint("lines", Lines)
+        for name in ["lines_lines.gpkg", "lines15_polys.gpkg", "lines30_polys.gpkg"]:
+            self.write(name, "result")
+        cache.store("lines", Lines, fingerprint)
+        return fingerprint
+
+    def is_current(self) -> bool:
+        cache = self.cache()
+        return cache.is_current("lines", Lines, cache.fingerprint("lines", Lines))
+
+    def test_unchanged_item_is_current(self):
+        self.assertFalse(self.is_current())
+        self.build(self.cache())
+        self.assertTrue(self.is_current())
+
+    def test_changed_local_file(self):
+        self.build(self.cache())
+        self.write("lines.gpkg", "new download")
+        self.assertFalse(self.is_current())
+
+    def test_changed_upstream_output(self):
+        self.build(self.cache())
+        self.write("areas_polys.gpkg", "rebuilt areas")
+        self.assertFalse(self.is_current())
+
+    def test_changed_configuration(self):
+        self.build(self.cache())
+        self.sections["lines"]["buffer_strategy"] = "union"
+        self.assertFalse(self.is_current())
+
+    def test_changed_or_missing_output(self):
+        self.build(self.cache())
+        self.write("lines30_polys.gpkg", "edited")
+        self.assertFalse(self.is_current())
+        self.build(self.cache())
+        os.remove(self.path("lines15_polys.gpkg"))
+        self.assertFalse(self.is_current())
+
+    def test_output_not_written(self):
+        cache = self.cache()
+        fingerprint = self.build(cache)
+        cache.store("lines", Segments, fingerprint)
+        self.assertTrue(cache.is_current("lines", Segments, fingerprint))
+        self.write("lines_segments.gpkg", "stale segments")
+        self.assertFalse(cache.is_current("lines", Segments, fingerprint))
+
+    def test_changed_package_version(self):
+        fingerprint = self.build(self.cache())
+        dist = mock.Mock(metadata={"Name": "shapely"}, version="0.0.1")
+        with mock.patch.object(build_cache, "_code_version", None), mock.patch(
+            "importlib.metadata.distributions", return_value=[dist]
+        ):
+            self.assertNotEqual(self.cache().fingerprint("lines", Lines), fingerprint)
+
+    def test_changed_database_state(self):
+        self.database = "lines:10"
+        self.build(self.cache())
+        self.assertTrue(self.is_current())
+        self.database = "lines:missing"
+        self.assertFalse(self.is_current())
+
+    def test_unavailable_database(self):
+        self.database = "lines:10"
+        self.build(self.cache())
+
+        def unavailable(cfg, item):
+            raise OperationalError("select", {}, Exception("connection refused"))
+
+        cache = BuildCache(self.cfg, database_state=unavailable)
+        self.assertFalse(cache.is_current("lines", Lines, cache.fingerprint("lines", Lines)))
+
+    def test_disabled_cache(self):
+        self.build(self.cache())
+        self.cfg.build_cache.return_value = False
+        self.assertFalse(self.is_current())
+
+    def test_forced_rebuild(self):
+        self.build(self.cache())
+        self.cfg.force_rebuild.return_value = True
+        self.assertFalse(self.is_current())
+        self.build(self.cache())
+        self.cfg.force_rebuild.return_value = False
+        self.assertTrue(self.is_current())
+
+
+if __name__ == "__main__":
+    unittest.main()
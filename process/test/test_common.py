@@ -0,0 +1,329 @@
+"""Tests for common geometry helpers."""
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import LineString, MultiPolygon, Polygon, box
+
+from modules import parallel
+from modules.common import (
+    bufferLinesByClass,
+    cleanupTopology,
+    clipAreasByAreas,
+    connectedComponents,
+    dissolveTiled,
+    joinWithinDistance,
+    makeValid,
+    repairCounts,
+)
+
+
+class TestClipAreasByAreas(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # two adjacent street areas, together 0 <= x <= 20
+        cls.mask = gpd.GeoDataFrame(
+            {"ylre_class": ["a", "b"]},
+            geometry=[box(0, 0, 10, 10), box(10, 0, 20, 10)],
+            crs="EPSG:3879",
+        )
+        cls.areas = gpd.GeoDataFrame(
+            {
+                "cls": ["x", "y", "z", "w"],
+                "ylre_class": ["a", "b", None, "a"],
+            },
+            geometry=[
+                # crosses both street areas and continues outside
+                box(5, 2, 30, 4),
+                # does not touch street areas
+                box(40, 0, 50, 10),
+                # not checked
+                box(15, 5, 35, 8),
+                # one part within street areas, the other part does not touch them
+                MultiPolygon([box(2, 6, 8, 8), box(60, 0, 70, 10)]),
+            ],
+            crs="EPSG:3879",
+        )
+        cls.result = clipAreasByAreas(
+            cls.areas, cls.mask, ["cls"], "ylre_class"
+        ).set_index("cls")
+
+    def test_checked_area_is_clipped(self):
+        self.assertAlmostEqual(self.result.geometry["x"].area, 15 * 2, delta=0.1)
+        self.assertAlmostEqual(self.result.geometry["x"].bounds[2], 20, delta=0.01)
+
+    def test_untouched_area_is_kept(self):
+        self.assertAlmostEqual(self.result.geometry["y"].area, 100, delta=0.1)
+
+    def test_untouched_part_of_clipped_area_is_kept(self):
+        parts = self.result.loc[["w"]]
+        self.assertAlmostEqual(parts.area.sum(), 6 * 2 + 100, delta=0.5)
+        self.assertAlmostEqual(parts.total_bounds[2], 70, delta=0.01)
+
+    def test_unchecked_area_is_kept(self):
+        self.assertAlmostEqual(self.result.geometry["z"].area, 20 * 3, delta=0.1)
+
+    def test_mask_is_not_modified(self):
+        self.assertEqual(len(self.mask), 2)
+        self.assertEqual(self.mask["ylre_class"].tolist(), ["a", "b"])
+
+
+class TestDissolveTiled(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # overlapping boxes crossing tile edges in a 100 m grid
+        rng = np.random.default_rng(1)
+        x = rng.uniform(0, 500, 300)
+        y = rng.uniform(0, 500, 300)
+        cls.areas = gpd.GeoDataFrame(
+            {
+                "cls": rng.choice(["a", "b"], 300),
+                "name": rng.choice(["x", "y", None], 300),
+                "value": np.arange(300),
+            },
+            geometry=shapely.box(x, y, x + rng.uniform(5, 60, 300), y + 8),
+            crs="EPSG:3879",
+        )
+
+    def dissolve(self, areas, by, **kwargs):
+        # run tiled dissolve in this process also for small inputs
+        with mock.patch.object(parallel, "MIN_PARALLEL_FEATURES", 0), mock.patch.object(parallel, "process_map", self.serial_map):
+            return dissolveTiled(areas, by, tileSize=100, workers=2, **kwargs)
+
+    @staticmethod
+    def serial_map(func, *iterables, workers=None):
+        return [func(*task) for task in zip(*iterables)]
+
+    def assertSameDissolve(self, result, expected):
+        self.assertEqual(list(result.columns), list(expected.columns))
+        self.assertEqual(len(result), len(expected))
+        for res, exp in zip(result.geometry, expected.geometry):
+            self.assertAlmostEqual(res.symmetric_difference(exp).area, 0, delta=1e-6)
+        self.assertTrue(result.drop(columns="geometry").equals(expected.drop(columns="geometry")))
+
+    def test_same_as_dissolve(self):
+        result = self.dissolve(self.areas, ["cls"])
+        self.assertSameDissolve(result, self.areas.dissolve(by=["cls"], as_index=False))
+
+    def test_missing_group_values_are_dropped(self):
+        result = self.dissolve(self.areas, ["cls", "name"], aggfunc="sum")
+        expected = self.areas.dissolve(by=["cls", "name"], aggfunc="sum", as_index=False)
+        self.assertSameDissolve(result, expected)
+
+    def test_tiles_are_stitched(self):
+        result = self.dissolve(self.areas, ["cls"]).explode(ignore_index=True)
+        expected = self.areas.dissolve(by=["cls"], as_index=False).explode(ignore_index=True)
+        self.assertEqual(len(result), len(expected))
+
+    def test_lines_use_plain_dissolve(self):
+        lines = gpd.GeoDataFrame(
+            {"cls": ["a", "a"]},
+            geometry=[LineString([(0, 0), (150, 0)]), LineString([(150, 0), (300, 0)])],
+            crs="EPSG:3879",
+        )
+        result = self.dissolve(lines, ["cls"])
+        self.assertTrue(result.geom_equals_exact(lines.dissolve(by=["cls"], as_index=False), 0).all())
+
+    def test_connected_components(self):
+        labels = connectedComponents(6, np.array([4, 1, 2]), np.array([5, 3, 1]))
+        self.assertEqual(labels.tolist(), [0, 1, 1, 1, 4, 4])
+
+
+class TestMakeValid(unittest.TestCase):
+    def setUp(self):
+        bowtie = Polygon([(0, 0), (10, 10), (10, 0), (0, 10)])
+        square = box(20, 0, 30, 10)
+        self.areas = gpd.GeoDataFrame(
+            {"cls": ["a", "a", "a", "b"]},
+            # same square starting from another vertex is a duplicate
+            geometry=[bowtie, square, Polygon([(30, 10), (20, 10), (20, 0), (30, 0)]), square],
+            crs="EPSG:3879",
+        )
+
+    def test_invalid_geometries_are_repaired(self):
+        result = makeValid(self.areas, "test repair")
+        self.assertTrue(result.is_valid.all())
+        self.assertAlmostEqual(result.geometry.iloc[0].area, 50)
+
+    def test_valid_geometries_are_kept(self):
+        result = makeValid(self.areas, "test keep")
+        self.assertIs(result.geometry.iloc[1], self.areas.geometry.iloc[1])
+
+    def test_duplicates_are_dropped(self):
+        result = makeValid(self.areas, "test duplicates")
+        self.assertEqual(result["cls"].tolist(), ["a", "a", "b"])
+
+    def test_repairs_are_counted_per_stage(self):
+        makeValid(self.areas, "test counts")
+        self.assertEqual(repairCounts()["test counts"], 1)
+
+
+class TestCleanupTopology(unittest.TestCase):
+    def setUp(self):
+        # square with a sliver hole, a tiny separate piece and a line
+        square = Polygon(
+            [(0, 0), (10, 0), (10, 10), (0, 10)],
+            [[(5, 5), (5.05, 5), (5.05, 5.001), (5, 5.001)]],
+        )
+        self.areas = gpd.GeoDataFrame(
+            {"cls": ["a", "b", "c"]},
+            geometry=[square.union(box(20, 0, 20.01, 0.01)), box(0.001, 0.001, 3.004, 3.004), LineString([(0, 0), (1, 1)])],
+            crs="EPSG:3879",
+        )
+
+    def test_precision_removes_slivers(self):
+        result = cleanupTopology(self.areas, 0.1, "precision", 0.01)
+        self.assertEqual(result.geom_type[0], "Polygon")
+        self.assertEqual(len(result[0].interiors), 0)
+        self.assertAlmostEqual(result[0].area, 100)
+
+    def test_precision_snaps_to_grid(self):
+        result = cleanupTopology(self.areas, 0.1, "precision", 0.01)
+        self.assertEqual(result[1].bounds, (0, 0, 3, 3))
+        self.assertTrue(result[2].is_empty)
+
+    def test_precision_keeps_small_valid_polygon(self):
+        small = gpd.GeoDataFrame(geometry=[box(0, 0, 0.2, 0.2)], crs="EPSG:3879")
+        result = cleanupTopology(small, 0.1, "precision", 0.01, 0.01)
+        self.assertAlmostEqual(result[0].area, 0.04)
+
+    def test_precision_sliver_area(self):
+        result = cleanupTopology(self.areas, 0.1, "precision", 0.01, 10)
+        self.assertAlmostEqual(result[0].area, 100)
+        self.assertTrue(result[1].is_empty)
+
+    def test_buffer_mode(self):
+        result = cleanupTopology(self.areas, 0.1, "buffer")
+        # the hole is closed, the tiny piece is kept
+        self.assertEqual(result.geom_type[0], "MultiPolygon")
+        self.assertEqual(len(result[0].geoms[0].interiors), 0)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            cleanupTopology(self.areas, 0.1, "snap")
+
+
+class TestBufferLinesByClass(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.lines = gpd.GeoDataFrame(
+            {
+                "type": ["Katu", "Katu", "Katu", "Maantie", "Polku"],
+                "name": ["a", "a", "b", "a", "a"],
+            },
+            geometry=[
+                LineString([(0, 0), (10, 0)]),
+                LineString([(10, 0), (20, 0)]),
+                LineString([(20, 0), (20, 10)]),
+                LineString([(0, 20), (30, 20)]),
+                LineString([(0, 40), (30, 40)]),
+            ],
+            crs="EPSG:3879",
+        )
+        cls.class_values = {"katu": ["Katu"], "maantie": ["Maantie"]}
+        cls.buffers = {"katu": 2, "maantie": 4}
+
+    def buffer(self, strategy):
+        return bufferLinesByClass(self.lines, "type", self.class_values, self.buffers, strategy, groupAttrs=["type", "name"])
+
+    def test_per_feature(self):
+        result = self.buffer("per_feature")
+        self.assertEqual(len(result), 4)
+        self.assertEqual(result.crs, self.lines.crs)
+
+    def test_union_merges_groups(self):
+        result = self.buffer("union").set_index("name")
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result.loc["a"].iloc[0].geometry.geom_type, "Polygon")
+
+    def test_strategies_cover_same_area(self):
+        per_feature = self.buffer("per_feature").dissolve(by=["type", "name"])
+        union = self.buffer("union").dissolve(by=["type", "name"])
+        for a, b in zip(per_feature.geometry, union.geometry):
+            self.assertAlmostEqual(a.symmetric_difference(b).area, 0, delta=1e-6)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            self.buffer("merge")
+
+    def test_distance_by_class(self):
+        result = self.buffer("per_feature")
+        # katu lines first, then maantie like in class order
+        self.assertEqual(result["type"].tolist(), ["Katu", "Katu", "Katu", "Maantie"])
+        self.assertAlmostEqual(result.geometry[0].bounds[1], -2)
+        self.assertAlmostEqual(result.geometry[3].bounds[1], 16)
+
+    def test_lines_without_class_are_reported(self):
+        with self.assertLogs("modules.common", level="WARNING") as logs:
+            self.buffer("per_feature")
+        self.assertIn("Polku (1)", logs.output[0])
+
+    def test_value_in_several_classes(self):
+        class_values = {"katu": ["Katu"], "leveä": ["Katu", "Maantie"]}
+        result = bufferLinesByClass(self.lines, "type", class_values, {"katu": 2, "leveä": 4})
+        self.assertEqual(len(result), 3 + 4)
+
+
+class TestJoinWithinDistance(unittest.TestCase):
+    def setUp(self):
+        # two areas of class a with a 4 m gap, one area of class b
+        self.areas = gpd.GeoDataFrame(
+            {"ylre_class": ["a", "a", "b", None], "kadun_nimi": ["x", "y", "z", "w"]},
+            geometry=[box(0, 0, 10, 10), box(14, 0, 24, 10), box(0, 20, 10, 30), box(100, 0, 110, 10)],
+            crs="EPSG:3879",
+        )
+        self.lines = gpd.GeoDataFrame(
+            {"uuid": ["over gap", "between", "far", "across"]},
+            geometry=[
+                LineString([(2, 5), (22, 5)]),
+                LineString([(5, 12), (5, 18)]),
+                LineString([(104, 20), (106, 20)]),
+                LineString([(2, 5), (2, 35)]),
+            ],
+            index=[10, 11, 12, 13],
+            crs="EPSG:3879",
+        )
+
+    def join(self) -> gpd.GeoDataFrame:
+        return joinWithinDistance(self.lines, self.areas, ["ylre_class"], 10, columns=["kadun_nimi"])
+
+    def test_left_join_in_line_order(self):
+        result = self.join()
+        self.assertEqual(result["uuid"].tolist(), ["over gap", "between", "between", "far", "across"])
+        self.assertEqual(result["ylre_class"].tolist()[:3], ["a", "a", "b"])
+        self.assertEqual(result["kadun_nimi"].tolist()[:3], ["x", "x", "z"])
+        self.assertEqual(list(result.index), list(range(5)))
+
+    def test_line_must_be_within_distance_of_one_group(self):
+        result = self.join().set_index("uuid")
+        # areas without class form no group, line across both groups joins neither
+        self.assertTrue(result.loc[["far", "across"], "ylre_class"].isna().all())
+
+    def test_same_as_join_with_dissolved_buffer(self):
+        dissolved = self.areas.dissolve(by="ylre_class")
+        dissolved["geometry"] = dissolved.buffer(10)
+        joined = gpd.sjoin(self.lines, dissolved, predicate="within")
+        expected = self.lines.merge(joined[["uuid", "ylre_class", "kadun_nimi"]], how="left", on="uuid")
+        result = self.join()
+        self.assertEqual(result.drop(columns="geometry").fillna("").values.tolist(), expected.drop(columns="geometry").fillna("").values.tolist())
+
+    def test_long_edge_is_checked_between_vertices(self):
+        # both ends are within areas of class a, the middle is 40 m away
+        self.areas.loc[3, "ylre_class"] = "a"
+        self.lines = gpd.GeoDataFrame(
+            {"uuid": ["long", "short"]},
+            geometry=[LineString([(5, 5), (105, 5)]), LineString([(5, 5), (20, 5)])],
+            crs="EPSG:3879",
+        )
+        self.assertEqual(self.join()["ylre_class"].fillna("").tolist(), ["", "a"])
+
+    def test_no_lines(self):
+        result = joinWithinDistance(self.lines.iloc[:0], self.areas, ["ylre_class"], 10)
+        self.assertEqual(len(result), 0)
+        self.assertIn("ylre_class", result.columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+"""Tests for vectorized GTFS helpers."""
+import unittest
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString, box
+
+from modules.gtfs import (
+    BINS_PER_DAY,
+    ServiceCalendar,
+    departure_bins,
+    departure_seconds,
+    peak_window_counts,
+    shape_ids_in_area,
+    shape_lines,
+    shared_segments,
+    sum_by_segment,
+)
+
+
+class TestDepartureSeconds(unittest.TestCase):
+    def test_same_day(self):
+        seconds = departure_seconds(pd.Series(["00:00:00", "07:15:30", "23:59:59"]))
+        self.assertEqual(seconds.tolist(), [0, 26130, 86399])
+
+    def test_hours_past_midnight(self):
+        seconds = departure_seconds(pd.Series(["24:00:00", "26:00:01"]))
+        self.assertEqual(seconds.tolist(), [86400, 93601])
+
+    def test_single_digit_hour(self):
+        seconds = departure_seconds(pd.Series([" 6:05:00"]))
+        self.assertEqual(seconds.tolist(), [21900])
+
+    def test_missing_value(self):
+        seconds = departure_seconds(pd.Series(["08:00:00", None]))
+        self.assertEqual(seconds.tolist(), [28800, -1])
+
+    def test_malformed_value_among_valid(self):
+        seconds = departure_seconds(pd.Series(["08:00:00", "1:2:3:4", "8:00", "07:15:30"]))
+        self.assertEqual(seconds.tolist(), [28800, -1, -1, 26130])
+
+    def test_empty(self):
+        self.assertEqual(departure_seconds(pd.Series([], dtype=object)).tolist(), [])
+
+
+class TestPeakHour(unittest.TestCase):
+    def test_departure_bins(self):
+        groups = np.array([0, 0, 1, 1])
+        seconds = np.array([0, 899, 900, -1])
+        bins = departure_bins(groups, 2, seconds)
+        self.assertEqual(bins.shape, (2, BINS_PER_DAY))
+        self.assertEqual(bins[0, 0], 2)
+        self.assertEqual(bins[1, 1], 1)
+        self.assertEqual(bins.sum(), 3)
+
+    def test_peak_window(self):
+        bins = np.zeros((1, BINS_PER_DAY), dtype="int64")
+        bins[0, [10, 11, 13, 14]] = 1
+        self.assertEqual(peak_window_counts(bins).tolist(), [3])
+        self.assertEqual(peak_window_counts(bins, window_starts=[13]).tolist(), [2])
+
+    def test_peak_window_wraps_midnight(self):
+        bins = np.zeros((1, BINS_PER_DAY), dtype="int64")
+        bins[0, [0, BINS_PER_DAY - 1]] = 1
+        self.assertEqual(peak_window_counts(bins).tolist(), [2])
+
+
+class TestServiceCalendar(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # 2022-10-03 is a monday
+        calendar = pd.DataFrame(
+            {
+                "service_id": ["weekdays", "weekend"],
+                "monday": [1, 0],
+                "tuesday": [1, 0],
+                "wednesday": [1, 0],
+                "thursday": [1, 0],
+                "friday": [1, 0],
+                "saturday": [0, 1],
+                "sunday": [0, 1],
+                "start_date": ["20221003", "20221003"],
+                "end_date": ["20221016", "20221009"],
+            }
+        )
+        calendar_dates = pd.DataFrame(
+            {
+                "service_id": ["weekdays", "weekend", "extra"],
+                "date": ["20221006", "20221006", "20221020"],
+                "exception_type": [2, 1, 1],
+            }
+        )
+        cls.calendar = ServiceCalendar(calendar, calendar_dates)
+
+    def test_weekday_flags(self):
+        self.assertEqual(self.calendar.service_ids(["20221004"]), ["weekdays"])
+        self.assertEqual(self.calendar.service_ids(["20221008"]), ["weekend"])
+
+    def test_calendar_dates_exceptions(self):
+        self.assertEqual(self.calendar.service_ids(["20221006"]), ["weekend"])
+        self.assertEqual(self.calendar.service_ids(["20221020"]), ["extra"])
+
+    def test_validity_range(self):
+        self.assertEqual(self.calendar.service_ids(["20221015"]), [])
+        self.assertEqual(self.calendar.service_ids(["20221001"]), [])
+
+    def test_week(self):
+        week = [f"202210{d:02d}" for d in range(10, 17)]
+        self.assertEqual(self.calendar.service_ids(week), ["weekdays"])
+        self.assertEqual(self.calendar.active(week).shape, (3, 7))
+
+
+class TestShapeLines(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        shapes = pd.DataFrame(
+            {
+                "shape_id": ["b", "a", "a", "b", "a", "c"],
+                "shape_pt_lat": [60.2, 60.1, 60.1, 60.2, 60.1, 60.3],
+                "shape_pt_lon": [24.9, 24.8, 24.9, 25.0, 25.0, 24.9],
+                "shape_pt_sequence": [1, 3, 2, 2, 1, 1],
+            }
+        )
+        cls.shapes = shapes
+        cls.lines = shape_lines(shapes, "EPSG:3879")
+
+    def test_lines_are_indexed_by_shape_id(self):
+        self.assertEqual(self.lines.index.tolist(), ["a", "b"])
+        self.assertEqual(self.lines.index.name, "shape_id")
+
+    def test_points_are_ordered_by_sequence(self):
+        line = self.lines.to_crs("EPSG:4326").geometry["a"]
+        lons = [round(x, 6) for x, _ in line.coords]
+        self.assertEqual(lons, [25.0, 24.9, 24.8])
+
+    def test_crs(self):
+        self.assertEqual(self.lines.crs, "EPSG:3879")
+
+    def test_shape_id_selection(self):
+        lines = shape_lines(self.shapes, "EPSG:3879", ["b"])
+        self.assertEqual(lines.index.tolist(), ["b"])
+
+    def test_shape_ids_in_area(self):
+        area = box(24.85, 60.05, 24.95, 60.25)
+        self.assertEqual(shape_ids_in_area(self.shapes, area).tolist(), ["b", "a"])
+        self.assertEqual(
+            shape_ids_in_area(self.shapes, area, ["a", "c"]).tolist(), ["a"]
+        )
+        self.assertEqual(len(shape_ids_in_area(self.shapes, box(0, 0, 1, 1))), 0)
+
+
+class TestSharedSegments(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # a and b overlap between x=5 and x=10, c crosses both at x=5
+        cls.lines = np.array(
+            [
+                LineString([(0, 0), (10, 0)]),
+                LineString([(5, 0), (15, 0)]),
+                LineString([(5, -5), (5, 5)]),
+            ]
+        )
+        cls.segments, cls.segment_index, cls.line_index = shared_segments(
+            cls.lines, 0.1, 0.5
+        )
+
+    def _segment_lines(self) -> dict:
+        """Return covering lines of segments keyed by segment end points."""
+        result = {}
+        for segment, line in zip(self.segment_index, self.line_index):
+            coords = self.segments[segment].coords
+            key = tuple(sorted([coords[0], coords[-1]]))
+            result.setdefault(key, set()).add(int(line))
+        return result
+
+    def test_lines_are_noded(self):
+        self.assertEqual(len(self.segments), 5)
+
+    def test_overlap_is_shared(self):
+        segment_lines = self._segment_lines()
+        self.assertEqual(segment_lines[((0, 0), (5, 0))], {0})
+        self.assertEqual(segment_lines[((5, 0), (10, 0))], {0, 1})
+        self.assertEqual(segment_lines[((10, 0), (15, 0))], {1})
+        self.assertEqual(segment_lines[((5, -5), (5, 0))], {2})
+
+    def test_sum_by_segment(self):
+        values = np.array([[1, 0], [0, 2], [4, 4]])
+        sums = sum_by_segment(
+            values, self.segment_index, self.line_index, len(self.segments)
+        )
+        overlap = [
+            i
+            for i, segment in enumerate(self.segments)
+            if sorted([segment.coords[0], segment.coords[-1]]) == [(5, 0), (10, 0)]
+        ]
+        self.assertEqual(sums[overlap[0]].tolist(), [1, 2])
+        # every line is split into two segments
+        self.assertEqual(sums.sum(axis=0).tolist(), [2 * 5, 2 * 6])
+
+    def test_sum_without_segments(self):
+        empty = np.array([], dtype=int)
+        sums = sum_by_segment(np.ones((2, 3)), empty, empty, 2)
+        self.assertEqual(sums.tolist(), [[0, 0, 0], [0, 0, 0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests for GTFS feed reading and table cache."""
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from modules.gtfs_feed import CACHE_DIRECTORY, read_feed
+
+FEED_FILES = {
+    "agency.txt": "agency_id,agency_name,agency_url,agency_timezone\n"
+    "HSL,HSL,https://www.hsl.fi,Europe/Helsinki\n",
+    "routes.txt": "route_id,agency_id,route_short_name,route_long_name,route_type,route_desc\n"
+    "1001,HSL,1,Line,3,Unused\n",
+    "calendar.txt": "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n"
+    "wk,1,1,1,1,1,0,0,20221003,20221030\n",
+    "trips.txt": "route_id,service_id,trip_id,direction_id,shape_id,wheelchair_accessible\n"
+    "1001,wk,t1,0,s1,1\n",
+    "stop_times.txt": "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+    "t1,07:00:00,07:00:00,a,1\n"
+    "t1,07:05:00,07:05:00,b,2\n",
+    "shapes.txt": "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n"
+    "s1,60.17,24.94,1\n"
+    "s1,60.18,24.95,2\n",
+}
+
+
+class TestFeedCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.feed_file = Path(self._tmp_dir.name) / "hsl.zip"
+        with zipfile.ZipFile(self.feed_file, "w") as archive:
+            for name, contents in FEED_FILES.items():
+                archive.writestr(name, contents)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_cached_feed_equals_parsed_feed(self):
+        parsed = read_feed(str(self.feed_file))
+        cached = read_feed(str(self.feed_file))
+
+        self.assertTrue((self.feed_file.parent / CACHE_DIRECTORY).is_dir())
+        for table in ["routes", "trips", "stop_times", "calendar", "shapes"]:
+            self.assertTrue(getattr(parsed, table).equals(getattr(cached, table)))
+
+    def test_unused_columns_are_dropped(self):
+        feed = read_feed(str(self.feed_file))
+        self.assertNotIn("route_desc", feed.routes.columns)
+        self.assertNotIn("arrival_time", feed.stop_times.columns)
+
+    def test_arrow_loader_keeps_first_stops(self):
+        feed = read_feed(str(self.feed_file), loader="arrow")
+        self.assertEqual(feed.stop_times["departure_time"].tolist(), ["07:00:00"])
+        self.assertEqual(feed.shapes["shape_pt_sequence"].tolist(), [1, 2])
+        self.assertNotIn("wheelchair_accessible", feed.trips.columns)
+
+    def test_arrow_loader_equals_gtfs_kit_loader(self):
+        parsed = read_feed(str(self.feed_file))
+        arrow = read_feed(str(self.feed_file), loader="arrow")
+        for table in ["routes", "trips", "calendar", "shapes"]:
+            self.assertEqual(
+                getattr(parsed, table).astype(str).values.tolist(),
+                getattr(arrow, table).astype(str).values.tolist(),
+            )
+
+    def test_optional_columns(self):
+        for loader in ["gtfs_kit", "arrow"]:
+            feed = read_feed(str(self.feed_file), loader=loader)
+            self.assertNotIn("shape_dist_traveled", feed.shapes.columns)
+
+        shapes = (
+            "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence,shape_dist_traveled\n"
+            "s1,60.17,24.94,1,0.0\n"
+            "s1,60.18,24.95,2,1.2\n"
+        )
+        with zipfile.ZipFile(self.feed_file, "w") as archive:
+            for name, contents in {**FEED_FILES, "shapes.txt": shapes}.items():
+                archive.writestr(name, contents)
+        for loader in ["gtfs_kit", "arrow"]:
+            feed = read_feed(str(self.feed_file), loader=loader)
+            self.assertEqual(feed.shapes["shape_dist_traveled"].tolist(), [0.0, 1.2])
+
+    def test_unknown_loader(self):
+        with self.assertRaises(ValueError):
+            read_feed(str(self.feed_file), loader="csv")
+
+    def test_without_cache(self):
+        feed = read_feed(str(self.feed_file), use_cache=False)
+        self.assertIn("route_desc", feed.routes.columns)
+        self.assertFalse((self.feed_file.parent / CACHE_DIRECTORY).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
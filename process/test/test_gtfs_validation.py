@@ -0,0 +1,147 @@
+"""Tests for GTFS feed validation."""
+import unittest
+
+import gtfs_kit as gk
+import pandas as pd
+
+from modules.gtfs_validation import REPORT_COLUMNS, validate_feed
+
+
+def _tables() -> dict:
+    return {
+        "routes": pd.DataFrame({"route_id": ["r1"], "route_type": [3]}),
+        "trips": pd.DataFrame(
+            {
+                "route_id": ["r1", "r1"],
+                "service_id": ["wk", "wk"],
+                "trip_id": ["t1", "t2"],
+                "shape_id": ["s1", "s1"],
+            }
+        ),
+        "stop_times": pd.DataFrame(
+            {
+                "trip_id": ["t1", "t1", "t2"],
+                "departure_time": ["07:00:00", "07:05:00", "25:10:00"],
+                "stop_sequence": [1, 2, 1],
+            }
+        ),
+        "calendar": pd.DataFrame(
+            {
+                "service_id": ["wk"],
+                "monday": [1],
+                "tuesday": [1],
+                "wednesday": [1],
+                "thursday": [1],
+                "friday": [1],
+                "saturday": [0],
+                "sunday": [0],
+                "start_date": ["20221003"],
+                "end_date": ["20221030"],
+            }
+        ),
+        "shapes": pd.DataFrame(
+            {
+                "shape_id": ["s1", "s1"],
+                "shape_pt_lat": [60.17, 60.18],
+                "shape_pt_lon": [24.94, 24.95],
+                "shape_pt_sequence": [1, 2],
+                "shape_dist_traveled": [0.0, 1.2],
+            }
+        ),
+    }
+
+
+def _messages(tables: dict) -> dict:
+    report = validate_feed(gk.Feed(dist_units="km", **tables))
+    return {
+        (row.table, row.message): (row.type, row.rows) for row in report.itertuples()
+    }
+
+
+class TestValidateFeed(unittest.TestCase):
+    def test_valid_feed(self):
+        report = validate_feed(gk.Feed(dist_units="km", **_tables()))
+        self.assertTrue(report.empty)
+        self.assertEqual(report.columns.tolist(), REPORT_COLUMNS)
+
+    def test_missing_table(self):
+        tables = _tables()
+        del tables["shapes"]
+        self.assertEqual(_messages(tables)[("shapes", "Missing table")], ("error", []))
+
+    def test_missing_column(self):
+        tables = _tables()
+        tables["trips"] = tables["trips"].drop(columns=["shape_id"])
+        self.assertIn(("trips", "Missing columns shape_id"), _messages(tables))
+
+    def test_missing_values(self):
+        tables = _tables()
+        tables["trips"].loc[1, "service_id"] = None
+        messages = _messages(tables)
+        self.assertEqual(
+            messages[("trips", "Missing values in required columns")], ("error", [1])
+        )
+
+    def test_optional_values(self):
+        tables = _tables()
+        tables["trips"].loc[1, "shape_id"] = None
+        tables["stop_times"].loc[1, "departure_time"] = None
+        report = validate_feed(gk.Feed(dist_units="km", **tables))
+        self.assertTrue(report.empty)
+
+    def test_undefined_references(self):
+        tables = _tables()
+        tables["trips"].loc[1, ["route_id", "service_id", "shape_id"]] = "x"
+        messages = _messages(tables)
+        for column in ["route_id", "service_id", "shape_id"]:
+            message = "Undefined {}".format(column)
+            self.assertEqual(messages[("trips", message)], ("error", [1]))
+
+    def test_invalid_departure_time(self):
+        tables = _tables()
+        tables["stop_times"].loc[1, "departure_time"] = "7.05"
+        messages = _messages(tables)
+        self.assertEqual(
+            messages[("stop_times", "Invalid departure_time")], ("error", [1])
+        )
+
+    def test_missing_first_departure(self):
+        tables = _tables()
+        tables["stop_times"].loc[0, "departure_time"] = None
+        messages = _messages(tables)
+        self.assertEqual(
+            messages[("stop_times", "Missing departure_time at first stop of trip")],
+            ("error", [0]),
+        )
+
+    def test_repeated_shape_sequence(self):
+        tables = _tables()
+        tables["shapes"].loc[1, "shape_pt_sequence"] = 1
+        messages = _messages(tables)
+        self.assertEqual(
+            messages[("shapes", "Repeated shape_id, shape_pt_sequence")],
+            ("error", [0, 1]),
+        )
+
+    def test_decreasing_shape_distance(self):
+        tables = _tables()
+        tables["shapes"]["shape_dist_traveled"] = [1.2, 0.0]
+        messages = _messages(tables)
+        self.assertEqual(
+            messages[("shapes", "Decreasing shape_dist_traveled")], ("error", [1])
+        )
+
+    def test_calendar_dates(self):
+        tables = _tables()
+        tables["calendar"].loc[0, "end_date"] = "20220930"
+        tables["calendar_dates"] = pd.DataFrame(
+            {"service_id": ["wk"], "date": ["2022-10-10"], "exception_type": [3]}
+        )
+        messages = _messages(tables)
+        self.assertIn(("calendar", "start_date is after end_date"), messages)
+        self.assertIn(("calendar_dates", "Invalid date"), messages)
+        self.assertIn(("calendar_dates", "Invalid exception_type"), messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
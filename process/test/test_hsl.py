@@ -1,10 +1,13 @@
-from datetime import datetime, time
+from datetime import time
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import unittest
 
 from test.compare_utils import TormaysCheckerMixin
 from modules.config import Config
+from modules.gtfs import BINS_PER_DAY
+from modules.gtfs_validation import validate_feed
 from modules.hsl import HslBuses
 
 
@@ -54,6 +57,15 @@ class TestHslGtfs(unittest.TestCase):
             sum(report.type == "error"), 0, "There should be no errors in GTFS file"
         )
 
+    def test_used_tables_are_valid(self):
+        cfg = Config()
+        hsl = HslBuses(cfg, validate_gtfs=False)
+        report = validate_feed(hsl.feed())
+
+        self.assertEqual(
+            sum(report.type == "error"), 0, "There should be no errors in GTFS file"
+        )
+
 
 class TestHslInternals(unittest.TestCase):
     """Test processing class methods and feed contents."""
@@ -64,28 +76,6 @@ class TestHslInternals(unittest.TestCase):
         cls.hsl = HslBuses(cfg, validate_gtfs=False)
         cls.feed = cls.hsl.feed()
 
-    def test_overlaps(self):
-        a = "20221001"
-        b = "20221002"
-
-        c = "20221002"
-        d = "20221003"
-        e = "20221004"
-
-        self.assertTrue(self.hsl._overlaps(a, b, c, d))
-
-        self.assertFalse(self.hsl._overlaps(a, b, d, e))
-
-        self.assertTrue(self.hsl._overlaps(c, d, a, b))
-
-        self.assertFalse(self.hsl._overlaps(d, e, a, b))
-
-        self.assertTrue(self.hsl._overlaps(a, e, b, c))
-
-        self.assertTrue(self.hsl._overlaps(b, c, a, e))
-
-        self.assertTrue(self.hsl._overlaps(a, a, a, a))
-
     def test_feed_contains_agency(self):
         self.assertTrue(isinstance(self.feed.agency, pd.DataFrame))
 
@@ -181,29 +171,18 @@ class TestHslInternals(unittest.TestCase):
         end_times = {times[2] for times in self.hsl._rush_hours()}
         self.assertEqual(end_times, set(morning_end_times + evening_end_times))
 
-    def test_hour_parse_same_day(self):
-        parsed_time = self.hsl._parse_time("23:59:59")
-
-        self.assertEqual(
-            parsed_time.get("time"), datetime.strptime("23:59:59", "%H:%M:%S").time()
-        )
-        self.assertEqual(parsed_time.get("next_day"), False)
-
-    def test_hour_parse_next_day(self):
-        parsed_time = self.hsl._parse_time("26:00:01")
-
-        self.assertEqual(
-            parsed_time.get("time"), datetime.strptime("02:00:01", "%H:%M:%S").time()
-        )
-        self.assertEqual(parsed_time.get("next_day"), True)
-
-    def test_hour_parse_midnight(self):
-        parsed_time = self.hsl._parse_time("24:00:00")
-
-        self.assertEqual(
-            parsed_time.get("time"), datetime.strptime("00:00:00", "%H:%M:%S").time()
-        )
-        self.assertEqual(parsed_time.get("next_day"), True)
+    def test_peak_hour_over_days(self):
+        bins = np.zeros((1, 3, BINS_PER_DAY), dtype="int64")
+        # departures at 7.00 - 7.15 on three days
+        bins[0, :, 28] = [2, 5, 3]
+        percentile = self.hsl._rush_hour_percentile
+        try:
+            self.hsl._rush_hour_percentile = None
+            self.assertEqual(self.hsl._peak_hour(bins).tolist(), [5])
+            self.hsl._rush_hour_percentile = 50
+            self.assertEqual(self.hsl._peak_hour(bins).tolist(), [3])
+        finally:
+            self.hsl._rush_hour_percentile = percentile
 
     def test_trunk_route_assign(self):
         df = gpd.GeoDataFrame([700, 701, 702, 703], columns=["route_type"])
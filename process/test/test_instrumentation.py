@@ -0,0 +1,72 @@
+"""Tests for stage timing and memory instrumentation."""
+import json
+import os
+import tempfile
+import unittest
+
+import geopandas as gpd
+from shapely.geometry import box
+
+from modules import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.take()
+        self.addCleanup(instrumentation.take)
+
+    def test_stage_is_recorded(self):
+        areas = gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1), box(2, 0, 3, 1)])
+        with instrumentation.stage("hsl", "buffer") as stage:
+            stage.count(areas)
+        record = instrumentation.report("process")["stages"][0]
+        self.assertEqual((record["item"], record["stage"], record["status"]), ("hsl", "buffer", "ok"))
+        self.assertEqual((record["rows"], record["vertices"]), (2, 10))
+        self.assertGreaterEqual(record["wall_seconds"], 0)
+        self.assertGreater(record["peak_rss_bytes"], 0)
+
+    def test_failed_stage_is_recorded(self):
+        with self.assertRaises(RuntimeError):
+            with instrumentation.stage("hsl", "process"):
+                raise RuntimeError("failed")
+        self.assertEqual(instrumentation.report("process")["stages"][0]["status"], "failed")
+
+    def test_records_of_item_are_taken(self):
+        with instrumentation.stage("hsl", "read"):
+            pass
+        with instrumentation.stage("tram_lines", "read"):
+            pass
+        instrumentation.count("hsl", "repaired_geometries", {"clip input": 3})
+        taken = instrumentation.take("hsl")
+        self.assertEqual([r["item"] for r in taken["stages"]], ["hsl"])
+        self.assertEqual(len(taken["counters"]), 1)
+        self.assertEqual([r["item"] for r in instrumentation.report("process")["stages"]], ["tram_lines"])
+
+        instrumentation.merge(taken)
+        self.assertEqual(len(instrumentation.report("process")["stages"]), 2)
+
+    def test_prometheus_text(self):
+        for _ in range(2):
+            with instrumentation.stage("liikennevaylat", "clip") as stage:
+                stage.count(gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1)]))
+        instrumentation.count("liikennevaylat", "repaired_geometries", {"clip input": 3})
+        text = instrumentation.prometheus_text("process")
+        self.assertIn('haitaton_gis_stage_rows{run="process",item="liikennevaylat",stage="clip",status="ok"} 2\n', text)
+        self.assertIn('haitaton_gis_repaired_geometries{run="process",item="liikennevaylat",stage="clip input"} 3\n', text)
+        self.assertIn("# TYPE haitaton_gis_stage_wall_seconds gauge\n", text)
+
+    def test_write_report(self):
+        with instrumentation.stage("hsl", "read"):
+            pass
+        with tempfile.TemporaryDirectory() as directory:
+            report_file = os.path.join(directory, "report.json")
+            metrics_file = os.path.join(directory, "metrics.prom")
+            instrumentation.write_report("process", report_file, metrics_file)
+            with open(report_file) as stream:
+                self.assertEqual(json.load(stream)["stages"][0]["item"], "hsl")
+            self.assertTrue(os.path.exists(metrics_file))
+            self.assertEqual(sorted(os.listdir(directory)), ["metrics.prom", "report.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
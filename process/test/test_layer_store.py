@@ -0,0 +1,73 @@
+"""Tests for reference layers shared by processors."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+from shapely.geometry import box
+
+from modules.config import Config
+from modules.layer_store import LayerStore
+
+LAYER = ("ylre_katualueet", "target_buffer_file")
+
+
+class TestLayerStore(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.source = os.path.join(self._tmp.name, "katualueet.geojson")
+        gpd.GeoDataFrame(
+            {"ylre_class": ["a", "b"]},
+            geometry=[box(0, 0, 10, 10), box(20, 0, 30, 10)],
+            crs="EPSG:3879",
+        ).to_file(self.source, driver="GeoJSON")
+        self.cfg = mock.Mock(spec=Config)
+        self.cfg.target_buffer_file.return_value = self.source
+        self.cfg.crs.return_value = "EPSG:3879"
+        self.cfg.output_directory.return_value = self._tmp.name
+        self.cfg.reference_mask_cache.return_value = True
+
+    def test_layer_is_read_once(self):
+        store = LayerStore(self.cfg)
+        with mock.patch("geopandas.read_file", wraps=gpd.read_file) as read_file:
+            first = store.get(*LAYER)
+            second = store.get(*LAYER)
+        read_file.assert_called_once_with(self.source)
+        self.assertIs(first, second)
+        self.assertTrue(first.has_sindex)
+
+    def test_layer_is_reprojected(self):
+        self.cfg.crs.return_value = "EPSG:4326"
+        layer = LayerStore(self.cfg).get(*LAYER)
+        self.assertEqual(layer.crs, "EPSG:4326")
+
+    def test_layer_is_evicted_after_last_user(self):
+        store = LayerStore(self.cfg)
+        store.expect([LAYER])
+        store.expect([LAYER])
+        store.get(*LAYER)
+        store.release([LAYER])
+        self.assertEqual(store.loaded(), [LAYER])
+        store.release([LAYER])
+        self.assertEqual(store.loaded(), [])
+
+    def test_masks_are_shared_until_layer_is_evicted(self):
+        store = LayerStore(self.cfg)
+        store.expect([LAYER])
+        masks = store.masks()
+        self.assertIs(store.masks(), masks)
+        masks.parts(self.source, data=store.get(*LAYER))
+        with mock.patch.object(masks, "_compute") as compute:
+            masks.parts(self.source)
+        compute.assert_not_called()
+
+        store.release([LAYER])
+        with mock.patch("geopandas.read_parquet", wraps=gpd.read_parquet) as read_parquet:
+            masks.parts(self.source)
+        read_parquet.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
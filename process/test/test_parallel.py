@@ -0,0 +1,68 @@
+"""Tests for parallel execution of geometry stages."""
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from modules import parallel
+
+
+class TestGeometryMap(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(1)
+        x = rng.uniform(0, 1000, 3000)
+        y = rng.uniform(0, 1000, 3000)
+        cls.lines = gpd.GeoSeries(
+            shapely.linestrings(np.stack([np.c_[x, y], np.c_[x + 50, y + 20]], axis=1)),
+            index=np.arange(3000) * 2,
+            crs="EPSG:3879",
+        )
+
+    def test_same_as_single_call(self):
+        geometries = np.asarray(self.lines.values)
+        distances = np.linspace(1, 10, len(geometries))
+        result = parallel.geometry_map(shapely.buffer, geometries, distances, threads=4)
+        self.assertTrue(shapely.equals_exact(result, shapely.buffer(geometries, distances), 0).all())
+
+    def test_small_input_is_not_split(self):
+        with mock.patch.object(parallel, "ThreadPoolExecutor") as executor:
+            parallel.geometry_map(shapely.normalize, np.asarray(self.lines.values[:10]), threads=4)
+        executor.assert_not_called()
+
+    def test_buffer_matches_geopandas(self):
+        with mock.patch.dict(parallel._settings, {"threads": 4}):
+            result = parallel.buffer(gpd.GeoDataFrame(geometry=self.lines), 5)
+        expected = self.lines.buffer(5)
+        self.assertTrue(result.index.equals(expected.index))
+        self.assertEqual(result.crs, expected.crs)
+        self.assertTrue(result.geom_equals_exact(expected, 0).all())
+
+
+class TestConfigure(unittest.TestCase):
+    def setUp(self):
+        settings = dict(parallel._settings)
+        self.addCleanup(parallel._settings.update, settings)
+        self.cfg = mock.Mock()
+        self.cfg.parallel_workers.return_value = 0
+        self.cfg.geometry_threads.return_value = 8
+        self.cfg.dissolve_tile_size.return_value = 1000
+
+    def test_all_cores(self):
+        with mock.patch("os.cpu_count", return_value=16):
+            parallel.configure(self.cfg)
+        self.assertEqual((parallel.worker_count(), parallel.thread_count()), (16, 8))
+
+    def test_budget_is_split_between_processes(self):
+        with mock.patch("os.cpu_count", return_value=16):
+            parallel.configure(self.cfg, 4)
+        self.assertEqual((parallel.worker_count(), parallel.thread_count()), (4, 2))
+        with mock.patch("os.cpu_count", return_value=16):
+            parallel.configure(self.cfg, 11)
+        self.assertEqual((parallel.worker_count(), parallel.thread_count()), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Tests for cache of dissolved reference masks."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+from shapely.geometry import box
+
+from modules.config import Config
+from modules.reference_masks import ReferenceMaskCache
+
+
+class TestReferenceMaskCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.source = os.path.join(self._tmp.name, "katualueet.geojson")
+        self.cache_dir = os.path.join(self._tmp.name, "cache")
+        # two areas of class a with a 4 m gap, one area of class b
+        self.write_source(
+            gpd.GeoDataFrame(
+                {"ylre_class": ["a", "a", "b"], "kadun_nimi": ["x", "y", "z"]},
+                geometry=[box(0, 0, 10, 10), box(14, 0, 24, 10), box(0, 20, 10, 30)],
+                crs="EPSG:3879",
+            )
+        )
+
+    def write_source(self, areas: gpd.GeoDataFrame):
+        areas.to_file(self.source, driver="GeoJSON")
+
+    def cache(self) -> ReferenceMaskCache:
+        return ReferenceMaskCache(Config(), self.cache_dir)
+
+    def cached_files(self) -> list[str]:
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_dissolved_by_attrs(self):
+        mask = self.cache().dissolved(self.source, ["ylre_class"])
+        self.assertEqual(list(mask.index), ["a", "b"])
+        self.assertIn("kadun_nimi", mask.columns)
+        self.assertAlmostEqual(mask.geometry["a"].area, 200)
+
+    def test_buffers_are_applied_in_order(self):
+        mask = self.cache().dissolved(self.source, ["ylre_class"], (10, -10))
+        # the gap between areas of class a is closed
+        self.assertEqual(mask.geometry["a"].geom_type, "Polygon")
+        self.assertAlmostEqual(mask.geometry["a"].area, 240, delta=2)
+
+    def test_parts_are_single_polygons(self):
+        parts = self.cache().parts(self.source, ["ylre_class"])
+        self.assertEqual(len(parts), 3)
+        self.assertTrue((parts.geom_type == "Polygon").all())
+
+    def test_plain_parts_are_persisted(self):
+        expected = self.cache().parts(self.source)
+        self.assertEqual(len(self.cached_files()), 1)
+
+        with mock.patch("geopandas.read_file") as read_file:
+            parts = self.cache().parts(self.source)
+        read_file.assert_not_called()
+        self.assertEqual(len(parts), 3)
+        self.assertTrue(parts.geom_equals(expected).all())
+
+    def test_evicted_mask_is_read_again(self):
+        cache = self.cache()
+        cache.parts(self.source)
+        cache.evict(self.source)
+        with mock.patch("geopandas.read_parquet", wraps=gpd.read_parquet) as read_parquet:
+            cache.parts(self.source)
+        read_parquet.assert_called_once()
+
+    def test_mask_is_read_from_cache(self):
+        expected = self.cache().dissolved(self.source, ["ylre_class"], (15,))
+        self.assertEqual(len(self.cached_files()), 1)
+
+        with mock.patch("geopandas.read_file") as read_file:
+            mask = self.cache().dissolved(self.source, ["ylre_class"], (15,))
+        read_file.assert_not_called()
+        self.assertTrue(mask.geom_equals(expected).all())
+
+    def test_changed_source_replaces_cached_mask(self):
+        self.cache().dissolved(self.source, ["ylre_class"])
+        before = self.cached_files()
+
+        self.write_source(
+            gpd.GeoDataFrame(
+                {"ylre_class": ["a"], "kadun_nimi": ["x"]},
+                geometry=[box(0, 0, 5, 5)],
+                crs="EPSG:3879",
+            )
+        )
+        mask = self.cache().dissolved(self.source, ["ylre_class"])
+
+        self.assertAlmostEqual(mask.geometry["a"].area, 25)
+        self.assertEqual(len(self.cached_files()), 1)
+        self.assertNotEqual(self.cached_files(), before)
+
+    def test_returned_mask_is_a_copy(self):
+        cache = self.cache()
+        mask = cache.dissolved(self.source, ["ylre_class"])
+        mask["geometry"] = mask.buffer(100)
+        self.assertAlmostEqual(cache.dissolved(self.source, ["ylre_class"]).geometry["a"].area, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
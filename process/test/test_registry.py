@@ -0,0 +1,49 @@
+"""Tests for registry of processors."""
+import importlib.util
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+from modules import registry
+
+
+class TestRegistry(unittest.TestCase):
+    def test_registered_classes_exist(self):
+        for item in registry.items():
+            module_name, class_name = registry._processors[item]
+            source = Path(importlib.util.find_spec(module_name).origin).read_text()
+            self.assertIn("class {}".format(class_name), source, item)
+
+    def test_unknown_item(self):
+        self.assertFalse(registry.is_registered("unknown"))
+        with self.assertRaises(KeyError):
+            registry.processor_class("unknown")
+
+    def test_only_requested_processor_is_imported(self):
+        script = (
+            "import sys, process_data\n"
+            "from modules import registry\n"
+            "registry.processor_class('ylre_katualueet')\n"
+            "print(sorted(m for m in sys.modules if m in ('modules.hsl', 'gtfs_kit', 'modules.ylre_katualueet')))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent.parent,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "['modules.ylre_katualueet']")
+
+    def test_validate_deploy_copies_are_identical(self):
+        modules = Path(__file__).parent.parent / "modules"
+        validate_deploy = modules.parent.parent / "validate-deploy" / "modules"
+        for name in ["registry.py", "instrumentation.py"]:
+            self.assertEqual(
+                (modules / name).read_text(), (validate_deploy / name).read_text(), name
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests for dependency aware scheduling of processing items."""
+import os
+import tempfile
+import unittest
+
+from modules import scheduler
+
+
+class Areas:
+    outputs = [("areas", "target_buffer_file")]
+
+
+class Lines:
+    inputs = [("areas", "target_buffer_file")]
+    outputs = [("lines", "target_file"), ("lines", "target_buffer_file")]
+
+
+class Routes:
+    inputs = [("areas", "target_buffer_file"), ("lines", "target_file")]
+    outputs = [("routes", "target_buffer_file")]
+
+
+class Volumes:
+    outputs = [("volumes", "target_buffer_file")]
+
+
+PROCESSORS = {"areas": Areas, "lines": Lines, "routes": Routes, "volumes": Volumes}
+
+
+def record(item: str, log_file: str, fail: tuple = ()):
+    """Append item to log file, fail for items in fail."""
+    if item in fail:
+        raise RuntimeError(item)
+    with open(log_file, "a") as log:
+        log.write(item + "\n")
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.log_file = os.path.join(self._tmp.name, "log")
+
+    def processed(self) -> list[str]:
+        if not os.path.exists(self.log_file):
+            return []
+        with open(self.log_file) as log:
+            return log.read().split()
+
+    def test_dependencies_of_requested_items(self):
+        depends_on = scheduler.dependencies(["routes", "lines", "volumes"], PROCESSORS)
+        # areas is not requested, its file is expected to exist
+        self.assertEqual(depends_on, {"routes": {"lines"}, "lines": set(), "volumes": set()})
+
+    def test_dependencies_run_first(self):
+        items = ["routes", "volumes", "lines", "areas", "lines"]
+        failed = scheduler.run(record, items, scheduler.dependencies(items, PROCESSORS), self.log_file)
+        self.assertEqual(failed, [])
+        processed = self.processed()
+        self.assertEqual(sorted(processed), ["areas", "lines", "routes", "volumes"])
+        self.assertLess(processed.index("areas"), processed.index("lines"))
+        self.assertLess(processed.index("lines"), processed.index("routes"))
+
+    def test_dependants_of_failed_item_are_skipped(self):
+        items = ["areas", "lines", "routes", "volumes"]
+        with self.assertLogs("modules.scheduler", level="ERROR"):
+            failed = scheduler.run(record, items, scheduler.dependencies(items, PROCESSORS), self.log_file, ("areas",))
+        self.assertEqual(failed, ["areas", "lines", "routes"])
+        self.assertEqual(self.processed(), ["volumes"])
+
+    def test_results_of_successful_items(self):
+        items = ["areas", "volumes"]
+        results = {}
+        with self.assertLogs("modules.scheduler", level="ERROR"):
+            scheduler.run(
+                record, items, {}, self.log_file, ("areas",), on_result=results.__setitem__
+            )
+        self.assertEqual(results, {"volumes": None})
+
+    def test_dependency_cycle(self):
+        with self.assertRaises(ValueError):
+            scheduler.run(record, ["a", "b"], {"a": {"b"}, "b": {"a"}}, self.log_file)
+
+    def test_worker_processes(self):
+        items = ["routes", "volumes", "lines", "areas"]
+        with self.assertLogs("modules.scheduler", level="ERROR"):
+            failed = scheduler.run(
+                record, items, scheduler.dependencies(items, PROCESSORS), self.log_file, ("volumes",), workers=2
+            )
+        self.assertEqual(failed, ["volumes"])
+        self.assertEqual(self.processed(), ["areas", "lines", "routes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ from modules.config import Config
 from modules.common import validate_data_count_limits, validate_minimal, deploy
 from modules.gis_validate_deploy import GisProcessor
 import geopandas as gpd
+import pandas as pd
 
 
 class MakaAutoliikennemaarat(GisProcessor):
@@ -18,13 +19,14 @@ class MakaAutoliikennemaarat(GisProcessor):
         self._tormays_files_temp = {}
         GisProcessor.__init__(self, cfg)
 
-    def get_temp_data(self):
+    def _read_temp_data(self) -> gpd.GeoDataFrame:
         for buffer in self._buffers:
             buffer_data = gpd.read_file(self._filename.format(buffer))
             buffer_data.rename_geometry("geom", inplace=True)
             self._tormays_files_temp[buffer] = buffer_data
+        return pd.concat(self._tormays_files_temp.values())
 
-    def validate_deploy(self):
+    def _validate_deploy(self):
         # validate data amount: is it between given limits
         validate_result = False
 
@@ -77,6 +77,25 @@ class Config:
         file_path = self._file_directory("output_dir")
         return "/".join([file_path, self._cfg.get(item, {}).get("target_buffer_file")])
 
+    def run_report_file(self, run: str) -> str:
+        """Return file name of JSON stage report of run, None if not configured."""
+        return self._run_file("run_report", run)
+
+    def metrics_textfile(self, run: str) -> str:
+        """Return file name of Prometheus textfile of run, None if not configured."""
+        return self._run_file("metrics_textfile", run)
+
+    def _run_file(self, key: str, run: str) -> str:
+        """Return run specific file name, relative names are in output directory."""
+        name = self._cfg.get("common", {}).get(key)
+        if not name:
+            return None
+        name = name.format(run)
+        if os.path.isabs(name):
+            return name
+        directory = self._file_directory("output_dir")
+        return os.path.join(directory, name) if directory is not None else None
+
     def buffer(self, item: str) -> list[int]:
         """Return buffer value list from configuration."""
         return self._cfg.get(item, {}).get("buffer")
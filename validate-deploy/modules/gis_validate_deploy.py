@@ -1,10 +1,15 @@
 from abc import ABC, abstractmethod
+from modules import instrumentation
 from modules.common import validate_data_count_limits, validate_minimal, deploy
 import geopandas as gpd
 
 
 class GisProcessor(ABC):
-    """This class helps keeping interface consistent."""
+    """This class helps keeping interface consistent.
+
+    get_temp_data and validate_deploy record read and validate_deploy
+    instrumentation stages of the item, subclasses override _read_temp_data
+    and _validate_deploy."""
 
     @property
     @abstractmethod
@@ -18,11 +23,28 @@ class GisProcessor(ABC):
         self._force_deploy = cfg.force_deploy()
         self._pg_conn_uri = cfg.pg_conn_uri()
 
+    def stage(self, name: str):
+        """Record named step of validation and deploy.
+
+        Use as context manager, the yielded record counts rows and vertices
+        of data given to its count()."""
+        return instrumentation.stage(self._module, name)
+
     def get_temp_data(self):
+        with self.stage("read") as stage:
+            stage.count(self._read_temp_data())
+
+    def _read_temp_data(self) -> gpd.GeoDataFrame:
+        """Read data to validate, return it for counting."""
         self._tormays_file_temp = gpd.read_file(self._filename)
         self._tormays_file_temp.rename_geometry("geom", inplace=True)
+        return self._tormays_file_temp
 
     def validate_deploy(self):
+        with self.stage("validate_deploy"):
+            self._validate_deploy()
+
+    def _validate_deploy(self):
         if self._force_deploy == "True":
             validate_result = validate_minimal(
                 self._module, self._tormays_file_temp, self._filename, self.logger
@@ -0,0 +1,229 @@
+"""Stage timing and memory instrumentation.
+
+Stages of a run (reading, processing, persisting, saving and named
+sub-steps like buffer, clip or dissolve) are recorded with wall time, CPU
+time, resident memory and row and vertex counts of their data. Records of
+a run are written as a JSON report and as a Prometheus textfile for the
+node_exporter textfile collector.
+
+Records are kept per process. Records of items handled in worker processes
+are taken in the worker with take() and added to the main process with
+merge().
+
+process and validate-deploy run from separate script volumes (see
+copy-files.sh), so process/modules and validate-deploy/modules each have
+a copy of this module. Keep the copies identical, process/test/
+test_registry.py checks it.
+"""
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import shapely
+
+logger = logging.getLogger(__name__)
+
+_stages = []
+_counters = []
+
+
+def _memory() -> tuple[int, int]:
+    """Return current and peak resident set size of the process in bytes."""
+    rss = peak = None
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if peak is None:
+        # kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return rss, peak
+
+
+def _cpu_time() -> float:
+    """Return CPU time of the process and its finished worker processes."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class Stage:
+    """Record of a running stage, data counts are added with count()."""
+
+    def __init__(self, item: str, name: str):
+        self.item = item
+        self.name = name
+        self.rows = None
+        self.vertices = None
+
+    def count(self, data):
+        """Count rows and vertices of data (GeoDataFrame, GeoSeries or DataFrame).
+
+        Return data as it is."""
+        self.rows = len(data)
+        geometry = getattr(data, "geometry", data)
+        try:
+            self.vertices = int(shapely.get_num_coordinates(geometry.values).sum())
+        except (AttributeError, TypeError):
+            pass
+        return data
+
+
+@contextmanager
+def stage(item: str, name: str):
+    """Record a stage of item running in the with block."""
+    record = Stage(item, name)
+    started = datetime.now(timezone.utc)
+    wall = time.perf_counter()
+    cpu = _cpu_time()
+    rss_start, _ = _memory()
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        rss_end, peak = _memory()
+        _stages.append(
+            {
+                "item": item,
+                "stage": name,
+                "status": status,
+                "started": started.isoformat(),
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": _cpu_time() - cpu,
+                "rss_start_bytes": rss_start,
+                "rss_end_bytes": rss_end,
+                "peak_rss_bytes": peak,
+                "rows": record.rows,
+                "vertices": record.vertices,
+            }
+        )
+        logger.info(
+            "%s %s: %.1f s wall, %.1f s CPU, peak RSS %.0f MB",
+            item,
+            name,
+            _stages[-1]["wall_seconds"],
+            _stages[-1]["cpu_seconds"],
+            peak / 2**20,
+        )
+
+
+def count(item: str, metric: str, values: dict, label: str = "stage") -> None:
+    """Record counts of item, e.g. repaired geometries per stage."""
+    for key, value in values.items():
+        _counters.append({"item": item, "metric": metric, label: key, "value": value})
+
+
+def take(item: str = None) -> dict:
+    """Remove and return records of item, or all records."""
+    taken = {"stages": [], "counters": []}
+    for records, kind in [(_stages, "stages"), (_counters, "counters")]:
+        taken[kind] = [record for record in records if item is None or record["item"] == item]
+        records[:] = [record for record in records if item is not None and record["item"] != item]
+    return taken
+
+
+def merge(records: dict) -> None:
+    """Add records taken in another process."""
+    _stages.extend(records.get("stages", []))
+    _counters.extend(records.get("counters", []))
+
+
+def report(run: str) -> dict:
+    """Return report of records of this run."""
+    return {
+        "run": run,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "stages": list(_stages),
+        "counters": list(_counters),
+    }
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+
+
+def prometheus_text(run: str, prefix: str = "haitaton_gis") -> str:
+    """Return records in Prometheus text format.
+
+    Stages recorded several times for an item are summed, peak RSS is the
+    maximum."""
+    metrics = {
+        "stage_wall_seconds": ("wall_seconds", sum, "Wall time of a stage in seconds."),
+        "stage_cpu_seconds": ("cpu_seconds", sum, "CPU time of a stage in seconds."),
+        "stage_peak_rss_bytes": ("peak_rss_bytes", max, "Peak resident memory of the process at the end of a stage."),
+        "stage_rows": ("rows", sum, "Rows in the result of a stage."),
+        "stage_vertices": ("vertices", sum, "Vertices in the result of a stage."),
+    }
+    lines = []
+    for metric, (field, aggregate, help_text) in metrics.items():
+        values = defaultdict(list)
+        for record in _stages:
+            if record[field] is not None:
+                values[(record["item"], record["stage"], record["status"])].append(record[field])
+        if not values:
+            continue
+        name = "{}_{}".format(prefix, metric)
+        lines += ["# HELP {} {}".format(name, help_text), "# TYPE {} gauge".format(name)]
+        for (item, stage_name, status), stage_values in values.items():
+            lines.append(
+                "{}{{{}}} {}".format(
+                    name, _labels(run=run, item=item, stage=stage_name, status=status), aggregate(stage_values)
+                )
+            )
+
+    counters = defaultdict(lambda: defaultdict(int))
+    for record in _counters:
+        labels = {key: value for key, value in record.items() if key not in ("metric", "value")}
+        counters[record["metric"]][_labels(run=run, **labels)] += record["value"]
+    for metric, values in counters.items():
+        name = "{}_{}".format(prefix, metric)
+        lines += ["# TYPE {} gauge".format(name)]
+        lines += ["{}{{{}}} {}".format(name, labels, value) for labels, value in values.items()]
+
+    name = "{}_last_run_timestamp_seconds".format(prefix)
+    lines += ["# TYPE {} gauge".format(name), "{}{{{}}} {}".format(name, _labels(run=run), time.time())]
+    return "\n".join(lines) + "\n"
+
+
+def _write(file_name: str, text: str) -> None:
+    """Write file under a temporary name and rename it in place.
+
+    The textfile collector must never see a partially written file."""
+    directory = os.path.dirname(os.path.abspath(file_name))
+    tmp_name = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as tmp:
+            tmp_name = tmp.name
+            tmp.write(text)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, file_name)
+    except OSError:
+        logger.warning("Could not write %s", file_name, exc_info=True)
+        if tmp_name is not None and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def write_report(run: str, report_file: str = None, metrics_file: str = None) -> None:
+    """Write JSON report and Prometheus textfile of this run."""
+    if report_file is not None:
+        _write(report_file, json.dumps(report(run), indent=2, default=str))
+        logger.info("Run report written to %s", report_file)
+    if metrics_file is not None:
+        _write(metrics_file, prometheus_text(run))
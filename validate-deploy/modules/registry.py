@@ -0,0 +1,49 @@
+"""Registry of processors by configuration item.
+
+Processor modules import heavy dependencies (gtfs_kit, fiona, sqlalchemy),
+so a processor module is imported only when its item is requested.
+
+process and validate-deploy run from separate script volumes (see
+copy-files.sh), so process/modules and validate-deploy/modules each have
+a copy of this module. Keep the copies identical, process/test/
+test_registry.py checks it.
+"""
+import importlib
+
+# configuration item: (module, processor class)
+_processors = {
+    "hsl": ("modules.hsl", "HslBuses"),
+    "maka_autoliikennemaarat": ("modules.autoliikennemaarat", "MakaAutoliikennemaarat"),
+    "ylre_katuosat": ("modules.ylre_katuosat", "YlreKatuosat"),
+    "ylre_katualueet": ("modules.ylre_katualueet", "YlreKatualueet"),
+    "tram_infra": ("modules.tram_infra", "TramInfra"),
+    "tram_lines": ("modules.tram_lines", "TramLines"),
+    "cycle_infra": ("modules.cycling_infra", "CycleInfra"),
+    "liikennevaylat": ("modules.liikennevaylat", "Liikennevaylat"),
+    "central_business_area": ("modules.central_business_area", "CentralBusinessAreas"),
+    "special_transport_routes": ("modules.special_transport_routes", "SpecialTransportRoutes"),
+    "critical_areas": ("modules.critical_areas", "CriticalAreas"),
+}
+
+
+def register(item: str, module_name: str, class_name: str) -> None:
+    """Register processor class of configuration item."""
+    _processors[item] = (module_name, class_name)
+
+
+def items() -> list[str]:
+    """Return registered configuration items."""
+    return list(_processors)
+
+
+def is_registered(item: str) -> bool:
+    """Return True if configuration item has a processor."""
+    return item in _processors
+
+
+def processor_class(item: str) -> type:
+    """Return processor class of item, importing its module on first use."""
+    if item not in _processors:
+        raise KeyError("No processor registered for {}".format(item))
+    module_name, class_name = _processors[item]
+    return getattr(importlib.import_module(module_name), class_name)
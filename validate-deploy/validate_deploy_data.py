@@ -4,60 +4,38 @@ import os
 import sys
 import logging
 
+from modules import instrumentation
+from modules import registry
 from modules.config import Config
 from modules.gis_validate_deploy import GisProcessor
 
-from modules.autoliikennemaarat import MakaAutoliikennemaarat
-from modules.hsl import HslBuses
-from modules.ylre_katualueet import YlreKatualueet
-from modules.ylre_katuosat import YlreKatuosat
-from modules.tram_infra import TramInfra
-from modules.tram_lines import TramLines
-from modules.cycling_infra import CycleInfra
-from modules.liikennevaylat import Liikennevaylat
-from modules.central_business_area import CentralBusinessAreas
-from modules.special_transport_routes import SpecialTransportRoutes
-from modules.critical_areas import CriticalAreas
-
 DEFAULT_DEPLOYMENT_PROFILE = "local_development"
 
+logger = logging.getLogger(__name__)
+
 def validate_deploy_item(item: str, cfg: Config):
+    """Validate and deploy item, unknown items are skipped.
+
+    Processor records its read and validate_deploy stages."""
     gis_processor = instantiate_processor(item, cfg)
+    if gis_processor is None:
+        return
     gis_processor.get_temp_data()
     gis_processor.validate_deploy()
-    pass
 
 def instantiate_processor(item: str, cfg: Config) -> GisProcessor:
-    """Instantiate correct class for processing data."""
-    if item == "hsl":
-        return HslBuses(cfg)
-    elif item == "maka_autoliikennemaarat":
-        return MakaAutoliikennemaarat(cfg)
-    elif item == "ylre_katuosat":
-        return YlreKatuosat(cfg)
-    elif item == "ylre_katualueet":
-        return YlreKatualueet(cfg)
-    elif item == "tram_infra":
-        return TramInfra(cfg)
-    elif item == "tram_lines":
-        return TramLines(cfg)
-    elif item == "cycle_infra":
-        return CycleInfra(cfg)
-    elif item == "liikennevaylat":
-        return Liikennevaylat(cfg)
-    elif item == "central_business_area":
-        return CentralBusinessAreas(cfg)
-    elif item == "special_transport_routes":
-        return SpecialTransportRoutes(cfg)
-    elif item == "critical_areas":
-        return CriticalAreas(cfg)
-    else:
+    """Instantiate correct class for processing data.
+
+    Processor module is imported only when its item is requested.
+    Return None for unknown item."""
+    if not registry.is_registered(item):
         logger.error("Configuration not recognized: {}".format(item))
+        return None
+    return registry.processor_class(item)(cfg)
 
 if __name__ == "__main__":
     FORMAT = '%(asctime)s - %(levelname)-5s - %(name)-15s - %(message)s'
     logging.basicConfig(format=FORMAT, level=logging.INFO)
-    logger = logging.getLogger(__name__)
 
     deployment_profile = os.environ.get("TORMAYS_DEPLOYMENT_PROFILE")
     use_deployment_profile = DEFAULT_DEPLOYMENT_PROFILE
@@ -72,5 +50,10 @@ if __name__ == "__main__":
 
     cfg = Config().with_deployment_profile(use_deployment_profile)
 
-    for item in sys.argv[1:]:
-        validate_deploy_item(item, cfg)
+    try:
+        for item in sys.argv[1:]:
+            validate_deploy_item(item, cfg)
+    finally:
+        instrumentation.write_report(
+            "validate_deploy", cfg.run_report_file("validate_deploy"), cfg.metrics_textfile("validate_deploy")
+        )